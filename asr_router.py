@@ -0,0 +1,432 @@
+import asyncio
+import collections
+import time
+import websockets
+
+from connection import backoff_delay
+
+ROUTING = ('fastest', 'hedge')
+
+
+class _Utterance:
+    """One utterance as routed: the backends it is sent to and how it ended."""
+
+    def __init__(self, targets) -> None:
+        self.targets = targets
+        self.stopped_at = None   # monotonic time it was stopped, None while sent (or endpointed by a server)
+        self.done = False        # its final result was passed on
+        self.partials_from = None  # backend whose online results are passed on
+
+
+class _Backend:
+    """A backend of the router: its session, recent latencies and failures."""
+
+    def __init__(self, name, open_session, window, smoothing) -> None:
+        self.name = name
+        self.open_session = open_session
+        self.session = None
+        self.smoothing = smoothing
+        self.average = None  # exponentially weighted latency, recent utterances weighing most
+        self.latencies = collections.deque(maxlen=window)  # seconds from stopping an utterance to its final
+        self.failures = collections.deque(maxlen=window)   # per utterance or connection: True if it failed
+        self.pending = collections.deque()  # utterances sent here whose final result is still to come
+        self.reader = None
+        self.reviver = None
+        self.routed = 0
+        self.wins = 0  # finals passed on, i.e. first of the hedged backends
+
+    @property
+    def connected(self):
+        return self.session is not None and not self.session.closed
+
+    def error_rate(self):
+        return sum(self.failures) / len(self.failures) if self.failures else 0.0
+
+    def add_latency(self, latency):
+        self.latencies.append(latency)
+        self.average = latency if self.average is None else \
+            self.average + self.smoothing * (latency - self.average)
+
+    def estimate(self, now):
+        """
+        Expected latency of the next utterance, None before any final result: the weighted
+        average, or the time the oldest final result is overdue by, if that is longer, so
+        a backend that stalls is avoided before `final_timeout` gives up on its result.
+        """
+        if self.average is None:
+            return None
+        overdue = next((now - utterance.stopped_at for utterance in self.pending
+                        if utterance.stopped_at is not None), 0.0)
+        return max(self.average, overdue)
+
+    def latency(self, q=0.9):
+        """Quantile `q` of the recent latencies, None with too few to go by."""
+        if len(self.latencies) < 3:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def stats(self):
+        p50, p90 = self.latency(0.5), self.latency(0.9)
+        return {
+            'connected': self.connected,
+            'routed': self.routed,
+            'wins': self.wins,
+            'p50_ms': round(1000 * p50, 1) if p50 is not None else None,
+            'p90_ms': round(1000 * p90, 1) if p90 is not None else None,
+            'error_rate': round(self.error_rate(), 3),
+        }
+
+
+class AsrRouter:
+    """
+    Routes utterances between several ASR backends, behind the `AsrSession` interface.
+
+    A backend is anything with that interface (`AsrSession` for the 2pass server,
+    `iflytek_asr.RtasrAsrSession` for RTASR), opened by a coroutine function per backend.
+    For each backend the router keeps the recent latencies, from stopping an utterance
+    to its final result, and the recent failures.
+
+    With `routing='fastest'` each utterance goes to the healthy backend with the lowest
+    expected latency: an exponentially weighted average of its latencies, raised to how
+    long its oldest final result has been overdue, so one slow result or one result that
+    does not come moves the next utterance elsewhere. Backends without a latency yet are
+    tried first. Every `probe_every`-th utterance is hedged anyway, so the latency of the
+    others stays known. With `routing='hedge'` every utterance goes to the `hedge` best backends. The
+    first final result of an utterance is passed on and the later ones are dropped, so a
+    slow backend only costs bandwidth. An utterance none of its backends answers within
+    `final_timeout` gets an empty final result, so the results after it stay in order.
+
+    A backend whose connection fails is reopened in the background with backoff. When
+    every backend an utterance was sent to has failed, the router reports the connection
+    as lost (`ConnectionClosed`), like a single session does: the assistant reconnects,
+    which only reopens what is down, and sends the utterance again to a healthy backend.
+    """
+
+    def __init__(self,
+                 backends,
+                 routing='fastest',
+                 hedge=2,
+                 probe_every=10,
+                 window=20,
+                 smoothing=0.5,
+                 max_error_rate=0.5,
+                 final_timeout=5.0,
+                 metrics=None,
+                 log=print) -> None:
+        """
+        Initializes the router; `open` connects the backends.
+
+        Args:
+            backends (dict): Backend name -> coroutine function returning an opened session.
+            routing (str): 'fastest' or 'hedge'.
+            hedge (int): Backends a hedged utterance is sent to.
+            probe_every (int): Hedge every N-th utterance when routing to the fastest, 0 for never.
+            window (int): Recent utterances the error rate and latency quantiles (`stats`) are taken over.
+            smoothing (float): Weight of the newest latency in a backend's expected latency.
+            max_error_rate (float): Error rate above which a backend is only probed.
+            final_timeout (float): Seconds after which a missing final result counts as a failure
+                (and is passed on as empty when no other backend has it coming).
+            metrics (Metrics): Metrics view for the per-backend series, None for none.
+            log (callable): Prints a log line; `Speech_Assistant` sets its own `log` on the router it uses.
+        """
+        if routing not in ROUTING:
+            raise ValueError(f"unknown ASR routing: {routing}")
+        self.backends = [_Backend(name, open_session, window, smoothing) for name, open_session in backends.items()]
+        self.routing = routing
+        self.hedge = hedge
+        self.probe_every = probe_every
+        self.max_error_rate = max_error_rate
+        self.final_timeout = final_timeout
+        self.metrics = metrics
+        self.log = log
+        self.codec = 'pcm'  # each backend encodes for its own server
+        self.speaking = False
+        self.utterances = 0
+        self.hedged = 0
+        self.outstanding = collections.deque()  # per stopped utterance awaiting its final: True if cancelled
+        self.connect_time = None
+        self.hotwords = None  # hotwords updated since the backends were created, applied on reopening too
+        self.current = None
+        self.results = asyncio.Queue()
+
+    @property
+    def closed(self):
+        return not any(backend.connected for backend in self.backends)
+
+    @property
+    def ws(self):
+        """Connection the uplink measures congestion on: the first one the current utterance goes to."""
+        targets = self.current.targets if self.current else [b for b in self.backends if b.connected]
+        return targets[0].session.ws if targets else None
+
+    def _metrics(self, backend):
+        return self.metrics.labelled(backend=backend.name) if self.metrics else None
+
+    async def _open(self, backend):
+        try:
+            session = await backend.open_session()
+            if self.hotwords is not None:
+                await session.update_hotwords(self.hotwords)
+        except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+            self.log(f"Failed to connect ASR backend {backend.name}: {e!r}")
+            return False
+        backend.session = session
+        backend.reader = asyncio.create_task(self._read(backend, session))
+        return True
+
+    async def open(self):
+        """
+        Connect the backends that are down.
+
+        Raises:
+            ConnectionError: No backend could be connected.
+        """
+        start = time.perf_counter()
+        down = [backend for backend in self.backends if not backend.connected and backend.reviver is None]
+        await asyncio.gather(*(self._open(backend) for backend in down))
+        self.connect_time = time.perf_counter() - start
+        if self.closed:
+            raise ConnectionError("no ASR backend is available")
+        self.speaking = False
+        self.current = None
+        return self
+
+    def _fail(self, backend):
+        """Take a backend whose connection failed out of service and reopen it in the background."""
+        if backend.session is None:
+            return
+        backend.failures.append(True)
+        if self.metrics:
+            self._metrics(backend).inc('asr_backend_failures_total')
+        session, backend.session = backend.session, None
+        backend.pending.clear()
+        if self.current and backend in self.current.targets:
+            self.current.targets.remove(backend)
+        if backend.reader is not asyncio.current_task():
+            backend.reader.cancel()
+        asyncio.create_task(session.close())
+        backend.reviver = asyncio.create_task(self._revive(backend))
+
+    async def _revive(self, backend):
+        attempt = 0
+        try:
+            while not await self._open(backend):
+                await asyncio.sleep(backoff_delay(attempt))
+                attempt += 1
+        finally:
+            backend.reviver = None
+
+    async def _read(self, backend, session):
+        try:
+            while True:
+                self._route(backend, session, await session.recv())
+        except websockets.ConnectionClosed:
+            self._fail(backend)
+
+    def _route(self, backend, session, response):
+        """Pass on the results of the backend that is first for their utterance."""
+        if response['mode'] == '2pass-online':
+            utterance = backend.pending[0] if backend.pending else None
+            if session.discarding or utterance is None or utterance.done:
+                return
+            if utterance.partials_from is None:
+                utterance.partials_from = backend
+            if utterance.partials_from is backend:
+                self.results.put_nowait(response)
+            return
+
+        if response['mode'] != '2pass-offline':
+            return
+        session.final_received()
+        if not backend.pending:
+            return
+        utterance = backend.pending.popleft()
+        backend.failures.append(False)
+        if utterance.stopped_at is not None:
+            latency = time.monotonic() - utterance.stopped_at
+            backend.add_latency(latency)
+            if self.metrics:
+                self._metrics(backend).observe('asr_backend_final_latency_seconds', latency)
+        if utterance.done:
+            return  # a hedged utterance another backend was faster on
+        utterance.done = True
+        backend.wins += 1
+        self.results.put_nowait(response)
+        if utterance.stopped_at is None:
+            # The server ended the utterance itself: end it on the others too
+            for other in utterance.targets:
+                if other is not backend and other.connected:
+                    asyncio.create_task(other.session.stop_utterance())
+
+    def _expire(self, backend):
+        """
+        Give up on results overdue by `final_timeout`: the backend lost them. An utterance
+        no other backend will answer either is passed on with an empty final result, so
+        the results after it are not taken for its own.
+        """
+        now = time.monotonic()
+        while backend.pending and backend.pending[0].stopped_at is not None \
+                and now - backend.pending[0].stopped_at > self.final_timeout:
+            utterance = backend.pending.popleft()
+            backend.session.expire_utterance()
+            backend.failures.append(True)
+            backend.add_latency(self.final_timeout)  # at least that slow
+            if not utterance.done and not any(utterance in other.pending for other in utterance.targets):
+                utterance.done = True
+                self.results.put_nowait({'mode': '2pass-offline', 'text': '', 'stamp_sents': []})
+
+    def choose(self):
+        """Backends the next utterance goes to, best first."""
+        connected = [backend for backend in self.backends if backend.connected]
+        for backend in connected:
+            self._expire(backend)
+        healthy = [backend for backend in connected if backend.error_rate() <= self.max_error_rate] or connected
+        now = time.monotonic()
+
+        def score(backend):
+            latency = backend.estimate(now)
+            return (latency is not None, latency or 0.0)
+        ranked = sorted(healthy, key=score)
+        if self.routing == 'hedge':
+            return ranked[:self.hedge]
+        if self.probe_every and self.utterances % self.probe_every == self.probe_every - 1:
+            return ranked + [backend for backend in connected if backend not in ranked]
+        return ranked[:1]
+
+    def _lost(self, error=None):
+        """Every backend of the current utterance failed: report the connection as lost."""
+        self.speaking = False
+        self.current = None
+        raise error or websockets.ConnectionClosed(None, None)
+
+    async def update_hotwords(self, hotwords):
+        """Replace the hotwords on the connected backends, and on those reopened later."""
+        self.hotwords = hotwords
+        for backend in self.backends:
+            if backend.connected:
+                try:
+                    await backend.session.update_hotwords(hotwords)
+                except websockets.ConnectionClosed:
+                    self._fail(backend)
+
+    async def start_utterance(self):
+        """Begin an utterance on the backends chosen for it (no-op if one is already open)."""
+        if self.speaking:
+            return
+        utterance = _Utterance([])
+        error = None
+        for backend in self.choose():
+            try:
+                await backend.session.start_utterance()
+            except websockets.ConnectionClosed as e:
+                error = e
+                self._fail(backend)
+                continue
+            utterance.targets.append(backend)
+            backend.pending.append(utterance)
+            backend.routed += 1
+            if self.metrics:
+                self._metrics(backend).inc('asr_routed_total')
+        if not utterance.targets:
+            self._lost(error)
+        self.hedged += len(utterance.targets) > 1
+        self.current = utterance
+        self.speaking = True
+        self.utterances += 1
+
+    async def send_audio(self, data, audio_thread=None):
+        """Send a chunk of int16 PCM bytes to every backend of the current utterance."""
+        error = None
+        for backend in list(self.current.targets):
+            try:
+                await backend.session.send_audio(data, audio_thread)
+            except websockets.ConnectionClosed as e:
+                error = e
+                self._fail(backend)
+        if not self.current.targets:
+            self._lost(error)
+
+    async def stop_utterance(self):
+        """End the current utterance on its backends."""
+        if not self.speaking:
+            return
+        error = None
+        utterance = self.current
+        for backend in list(utterance.targets):
+            try:
+                await backend.session.stop_utterance()
+            except websockets.ConnectionClosed as e:
+                error = e
+                self._fail(backend)
+        if not utterance.targets:
+            self._lost(error)
+        utterance.stopped_at = time.monotonic()
+        self.speaking = False
+        self.current = None
+        self.outstanding.append(False)
+
+    async def cancel_utterance(self):
+        """
+        End the current utterance and have its results ignored (no-op if none is open).
+
+        Returns:
+            bool: True if an utterance was cancelled.
+        """
+        if not self.speaking:
+            return False
+        await self.stop_utterance()
+        self.outstanding[-1] = True
+        return True
+
+    @property
+    def discarding(self):
+        """True while the results arriving belong to a cancelled utterance."""
+        return bool(self.outstanding) and self.outstanding[0]
+
+    def final_received(self):
+        """
+        Account for a `2pass-offline` result passed on; without a stopped utterance
+        outstanding a server finalized the current one through its own endpoint detection.
+
+        Returns:
+            bool: True if the result ends a cancelled utterance and is to be ignored.
+        """
+        if self.outstanding:
+            return self.outstanding.popleft()
+        self.speaking = False
+        self.current = None
+        return False
+
+    def expire_utterance(self):
+        """Give up on the final result of the oldest stopped utterance, which is taken as lost."""
+        if not self.outstanding:
+            return
+        self.outstanding.popleft()
+        stopped = [utterance for backend in self.backends for utterance in backend.pending
+                   if utterance.stopped_at is not None and not utterance.done]
+        if not stopped:
+            return
+        utterance = min(stopped, key=lambda utterance: utterance.stopped_at)
+        utterance.done = True
+        for backend in utterance.targets:
+            if utterance in backend.pending:
+                backend.pending.remove(utterance)
+                if backend.connected:
+                    backend.session.expire_utterance()
+
+    async def recv(self):
+        """Receive the next result passed on from the backends."""
+        return await self.results.get()
+
+    def stats(self):
+        return {'routing': self.routing, 'utterances': self.utterances, 'hedged': self.hedged,
+                'backends': {backend.name: backend.stats() for backend in self.backends}}
+
+    async def close(self):
+        for backend in self.backends:
+            for task in (backend.reader, backend.reviver):
+                if task:
+                    task.cancel()
+            if backend.session is not None:
+                await backend.session.close()
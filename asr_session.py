@@ -0,0 +1,285 @@
+import asyncio
+import collections
+import json
+import ssl
+import time
+import websockets
+import audio_codec
+
+_ssl_context = None
+
+
+def client_ssl_context():
+    """
+    Return the process-wide client SSL context for the ASR server.
+
+    Building an `ssl.SSLContext` loads the default cipher and protocol tables, so one
+    context is shared by every ASR connection (and reconnection) instead of one each.
+    """
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        _ssl_context.check_hostname = False
+        _ssl_context.verify_mode = ssl.CERT_NONE
+    return _ssl_context
+
+
+def twopass_config(hotwords, wav_name="microphone", codec='pcm'):
+    """
+    2pass model configuration message; `is_speaking` is managed by `AsrSession`.
+
+    Args:
+        hotwords (dict): Hotwords and their weights.
+        wav_name (str): Stream name echoed back in the results.
+        codec (str): Uplink audio codec to offer (see `audio_codec`): 'pcm', 'adpcm', 'opus'
+            or 'auto'; other than 'pcm' the offer goes out as `codecs`.
+    """
+    config = {
+        "mode": "2pass",
+        "chunk_size": [5, 10, 5],
+        "chunk_interval": 10,
+        "encoder_chunk_look_back": 4,
+        "decoder_chunk_look_back": 0,
+        "wav_name": wav_name,
+        "hotwords": json.dumps(hotwords),
+        "itn": True
+    }
+    offered = audio_codec.offer(codec)
+    if offered != ['pcm']:
+        config["codecs"] = offered
+    return config
+
+
+class AsrSession:
+    """
+    One long-lived FunASR-style 2pass WebSocket with an explicit utterance lifecycle.
+
+    `open` connects and sends the model configuration with `is_speaking: false`, which
+    arms the decoder without starting an utterance. Each utterance is then bracketed by
+    `start_utterance` / `stop_utterance`, which only send `{"is_speaking": ...}`, so later
+    commands pay neither the TLS handshake nor the model initialization again.
+
+    Results arrive in utterance order, so stopped utterances whose final result is still
+    to come are queued in `outstanding`; an utterance can also be cancelled (e.g. by a
+    barge-in), which stops it and marks its results to be ignored.
+
+    When the configuration offers `codecs`, the server confirms the one it decodes with
+    a `{"codec": ...}` message; a server that does not answer within `negotiate_timeout`
+    predates negotiation and gets raw PCM.
+    """
+
+    def __init__(self, uri_asr, config, ping_interval=None, negotiate_timeout=1.0) -> None:
+        """
+        Initializes the session.
+
+        Args:
+            uri_asr (str): URL for the ASR WebSocket server.
+            config (dict): 2pass configuration message (`mode`, `chunk_size`, `hotwords`, ...).
+            ping_interval (float): WebSocket keepalive ping interval, None to disable.
+            negotiate_timeout (float): Seconds to wait for the server to confirm a codec.
+        """
+        self.uri_asr = uri_asr
+        self.config = config
+        self.ping_interval = ping_interval
+        self.negotiate_timeout = negotiate_timeout
+        self.codec = 'pcm'
+        self.encoder = None
+        self.ws = None
+        self.speaking = False
+        self.utterances = 0
+        self.outstanding = collections.deque()  # per stopped utterance awaiting its final: True if cancelled
+        self.connect_time = None  # seconds spent in the WebSocket (and TLS) handshake
+
+    @property
+    def closed(self):
+        return self.ws is None or self.ws.close_code is not None
+
+    async def connect(self):
+        """Open the WebSocket connection."""
+        start = time.perf_counter()
+        ssl_context = client_ssl_context() if self.uri_asr.startswith('wss://') else None
+        self.ws = await websockets.connect(self.uri_asr, subprotocols=["binary"], compression=None,
+                                           ping_interval=self.ping_interval, ssl=ssl_context)
+        self.connect_time = time.perf_counter() - start
+
+    async def configure(self, is_speaking=False):
+        """Send the model configuration; the decoder is armed but idle unless `is_speaking`."""
+        await self.ws.send(json.dumps(dict(self.config, is_speaking=is_speaking)))
+        self.speaking = is_speaking
+        offered = self.config.get('codecs')
+        if offered:
+            try:
+                response = json.loads(await asyncio.wait_for(self.ws.recv(), self.negotiate_timeout))
+            except asyncio.TimeoutError:
+                response = {}
+            self.codec = audio_codec.negotiate(offered, response)
+        self.encoder = audio_codec.encoder(self.codec)
+
+    async def open(self):
+        """Connect and configure, leaving the session ready for `start_utterance`."""
+        await self.connect()
+        await self.configure()
+        return self
+
+    async def update_hotwords(self, hotwords):
+        """
+        Replace the hotwords on the open connection; the server applies them from the
+        next decode on, without a new model configuration or reconnect.
+
+        Args:
+            hotwords (dict): Hotwords and their weights.
+        """
+        self.config = dict(self.config, hotwords=json.dumps(hotwords))
+        await self.ws.send(json.dumps({"hotwords": self.config["hotwords"]}))
+
+    async def start_utterance(self):
+        """Begin an utterance on the server (no-op if one is already open)."""
+        if not self.speaking:
+            if self.encoder is not None:
+                # The audio of a new utterance (or of one replayed) is not the continuation
+                # of what the encoder last buffered
+                self.encoder.reset()
+            await self.ws.send(json.dumps({"is_speaking": True}))
+            self.speaking = True
+            self.utterances += 1
+
+    async def stop_utterance(self):
+        """End the current utterance so the server finalizes it with a `2pass-offline` result."""
+        if self.speaking:
+            await self.ws.send(json.dumps({"is_speaking": False}))
+            self.speaking = False
+            self.outstanding.append(False)
+
+    async def cancel_utterance(self):
+        """
+        End the current utterance and have its results ignored (no-op if none is open).
+
+        Returns:
+            bool: True if an utterance was cancelled.
+        """
+        if not self.speaking:
+            return False
+        await self.stop_utterance()
+        self.outstanding[-1] = True
+        return True
+
+    @property
+    def discarding(self):
+        """True while the results arriving belong to a cancelled utterance."""
+        return bool(self.outstanding) and self.outstanding[0]
+
+    def final_received(self):
+        """
+        Account for a `2pass-offline` result; without a stopped utterance outstanding the
+        server finalized the current one through its own endpoint detection.
+
+        Returns:
+            bool: True if the result ends a cancelled utterance and is to be ignored.
+        """
+        if self.outstanding:
+            return self.outstanding.popleft()
+        self.speaking = False
+        return False
+
+    def expire_utterance(self):
+        """Give up on the final result of the oldest stopped utterance, which is taken as lost."""
+        if self.outstanding:
+            self.outstanding.popleft()
+
+    async def send_audio(self, data, audio_thread=None):
+        """Send a chunk of int16 PCM bytes, encoded with the negotiated codec (on `audio_thread`, if given)."""
+        if self.encoder is None:
+            await self.ws.send(data)
+        elif audio_thread is not None:
+            await self.ws.send(await audio_thread.call(self.encoder.encode, data))
+        else:
+            await self.ws.send(self.encoder.encode(data))
+
+    async def recv(self):
+        """Receive and decode the next recognition result."""
+        return json.loads(await self.ws.recv())
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+
+class AsrSessionPool:
+    """
+    Pre-warmed ASR sessions shared by many assistants.
+
+    Instead of every assistant holding its own idle standby connection, a hub keeps
+    `size` opened and configured sessions here; `take` hands one out instantly (for a
+    first connection or a failover) and refills the pool in the background.
+    """
+
+    def __init__(self, uri_asr, config, size=2, ping_interval=None, log=print) -> None:
+        """
+        Initializes the pool; call `fill` (or `take`) to open the sessions.
+
+        Args:
+            uri_asr (str): URL for the ASR WebSocket server.
+            config (dict): 2pass configuration shared by all sessions of the pool.
+            size (int): Number of ready sessions to keep.
+            ping_interval (float): WebSocket keepalive ping interval, None to disable.
+            log (callable): Prints a log line, e.g. the owner's (quiet unless verbose) `log`.
+        """
+        self.uri_asr = uri_asr
+        self.config = config
+        self.size = size
+        self.log = log
+        self.ping_interval = ping_interval
+        self.ready = collections.deque()
+        self.taken = 0    # sessions handed out ready
+        self.misses = 0   # `take` calls that found the pool empty
+        self._task = None
+
+    async def fill(self):
+        """Open sessions until `size` are ready (stops at the first connection failure)."""
+        while len(self.ready) < self.size:
+            try:
+                session = await AsrSession(self.uri_asr, self.config, ping_interval=self.ping_interval).open()
+            except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+                self.log(f"Failed to prepare pooled websocket_asr: {e!r}")
+                return
+            self.ready.append(session)
+
+    def refill(self):
+        """Start refilling in the background unless a refill is already running."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.fill())
+
+    def take(self):
+        """
+        Hand out a ready session.
+
+        Returns:
+            AsrSession or None: An opened, configured session, or None if none is ready.
+        """
+        session = None
+        while self.ready and session is None:
+            candidate = self.ready.popleft()
+            if not candidate.closed:
+                session = candidate
+        if session is None:
+            self.misses += 1
+        else:
+            self.taken += 1
+        self.refill()
+        return session
+
+    async def update_hotwords(self, hotwords):
+        """Replace the hotwords of the ready sessions and of those opened from now on."""
+        self.config = dict(self.config, hotwords=json.dumps(hotwords))
+        for session in list(self.ready):
+            if not session.closed:
+                await session.update_hotwords(hotwords)
+
+    def stats(self):
+        return {'ready': len(self.ready), 'taken': self.taken, 'misses': self.misses}
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+        while self.ready:
+            await self.ready.popleft().close()
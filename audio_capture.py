@@ -0,0 +1,103 @@
+import asyncio
+import collections
+
+
+class AudioCapture:
+    """
+    Callback-driven microphone capture that never blocks the asyncio event loop.
+
+    PortAudio delivers fixed-size frames on its own thread; each frame is copied and
+    handed to the loop with `call_soon_threadsafe`, where it lands in a bounded ring
+    of frames that coroutines consume with `await read()`.
+    """
+
+    paced = True  # frames arrive in real time
+
+    def __init__(self,
+                 sample_rate=16000,
+                 channels=1,
+                 blocksize=320,
+                 max_frames=100,
+                 device=None) -> None:
+        """
+        Initializes the capture with the stream format and ring size.
+
+        Args:
+            sample_rate (int): Sampling rate of the input stream.
+            channels (int): Number of input channels.
+            blocksize (int): Samples per frame delivered by the callback (320 = 20 ms at 16 kHz).
+            max_frames (int): Ring capacity in frames; the oldest frame is dropped when full.
+            device (int or str): Input device (index or name substring), None for the default.
+        """
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.blocksize = blocksize
+        self.device = device
+        self.frames = collections.deque(maxlen=max_frames)
+        self.overflows = 0   # PortAudio reported input overflow (sound card outran the callback)
+        self.underflows = 0  # PortAudio reported input underflow
+        self.dropped = 0     # frames evicted from the ring because the loop fell behind
+        self._loop = None
+        self._stream = None
+        self._ready = None
+
+    def _callback(self, indata, frames, time_info, status):
+        """PortAudio callback: runs on the audio thread, must not touch asyncio state directly."""
+        # indata is reused by PortAudio after the callback returns, so copy it out
+        frame = indata[:, 0].copy() if self.channels == 1 else indata.copy()
+        self._loop.call_soon_threadsafe(self._push, frame,
+                                        status.input_overflow, status.input_underflow)
+
+    def _push(self, frame, overflow, underflow):
+        """Append a frame to the ring on the event loop and wake up the reader."""
+        if overflow:
+            self.overflows += 1
+        if underflow:
+            self.underflows += 1
+        if len(self.frames) == self.frames.maxlen:
+            self.dropped += 1
+        self.frames.append(frame)
+        self._ready.set()
+
+    async def read(self):
+        """Wait for and return the next captured frame as an int16 array."""
+        while not self.frames:
+            self._ready.clear()
+            await self._ready.wait()
+        return self.frames.popleft()
+
+    def stats(self):
+        """Return the capture counters."""
+        return {
+            'overflows': self.overflows,
+            'underflows': self.underflows,
+            'dropped': self.dropped,
+            'pending': len(self.frames),
+        }
+
+    def start(self):
+        """Open and start the input stream."""
+        import sounddevice as sd  # loads PortAudio; deferred so file playback never pays for it
+        self._loop = asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+        self._stream = sd.InputStream(device=self.device,
+                                      channels=self.channels,
+                                      dtype="int16",
+                                      samplerate=self.sample_rate,
+                                      blocksize=self.blocksize,
+                                      callback=self._callback)
+        self._stream.start()
+
+    def stop(self):
+        """Stop and close the input stream."""
+        if self._stream:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.stop()
@@ -0,0 +1,236 @@
+import struct
+import warnings
+import numpy as np
+
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        import audioop  # C implementation of IMA ADPCM; removed from the standard library in 3.13
+except ImportError:
+    audioop = None
+
+try:
+    import opuslib
+except Exception:  # not installed, or libopus itself is missing
+    opuslib = None
+
+# Codecs in order of preference; 'pcm' (raw int16) is what every ASR server understands
+# and is always the final fallback.
+CODECS = ('opus', 'adpcm', 'pcm')
+
+# IMA ADPCM step sizes and step index adjustments per 4-bit code
+_STEPS = [
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+    50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230, 253, 279, 307,
+    337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963, 1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066,
+    2272, 2499, 2749, 3024, 3327, 3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442, 11487, 12635, 13899,
+    15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794, 32767,
+]
+_INDEX_ADJUST = [-1, -1, -1, -1, 2, 4, 6, 8] * 2
+_ADPCM_HEADER = struct.Struct('<hBB')  # predictor, step index, 1 if the last nibble is padding
+
+
+def available():
+    """Codecs usable in this process, in order of preference."""
+    return [codec for codec in CODECS if codec != 'opus' or opuslib is not None]
+
+
+def offer(codec='pcm'):
+    """Return the list of codecs to offer in the ASR configuration."""
+    if codec == 'auto':
+        return available()
+    if codec not in CODECS:
+        raise ValueError(f"unknown ASR codec: {codec}")
+    if codec not in available():
+        raise ValueError(f"ASR codec {codec} needs the opuslib package and libopus")
+    return [codec, 'pcm'] if codec != 'pcm' else ['pcm']
+
+
+def negotiate(offered, response):
+    """
+    Pick the codec confirmed by the server's configuration response.
+
+    Servers that predate negotiation do not answer at all (`response` is then empty), in
+    which case raw PCM is sent.
+    """
+    codec = response.get('codec', 'pcm')
+    if codec not in offered:
+        return 'pcm'
+    return codec
+
+
+def encoder(codec, sample_rate=16000):
+    """Encoder for `codec`, or None for raw PCM (sent as is)."""
+    if codec == 'adpcm':
+        return AdpcmEncoder()
+    if codec == 'opus':
+        return OpusEncoder(sample_rate)
+    return None
+
+
+def decoder(codec, sample_rate=16000):
+    """Decoder for `codec`: its `decode` turns one message into int16 samples."""
+    if codec == 'adpcm':
+        return AdpcmDecoder()
+    if codec == 'opus':
+        return OpusDecoder(sample_rate)
+    return PcmDecoder()
+
+
+def adpcm_encode(samples, predictor, index):
+    """
+    IMA ADPCM-encode int16 `samples` from the given state, in pure Python.
+
+    Returns:
+        tuple: (bytes of 4-bit codes, first sample in the high nibble; (predictor, index) after them)
+    """
+    codes = []
+    for sample in samples.tolist():
+        step = _STEPS[index]
+        diff = sample - predictor
+        code = 8 if diff < 0 else 0
+        if code:
+            diff = -diff
+        delta = step >> 3
+        if diff >= step:
+            code |= 4
+            diff -= step
+            delta += step
+        step >>= 1
+        if diff >= step:
+            code |= 2
+            diff -= step
+            delta += step
+        step >>= 1
+        if diff >= step:
+            code |= 1
+            delta += step
+        predictor = max(-32768, predictor - delta) if code & 8 else min(32767, predictor + delta)
+        index = min(88, max(0, index + _INDEX_ADJUST[code]))
+        codes.append(code)
+    if len(codes) % 2:
+        codes.append(0)
+    codes = np.array(codes, dtype=np.uint8)
+    return (codes[0::2] << 4 | codes[1::2]).tobytes(), (predictor, index)
+
+
+def adpcm_decode(data, predictor, index):
+    """Decode IMA ADPCM `data` (as written by `adpcm_encode`) from the given state, in pure Python."""
+    packed = np.frombuffer(data, dtype=np.uint8)
+    codes = np.empty(2 * len(packed), dtype=np.uint8)
+    codes[0::2] = packed >> 4
+    codes[1::2] = packed & 15
+    samples = []
+    for code in codes.tolist():
+        step = _STEPS[index]
+        delta = step >> 3
+        if code & 4:
+            delta += step
+        if code & 2:
+            delta += step >> 1
+        if code & 1:
+            delta += step >> 2
+        predictor = max(-32768, predictor - delta) if code & 8 else min(32767, predictor + delta)
+        index = min(88, max(0, index + _INDEX_ADJUST[code]))
+        samples.append(predictor)
+    return np.array(samples, dtype=np.int16)
+
+
+class AdpcmEncoder:
+    """
+    IMA ADPCM at 4 bits per sample (64 kbit/s at 16 kHz, a quarter of raw PCM).
+
+    Every message starts with the coder state it was encoded from, so it decodes on its
+    own: messages can be dropped or sent again (as the uplink does after a stall or a
+    reconnect) without the server's decoder drifting. The state still carries over from
+    one message to the next, so there is no step-size ramp-up at each message.
+    """
+
+    def __init__(self) -> None:
+        self.predictor = 0
+        self.index = 0
+
+    def reset(self):
+        """Start over from the initial coder state."""
+        self.predictor = 0
+        self.index = 0
+
+    def encode(self, data):
+        """Encode a bytes-like chunk of int16 samples into one message."""
+        samples = np.frombuffer(data, dtype=np.int16)
+        header = _ADPCM_HEADER.pack(self.predictor, self.index, len(samples) % 2)
+        if len(samples) % 2:
+            samples = np.append(samples, samples[-1])  # whole bytes; the decoder drops it again
+        if audioop is not None:
+            codes, (self.predictor, self.index) = audioop.lin2adpcm(samples.tobytes(), 2, (self.predictor, self.index))
+        else:
+            codes, (self.predictor, self.index) = adpcm_encode(samples, self.predictor, self.index)
+        return header + codes
+
+
+class AdpcmDecoder:
+    """Decoder of `AdpcmEncoder` messages."""
+
+    def decode(self, message):
+        predictor, index, padded = _ADPCM_HEADER.unpack_from(message)
+        data = message[_ADPCM_HEADER.size:]
+        if audioop is not None:
+            samples = np.frombuffer(audioop.adpcm2lin(data, 2, (predictor, index))[0], dtype=np.int16)
+        else:
+            samples = adpcm_decode(data, predictor, index)
+        return samples[:len(samples) - padded]
+
+
+class OpusEncoder:
+    """
+    Opus (VoIP mode) through `opuslib`, `bitrate` bits per second.
+
+    Opus codes fixed frames of `frame` seconds; a message carries as many as its samples
+    fill, each prefixed with its 2-byte length, and samples short of a frame wait for
+    the next message.
+    """
+
+    def __init__(self, sample_rate=16000, bitrate=24000, frame=0.02) -> None:
+        self.frame_size = int(frame * sample_rate)
+        self.encoder = opuslib.Encoder(sample_rate, 1, opuslib.APPLICATION_VOIP)
+        self.encoder.bitrate = bitrate
+        self.pending = b""
+
+    def encode(self, data):
+        data = self.pending + bytes(data)
+        frame_bytes = 2 * self.frame_size
+        packets = []
+        for start in range(0, len(data) - frame_bytes + 1, frame_bytes):
+            packet = self.encoder.encode(data[start:start + frame_bytes], self.frame_size)
+            packets.append(struct.pack('>H', len(packet)) + packet)
+        self.pending = data[len(packets) * frame_bytes:]
+        return b"".join(packets)
+
+    def reset(self):
+        """Drop the samples short of a frame, e.g. when the stream starts over elsewhere."""
+        self.pending = b""
+
+
+class OpusDecoder:
+    """Decoder of `OpusEncoder` messages."""
+
+    def __init__(self, sample_rate=16000, frame=0.02) -> None:
+        self.frame_size = int(frame * sample_rate)
+        self.decoder = opuslib.Decoder(sample_rate, 1)
+
+    def decode(self, message):
+        pcm = []
+        offset = 0
+        while offset < len(message):
+            (length,) = struct.unpack_from('>H', message, offset)
+            offset += 2
+            pcm.append(self.decoder.decode(bytes(message[offset:offset + length]), self.frame_size))
+            offset += length
+        return np.frombuffer(b"".join(pcm), dtype=np.int16)
+
+
+class PcmDecoder:
+    """Raw int16 PCM, as sent without a codec."""
+
+    def decode(self, message):
+        return np.frombuffer(message, dtype=np.int16)
@@ -0,0 +1,387 @@
+import math
+import time
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from audio_capture import AudioCapture
+
+MIXES = ('mean', 'best')
+
+
+class Resampler:
+    """
+    Streaming polyphase resampler between any two integer rates, vectorized per block.
+
+    The rate ratio is reduced to `up`/`down`; a Kaiser-windowed sinc low-pass, designed
+    at the `up` times oversampled rate with its cutoff below the lower of the two Nyquist
+    frequencies, is split into `up` phases of `taps` coefficients. Output sample `n` is
+    the dot product of the `taps` input samples ending at `n * down // up` with phase
+    `n * down % up`, so a whole block is one gather and one row-wise dot product; the
+    last `taps - 1` input samples are carried over to the next block. The phases and
+    input offsets repeat every `up` outputs, so they are laid out once per output of a
+    period (and repeated for the longest block seen) and a block takes a slice of them.
+    For an integer decimation (`up` = 1) the input windows are a strided view as well.
+    """
+
+    def __init__(self, input_rate, output_rate=16000, zeros=8, rolloff=0.9, beta=8.6) -> None:
+        """
+        Initializes the resampler and designs its filter.
+
+        Args:
+            input_rate (int): Sampling rate of the input.
+            output_rate (int): Sampling rate of the output.
+            zeros (int): Zero crossings of the sinc on each side, at the lower rate; more
+                gives a sharper cutoff for more taps.
+            rolloff (float): Cutoff as a fraction of the lower Nyquist frequency.
+            beta (float): Kaiser window shape; 8.6 gives about 80 dB stopband attenuation.
+        """
+        divisor = math.gcd(int(input_rate), int(output_rate))
+        self.up = int(output_rate) // divisor
+        self.down = int(input_rate) // divisor
+        scale = max(self.up, self.down)
+        self.taps = -(-2 * zeros * scale // self.up)
+        length = self.taps * self.up
+        cutoff = rolloff / (2 * scale)  # cycles per oversampled sample
+        t = np.arange(length) - (length - 1) / 2
+        prototype = 2 * cutoff * np.sinc(2 * cutoff * t) * np.kaiser(length, beta) * self.up
+        # bank[phase, k] weighs input `i0 - (taps - 1 - k)`: the phases reversed to run
+        # along the input window in time order
+        self.bank = prototype.reshape(self.taps, self.up).T[:, ::-1].astype(np.float32)
+        self._history = np.zeros(self.taps - 1, dtype=np.float32)
+        self._consumed = 0  # input samples received so far
+        self._next = 0      # index of the next output sample
+        self._layout(0)
+
+    def _layout(self, count):
+        """Lay the phases and input offsets out for blocks of up to `count` outputs."""
+        n = np.arange(self.up + count, dtype=np.int64) * self.down
+        self._offsets = n // self.up  # newest input of output n, relative to the period start
+        self._phases = self.bank[n % self.up]
+        self._capacity = count
+
+    def process(self, samples):
+        """Resample a block of float32 samples; returns the output samples it completes."""
+        buffer = np.concatenate((self._history, samples))
+        total = self._consumed + len(samples)
+        last = (total * self.up - 1) // self.down  # last output whose input has all arrived
+        count = last + 1 - self._next
+        if count > self._capacity:
+            self._layout(count)
+        period, first = divmod(self._next, self.up)
+        start = period * self.down - self._consumed  # period start, as an index of the windows
+        windows = sliding_window_view(buffer, self.taps)
+        if self.up == 1:
+            windows = windows[start:start + count * self.down:self.down]
+        else:
+            windows = windows[start + self._offsets[first:first + count]]
+        output = np.einsum('ij,ij->i', windows, self._phases[first:first + count])
+        self._history = buffer[len(buffer) - (self.taps - 1):]
+        self._consumed = total
+        self._next = last + 1
+        return output
+
+
+class ChannelMixer:
+    """
+    Reduces multi-channel frames to one channel: the mean of all channels, or the best
+    channel of a microphone array.
+
+    `best` keeps, per channel, a noise floor (the frame variance, followed down at once and
+    up slowly) and a smoothed signal-to-noise ratio, and switches to another channel only
+    when its ratio is `switch_db` better, so a talker moving between microphones does not
+    make it flap. A switch crossfades over one frame.
+    """
+
+    def __init__(self, mix='best', switch_db=3.0, smoothing=0.9, floor_rise=1.002) -> None:
+        """
+        Initializes the mixer.
+
+        Args:
+            mix (str): 'mean' or 'best'.
+            switch_db (float): SNR advantage in dB a channel needs to be switched to.
+            smoothing (float): Per-frame smoothing factor of the SNR estimates.
+            floor_rise (float): Per-frame factor the noise floors may rise by.
+        """
+        if mix not in MIXES:
+            raise ValueError(f"unknown channel mix: {mix}")
+        self.mix = mix
+        self.switch_db = switch_db
+        self.smoothing = smoothing
+        self.floor_rise = floor_rise
+        self.channel = 0
+        self.switches = 0
+        self._floor = None
+        self._snr = None
+
+    def process(self, frame):
+        """Mix a float32 (samples, channels) frame down to float32 samples."""
+        if frame.ndim == 1 or frame.shape[1] == 1:
+            return frame.reshape(-1)
+        if self.mix == 'mean':
+            return frame.mean(axis=1)
+        mean = frame.mean(axis=0)  # a DC offset is not signal
+        energy = np.einsum('ij,ij->j', frame, frame) / len(frame) - mean * mean + 1.0
+        if self._floor is None:
+            self._floor = energy.copy()
+            self._snr = np.zeros(len(energy), dtype=np.float32)
+        self._floor = np.minimum(energy, self._floor * self.floor_rise)
+        snr = 10 * np.log10(energy / self._floor)
+        self._snr = self.smoothing * self._snr + (1 - self.smoothing) * snr
+        best = int(np.argmax(self._snr))
+        previous = self.channel
+        if best != previous and self._snr[best] > self._snr[previous] + self.switch_db:
+            self.channel = best
+            self.switches += 1
+            fade = np.linspace(0.0, 1.0, len(frame), dtype=np.float32)
+            return frame[:, previous] * (1 - fade) + frame[:, best] * fade
+        return frame[:, self.channel]
+
+
+class HighPass:
+    """
+    First-order high-pass (DC blocker) `y[n] = x[n] - x[n-1] + a * y[n-1]`, removing
+    DC offset and rumble below `cutoff`.
+
+    The recursion is solved in closed form, `y[n] = a^(n+1) y[-1] + a^n * cumsum(d[k] / a^k)`,
+    which NumPy evaluates without a loop over samples. The rounding error of each term
+    scales with `a^-k` and is scaled back by `a^n`, so it stays relative; only overflow
+    bounds a segment, at thousands of samples (one frame takes a single segment).
+    """
+
+    def __init__(self, cutoff=80.0, sample_rate=16000) -> None:
+        """
+        Initializes the filter.
+
+        Args:
+            cutoff (float): -3 dB frequency in Hz.
+            sample_rate (int): Sampling rate of the samples.
+        """
+        self.a = math.exp(-2 * math.pi * cutoff / sample_rate)
+        self.segment = max(1, min(1 << 16, int(100 * math.log(10) / -math.log(self.a))))  # a^-segment < 1e100
+        self._powers = self.a ** np.arange(self.segment)
+        self._inverse = 1 / self._powers
+        self._x = 0.0
+        self._y = 0.0
+
+    def process(self, samples):
+        """Filter float32 samples, continuing from the previous block."""
+        if not len(samples):
+            return samples
+        output = np.empty(len(samples), dtype=np.float32)
+        for start in range(0, len(samples), self.segment):
+            x = samples[start:start + self.segment]
+            inverse = self._inverse[:len(x)]
+            terms = x * inverse  # (x[k] - x[k-1]) / a^k, in float64
+            terms[1:] -= x[:-1] * inverse[1:]
+            terms[0] -= self._x
+            np.cumsum(terms, out=terms)
+            terms += self.a * self._y
+            terms *= self._powers[:len(x)]
+            output[start:start + len(x)] = terms
+            self._x = float(x[-1])
+            self._y = float(terms[-1])
+        return output
+
+
+class Agc:
+    """
+    Automatic gain control towards a target speech level.
+
+    The level follows the RMS of frames above the `gate` (speech, not background noise),
+    rising fast and falling slowly; the gain brings it to `target_dbfs`, within
+    `max_gain_db`, and never lets a frame's peak clip. Background noise keeps the gain
+    of the last speech instead of being boosted. The gain is ramped over each frame, so
+    changes do not click.
+    """
+
+    def __init__(self, target_dbfs=-20.0, max_gain_db=20.0, gate_dbfs=-50.0, attack=0.3, release=0.02) -> None:
+        """
+        Initializes the AGC.
+
+        Args:
+            target_dbfs (float): Speech level to bring the audio to, in dBFS.
+            max_gain_db (float): Largest gain applied, in dB (attenuation is not limited).
+            gate_dbfs (float): Frames quieter than this do not update the level.
+            attack (float): Per-frame smoothing factor while the level rises.
+            release (float): Per-frame smoothing factor while the level falls.
+        """
+        self.target = 32768 * 10 ** (target_dbfs / 20)
+        self.max_gain = 10 ** (max_gain_db / 20)
+        self.gate = 32768 * 10 ** (gate_dbfs / 20)
+        self.attack = attack
+        self.release = release
+        self.level = None
+        self.gain = 1.0
+        self._ramp = np.zeros(0, dtype=np.float32)
+
+    def process(self, samples):
+        """Apply the gain to float32 samples and update it from them."""
+        if not len(samples):
+            return samples
+        rms = math.sqrt(float(np.dot(samples, samples)) / len(samples))
+        if rms > self.gate:
+            if self.level is None:
+                self.level = rms
+            else:
+                self.level += (rms - self.level) * (self.attack if rms > self.level else self.release)
+        gain = min(self.max_gain, self.target / self.level) if self.level else 1.0
+        peak = max(float(samples.max()), -float(samples.min()))
+        if peak * gain > 32000:
+            gain = 32000 / peak
+        previous, self.gain = self.gain, gain
+        if gain == previous:
+            return samples * np.float32(gain)
+        if len(self._ramp) != len(samples):
+            self._ramp = np.arange(1, len(samples) + 1, dtype=np.float32) / len(samples)
+        return samples * (np.float32(previous) + np.float32(gain - previous) * self._ramp)
+
+
+class AudioFrontend:
+    """
+    Client-side audio front-end: turns frames from a device at its own rate and channel
+    count into the 16 kHz mono int16 audio the servers expect.
+
+    Channels are mixed down first (`ChannelMixer`), so only one channel is resampled
+    (`Resampler`), then the 16 kHz signal goes through the high-pass (`HighPass`) and
+    the AGC (`Agc`). Every stage works on whole frames with NumPy.
+    """
+
+    def __init__(self,
+                 input_rate,
+                 channels=1,
+                 sample_rate=16000,
+                 mix='best',
+                 highpass=80.0,
+                 agc=True,
+                 target_dbfs=-20.0,
+                 max_gain_db=20.0) -> None:
+        """
+        Initializes the front-end.
+
+        Args:
+            input_rate (int): Sampling rate of the input frames.
+            channels (int): Channels of the input frames.
+            sample_rate (int): Sampling rate of the output.
+            mix (str): 'best' channel or 'mean' of the channels.
+            highpass (float): High-pass cutoff in Hz, None to disable.
+            agc (bool): Apply automatic gain control.
+            target_dbfs (float): AGC target speech level in dBFS.
+            max_gain_db (float): AGC maximum gain in dB.
+        """
+        self.input_rate = input_rate
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.mixer = ChannelMixer(mix) if channels > 1 else None
+        self.resampler = Resampler(input_rate, sample_rate) if input_rate != sample_rate else None
+        self.highpass = HighPass(highpass, sample_rate) if highpass else None
+        self.agc = Agc(target_dbfs, max_gain_db) if agc else None
+        self.seconds = 0.0  # time spent processing
+
+    def process(self, frame):
+        """
+        Process one int16 frame, (samples,) or (samples, channels).
+
+        Returns:
+            np.ndarray: int16 mono samples at `sample_rate`; their count follows the
+            rate ratio and varies by a sample from frame to frame.
+        """
+        start = time.perf_counter()
+        samples = np.asarray(frame, dtype=np.float32)
+        if self.mixer:
+            samples = self.mixer.process(samples.reshape(len(samples), -1))
+        elif samples.ndim > 1:
+            samples = samples[:, 0]
+        if self.resampler:
+            samples = self.resampler.process(samples)
+        if self.highpass:
+            samples = self.highpass.process(samples)
+        if self.agc:
+            samples = self.agc.process(samples)
+        output = np.clip(np.rint(samples), -32768, 32767).astype(np.int16)
+        self.seconds += time.perf_counter() - start
+        return output
+
+    def stats(self):
+        return {
+            'channel': self.mixer.channel if self.mixer else 0,
+            'channel_switches': self.mixer.switches if self.mixer else 0,
+            'gain_db': round(20 * math.log10(self.agc.gain), 1) if self.agc else 0.0,
+            'frontend_seconds': round(self.seconds, 4),
+        }
+
+
+class FrontendCapture:
+    """
+    An audio source (`AudioCapture` interface) at any rate and channel count, seen
+    through an `AudioFrontend`: `read` returns 16 kHz mono int16 frames of exactly
+    `blocksize` samples, as the assistants' capture loops expect.
+    """
+
+    def __init__(self, capture, frontend, blocksize=320) -> None:
+        """
+        Initializes the wrapper.
+
+        Args:
+            capture: Audio source delivering frames in the front-end's input format.
+            frontend (AudioFrontend): Front-end to process the frames with.
+            blocksize (int): Samples per frame returned by `read`.
+        """
+        self.capture = capture
+        self.frontend = frontend
+        self.sample_rate = frontend.sample_rate
+        self.blocksize = blocksize
+        self._pending = np.zeros(0, dtype=np.int16)
+
+    @property
+    def paced(self):
+        return self.capture.paced
+
+    async def read(self):
+        """Return the next frame, or None when the source is exhausted."""
+        while len(self._pending) < self.blocksize:
+            frame = await self.capture.read()
+            if frame is None:
+                return None
+            self._pending = np.concatenate((self._pending, self.frontend.process(frame)))
+        frame, self._pending = self._pending[:self.blocksize], self._pending[self.blocksize:]
+        return frame
+
+    def stats(self):
+        return dict(self.capture.stats(), **self.frontend.stats())
+
+    async def __aenter__(self):
+        await self.capture.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.capture.__aexit__(exc_type, exc, tb)
+
+
+MAX_CHANNELS = 8  # sound servers such as PulseAudio report dozens of virtual inputs
+
+
+def open_device(device=None, channels=None, blocksize=320, sample_rate=16000, **options):
+    """
+    Capture an input device in its own default format, through an `AudioFrontend`.
+
+    Devices that only run at 44.1/48 kHz or deliver several microphones are opened as
+    they are, instead of failing or leaving the conversion to the OS.
+
+    Args:
+        device (int or str): Input device (index or name substring), None for the default.
+        channels (int): Channels to capture, None for all of the device's (up to `MAX_CHANNELS`).
+        blocksize (int): Samples per 16 kHz frame returned by `read`.
+        sample_rate (int): Sampling rate of the frames returned.
+        **options: Further `AudioFrontend` arguments (`mix`, `highpass`, `agc`, ...).
+
+    Returns:
+        FrontendCapture: The capture, to pass as `source`.
+    """
+    import sounddevice as sd
+    info = sd.query_devices(device, 'input')
+    input_rate = int(info['default_samplerate'])
+    channels = channels or max(1, min(MAX_CHANNELS, int(info['max_input_channels'])))
+    frontend = AudioFrontend(input_rate, channels, sample_rate, **options)
+    capture = AudioCapture(sample_rate=input_rate, channels=channels, device=device,
+                           blocksize=round(blocksize * input_rate / sample_rate))
+    return FrontendCapture(capture, frontend, blocksize)
@@ -0,0 +1,197 @@
+import asyncio
+import os
+import time
+import wave
+import numpy as np
+
+
+def load_audio(path, sample_rate=16000):
+    """
+    Load a 16-bit WAV file (first channel) or a headerless int16 PCM file.
+
+    Returns:
+        np.ndarray: int16 samples.
+    """
+    if path.lower().endswith('.wav'):
+        with wave.open(path, 'rb') as f:
+            if f.getsampwidth() != 2 or f.getframerate() != sample_rate:
+                raise ValueError(f"{path}: expected 16-bit {sample_rate} Hz audio, got "
+                                 f"{8 * f.getsampwidth()}-bit {f.getframerate()} Hz")
+            samples = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+            return samples.reshape(-1, f.getnchannels())[:, 0].copy()
+    return np.fromfile(path, dtype=np.int16)
+
+
+def save_wav(path, samples, sample_rate=16000):
+    """Write int16 mono samples as a 16-bit WAV file."""
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(np.asarray(samples, dtype=np.int16).tobytes())
+
+
+def open_source(path, sample_rate=16000, blocksize=320, speed=1.0):
+    """Open a WAV/PCM file or a directory of them as an audio source."""
+    if os.path.isdir(path):
+        return DirectorySource(path, sample_rate, blocksize, speed)
+    return FileSource(path, sample_rate, blocksize, speed)
+
+
+class ArraySource:
+    """
+    Audio source that plays int16 samples from memory in fixed-size frames; samples of
+    shape (samples, channels) give multi-channel frames, like a microphone array.
+
+    Like `AudioCapture` it is an async context manager whose `read` returns one frame;
+    at the end of the samples `read` returns None. Frames are paced at `speed` x real time
+    against the monotonic clock (not by sleeping a fixed time per frame, which drifts), or
+    handed out as fast as the consumer reads them when `speed` is None.
+    """
+
+    def __init__(self, samples, sample_rate=16000, blocksize=320, speed=1.0) -> None:
+        """
+        Initializes the source.
+
+        Args:
+            samples (np.ndarray): int16 samples to play, (samples,) or (samples, channels).
+            sample_rate (int): Sampling rate of the samples.
+            blocksize (int): Samples per frame returned by `read`.
+            speed (float): Playback speed relative to real time, None for as fast as possible.
+        """
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.blocksize = blocksize
+        self.speed = speed
+        self.position = 0
+        self._start = None
+
+    @property
+    def paced(self):
+        """Whether frames arrive at (a multiple of) real time, like from a microphone."""
+        return bool(self.speed)
+
+    async def read(self):
+        """Return the next frame, or None when the samples are exhausted."""
+        if self.position >= len(self.samples):
+            return None
+        frame = self.samples[self.position:self.position + self.blocksize]
+        if len(frame) < self.blocksize:
+            frame = np.pad(frame, [(0, self.blocksize - len(frame))] + [(0, 0)] * (frame.ndim - 1))
+        self.position += self.blocksize
+        if self.speed:
+            if self._start is None:
+                self._start = time.monotonic()
+            delay = self._start + self.position / self.sample_rate / self.speed - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        else:
+            await asyncio.sleep(0)  # let the receivers and the servers run between frames
+        return frame
+
+    def stats(self):
+        return {'position': self.position, 'seconds': self.position / self.sample_rate}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+
+class FileSource(ArraySource):
+    """Audio source that plays a WAV or raw int16 PCM file."""
+
+    def __init__(self, path, sample_rate=16000, blocksize=320, speed=1.0) -> None:
+        """
+        Initializes the source.
+
+        Args:
+            path (str): WAV or headerless int16 PCM file.
+            sample_rate (int): Expected sampling rate.
+            blocksize (int): Samples per frame returned by `read`.
+            speed (float): Playback speed relative to real time, None for as fast as possible.
+        """
+        super().__init__(load_audio(path, sample_rate), sample_rate, blocksize, speed)
+        self.path = path
+
+
+class DirectorySource(ArraySource):
+    """
+    Audio source that plays every WAV/PCM file of a directory (sorted by name) as one
+    stream, with `gap` seconds of silence between files.
+    """
+
+    def __init__(self, path, sample_rate=16000, blocksize=320, speed=1.0, gap=1.0) -> None:
+        """
+        Initializes the source.
+
+        Args:
+            path (str): Directory of WAV or headerless int16 PCM files.
+            sample_rate (int): Expected sampling rate.
+            blocksize (int): Samples per frame returned by `read`.
+            speed (float): Playback speed relative to real time, None for as fast as possible.
+            gap (float): Seconds of silence inserted after each file.
+        """
+        names = sorted(name for name in os.listdir(path) if name.lower().endswith(('.wav', '.pcm')))
+        if not names:
+            raise ValueError(f"{path}: no .wav or .pcm files")
+        silence = np.zeros(int(gap * sample_rate), dtype=np.int16)
+        parts = []
+        self.files = []  # (path, first sample, end sample) of each file in the stream
+        start = 0
+        for name in names:
+            samples = load_audio(os.path.join(path, name), sample_rate)
+            self.files.append((os.path.join(path, name), start, start + len(samples)))
+            parts += [samples, silence]
+            start += len(samples) + len(silence)
+        super().__init__(np.concatenate(parts), sample_rate, blocksize, speed)
+        self.path = path
+
+    def current_file(self):
+        """Path of the file being played, or None in a gap."""
+        for path, start, end in self.files:
+            if start <= self.position - self.blocksize < end:
+                return path
+        return None
+
+
+class NetworkSource:
+    """
+    Audio source reading a raw int16 PCM stream from an asyncio stream reader, e.g. a
+    TCP connection from a remote microphone. `read` returns None when the peer closes.
+    """
+
+    paced = True  # the remote microphone delivers in real time
+
+    def __init__(self, reader, sample_rate=16000, blocksize=320) -> None:
+        """
+        Initializes the source.
+
+        Args:
+            reader (asyncio.StreamReader): Stream delivering little-endian int16 samples.
+            sample_rate (int): Sampling rate of the stream.
+            blocksize (int): Samples per frame returned by `read`.
+        """
+        self.reader = reader
+        self.sample_rate = sample_rate
+        self.blocksize = blocksize
+        self.position = 0
+
+    async def read(self):
+        """Return the next frame, or None at the end of the stream."""
+        try:
+            data = await self.reader.readexactly(2 * self.blocksize)
+        except asyncio.IncompleteReadError:
+            return None
+        self.position += self.blocksize
+        return np.frombuffer(data, dtype=np.int16)
+
+    def stats(self):
+        return {'position': self.position, 'seconds': self.position / self.sample_rate}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
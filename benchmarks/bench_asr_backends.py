@@ -0,0 +1,97 @@
+"""
+The two ASR backends side by side on the same audio: the FunASR 2pass session of
+`Speech_Assistant` and the iFlytek RTASR client (`iflytek_asr.RtasrClient`), each
+against its local stand-in.
+
+The scripted dialogue (wake tone + command, repeated) is played to both. The assistant
+wakes on the tone and streams only the commands; the RTASR client transcribes the whole
+stream, paced by its own clock since the source is not. Reported per backend: finals
+sent by the server (and for RTASR how many of them the client received: a session
+ended by a renewal still has results to deliver), final latency (from the endpoint to
+the final result: the client VAD's for the assistant, the capture of the segment end
+the service reports for RTASR), uplink bytes the ASR server received, client CPU and
+reconnects.
+
+Scenarios: a clean network; connections aborted at random (`disconnect_rate` per
+message); and for RTASR a service session limit shorter than the dialogue, hit without
+renewal and avoided with it, also with results coming a second late, so a renewed
+session still has several to deliver after the switch.
+
+Usage:
+    python -m benchmarks.bench_asr_backends [commands] [speed]
+"""
+import asyncio
+import sys
+import time
+
+from benchmarks.scripted import ScriptedCapture, dialogue
+from iflytek_asr import RtasrClient
+from main import Speech_Assistant
+from mock_servers import AsrServer, KwsServer, NluServer, RtasrServer, serve_in_thread
+
+WORDS_NLU = [line.strip() for line in open('words_nlu.txt', encoding='utf-8') if line.strip()]
+TRANSCRIPTS = ['打开相机', '关闭蓝牙']
+APP_ID, API_KEY = 'bench', 'bench-key'
+
+
+def run_client(client):
+    start = time.thread_time()  # the servers run on their own thread
+    asyncio.run(client.run())
+    return time.thread_time() - start
+
+
+def funasr(commands, speed, disconnect_rate):
+    kws = KwsServer(port=0)
+    asr = AsrServer(port=0, transcripts=TRANSCRIPTS, disconnect_rate=disconnect_rate, seed=1)
+    nlu = NluServer(port=0)
+    serve_in_thread(kws, asr, nlu)
+    assistant = Speech_Assistant(uri_kws=kws.uri, uri_asr=asr.uri, uri_nlu=nlu.uri, words_nlu=WORDS_NLU,
+                                 source=ScriptedCapture(dialogue(commands, seed=0), speed=speed), verbose=False)
+    cpu = run_client(assistant)
+    final = assistant.metrics.histogram('final_latency_seconds')
+    return {'finals': asr.finals, 'final': final, 'bytes': asr.bytes_received, 'cpu': cpu,
+            'reconnects': assistant.asr_link.reconnects, 'renewals': 0, 'expired': 0}
+
+
+def rtasr(commands, speed, disconnect_rate, session_limit=None, renew_after=None, latency=0.0):
+    server = RtasrServer(port=0, transcripts=TRANSCRIPTS, app_id=APP_ID, api_key=API_KEY,
+                         session_limit=session_limit, disconnect_rate=disconnect_rate, latency=latency, seed=1)
+    serve_in_thread(server)
+    client = RtasrClient(uri=server.uri, app_id=APP_ID, api_key=API_KEY, pace=speed, renew_after=renew_after,
+                         source=ScriptedCapture(dialogue(commands, seed=0), speed=None), verbose=False)
+    cpu = run_client(client)
+    final = client.metrics.histogram('final_latency_seconds')
+    return {'finals': server.finals, 'received': client.metrics.value('finals_total'), 'final': final,
+            'bytes': server.bytes_received, 'cpu': cpu, 'reconnects': client.link.reconnects, 'renewals': client.renewals, 'expired': server.expired,
+            'speakers': sorted({segment.speaker for segment in client.transcript.segments})}
+
+
+def report(label, result, commands):
+    final = result['final']
+    latency = (f"p50 {1000 * final.quantile(0.5):5.0f} p95 {1000 * final.quantile(0.95):5.0f} ms"
+               if final else "            n/a")
+    speakers = f", speakers {result['speakers']}" if 'speakers' in result else ""
+    received = f" ({result['received']} received)" if 'received' in result else ""
+    print(f"{label:>34}: finals {result['finals']:>2}/{commands}{received}, final latency {latency}, "
+          f"uplink {result['bytes'] / 1000:6.1f} kB, cpu {1000 * result['cpu']:5.0f} ms, "
+          f"reconnects {result['reconnects']}, renewals {result['renewals']}, "
+          f"expired {result['expired']}{speakers}")
+
+
+def main(commands, speed):
+    seconds = len(dialogue(commands, seed=0)) / 16000
+    print(f"{commands} commands, {seconds:.1f} s of audio at {speed}x real time")
+    for disconnect_rate in (0.0, 0.01):
+        network = f"disconnect {disconnect_rate:.0%}/msg" if disconnect_rate else "clean"
+        report(f"funasr 2pass, {network}", funasr(commands, speed, disconnect_rate), commands)
+        report(f"rtasr, {network}", rtasr(commands, speed, disconnect_rate), commands)
+    limit = seconds / 3
+    report(f"rtasr, {limit:.0f} s session limit", rtasr(commands, speed, 0.0, session_limit=limit), commands)
+    report(f"rtasr, limit, renew after {limit / 2:.0f} s",
+           rtasr(commands, speed, 0.0, session_limit=limit, renew_after=limit / 2 / speed), commands)
+    report("rtasr, renew, results 1 s late",
+           rtasr(commands, speed, 0.0, session_limit=limit, renew_after=limit / 2 / speed, latency=1.0), commands)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 6, float(sys.argv[2]) if len(sys.argv) > 2 else 2.0)
@@ -0,0 +1,118 @@
+"""
+Tail latency of ASR routing between the 2pass server and iFlytek RTASR.
+
+`Speech_Assistant` plays wake word + command dialogues against the local stand-ins,
+with slowness injected into the ASR servers: the 2pass stand-in is usually fast but
+jittery and degrades halfway through the run (a slow node or a congested path), while
+the RTASR stand-in is steadily a bit slower. Runs compared:
+
+    funasr         the 2pass server alone, as without a router
+    rtasr          RTASR alone, through the router
+    fastest        each utterance to the backend with the lowest expected latency
+    hedge          each utterance to both, first final result wins
+
+Reported per run: final result latency (from the end of speech to the final result)
+p50/p95/max, commands matched, how the router spread the utterances, and how many
+utterances still went to the 2pass stand-in after it slowed down. `fastest` only learns
+of the slowdown from a slow final result, so the utterance that brings it in is slow; a
+2pass final this late can also overlap the next wake word, which is then missed (as
+happens several times with the 2pass server alone), so `fastest` may lose a command
+there that `hedge` does not.
+
+Last, the 2pass stand-in loses its first final result while commands follow back to
+back (barge-in), so the next utterance is routed while that result is still awaited: the
+router has to give up on it and pass it on as empty, or every later result is taken for
+the utterance before it.
+
+Usage:
+    python -m benchmarks.bench_asr_router [commands] [speed]
+"""
+import asyncio
+import sys
+
+from asr_router import AsrRouter
+from asr_session import AsrSession, twopass_config
+from benchmarks.scripted import SAMPLE_RATE, ScriptedCapture, dialogue
+from iflytek_asr import RtasrAsrSession
+from main import Speech_Assistant
+from mock_servers import AsrServer, KwsServer, NluServer, RtasrServer, serve_in_thread
+
+WORDS_NLU = [line.strip() for line in open('words_nlu.txt', encoding='utf-8') if line.strip()]
+TRANSCRIPTS = ['打开相机', '关闭蓝牙']
+APP_ID, API_KEY = 'bench', 'bench-key'
+FUNASR_FAULTS = dict(latency=0.05, jitter=0.15)
+FUNASR_DEGRADED = 0.5  # seconds added to the 2pass stand-in's latency halfway
+RTASR_FAULTS = dict(latency=0.15, jitter=0.1)
+
+
+def open_backends(asr, rtasr):
+    return {
+        'funasr': lambda: AsrSession(asr.uri, twopass_config({})).open(),
+        'rtasr': lambda: RtasrAsrSession(rtasr.uri, APP_ID, API_KEY).open(),
+    }
+
+
+def run(label, commands, speed, kws, nlu):
+    asr = AsrServer(port=0, transcripts=TRANSCRIPTS, seed=1, **FUNASR_FAULTS)
+    rtasr = RtasrServer(port=0, transcripts=TRANSCRIPTS, app_id=APP_ID, api_key=API_KEY, seed=2, **RTASR_FAULTS)
+    serve_in_thread(asr, rtasr)
+    samples = dialogue(commands, seed=0)
+
+    routed_before = {}
+
+    async def degrade():
+        asr.faults.latency += FUNASR_DEGRADED
+        if router:
+            routed_before.update({backend.name: backend.routed for backend in router.backends})
+    capture = ScriptedCapture(samples, speed=speed, actions={len(samples) / SAMPLE_RATE / 2: degrade})
+
+    backends = open_backends(asr, rtasr)
+    if label == 'rtasr':
+        router = AsrRouter({'rtasr': backends['rtasr']})
+    elif label in ('fastest', 'hedge'):
+        router = AsrRouter(backends, routing=label)
+    else:
+        router = None
+    assistant = Speech_Assistant(uri_kws=kws.uri, uri_asr=asr.uri, uri_nlu=nlu.uri, words_nlu=WORDS_NLU,
+                                 asr_router=router, source=capture, verbose=False)
+    asyncio.run(assistant.run())
+    final = assistant.metrics.histogram('final_latency_seconds')
+    spread = ""
+    if router and len(router.backends) > 1:
+        spread = ", " + ", ".join(f"{b.name} routed {b.routed} won {b.wins}" for b in router.backends)
+        funasr = router.backends[0]
+        spread += f"; after the slowdown funasr routed {funasr.routed - routed_before.get(funasr.name, 0)}"
+    print(f"{label:>8}: final latency p50 {1000 * final.quantile(0.5):4.0f} p95 {1000 * final.quantile(0.95):4.0f} "
+          f"max {1000 * final.max:4.0f} ms, commands {assistant.stats()['commands']}/{commands}{spread}")
+
+
+def lost_final(commands, speed, kws, nlu):
+    asr = AsrServer(port=0, transcripts=TRANSCRIPTS, seed=1)
+    rtasr = RtasrServer(port=0, transcripts=TRANSCRIPTS, app_id=APP_ID, api_key=API_KEY, seed=2)
+    serve_in_thread(asr, rtasr)
+    asr.lose_finals = 1
+    router = AsrRouter(open_backends(asr, rtasr), final_timeout=0.5)
+    assistant = Speech_Assistant(uri_kws=kws.uri, uri_asr=asr.uri, uri_nlu=nlu.uri, words_nlu=WORDS_NLU,
+                                 asr_router=router, barge_in=True, verbose=False,
+                                 source=ScriptedCapture(dialogue(commands, seed=0), speed=speed))
+    asyncio.run(assistant.run())
+    commands_matched = assistant.stats()['commands']
+    given_up = assistant.metrics.value('final_timeouts_total')
+    ok = commands_matched == commands - 1 and not given_up and not router.outstanding
+    print(f"lost final: {'PASS' if ok else 'FAIL'} (commands {commands_matched}/{commands - 1}, "
+          f"results the assistant gave up on {given_up}, still outstanding in the router {len(router.outstanding)})")
+
+
+def main(commands, speed):
+    kws = KwsServer(port=0)
+    nlu = NluServer(port=0)
+    serve_in_thread(kws, nlu)
+    print(f"{commands} commands at {speed}x; 2pass stand-in {FUNASR_FAULTS}, +{FUNASR_DEGRADED} s latency "
+          f"from halfway; RTASR stand-in {RTASR_FAULTS}")
+    for label in ('funasr', 'rtasr', 'fastest', 'hedge'):
+        run(label, commands, speed, kws, nlu)
+    lost_final(min(commands, 4), speed, kws, nlu)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 16, float(sys.argv[2]) if len(sys.argv) > 2 else 1.5)
@@ -0,0 +1,79 @@
+"""
+Per-command ASR latency: a fresh connection per utterance versus one persistent
+`AsrSession` with `start_utterance`/`stop_utterance`.
+
+Runs against a local `wss://` `mock_servers.AsrServer` with simulated model
+initialization time. Latency is measured from the moment the command audio is ready
+(the wake-up) to the `2pass-offline` result.
+
+Usage:
+    python -m benchmarks.bench_asr_session [utterances] [init_delay_ms]
+"""
+import asyncio
+import statistics
+import sys
+import time
+import numpy as np
+
+from asr_session import AsrSession
+from mock_servers import AsrServer, self_signed_context
+
+SAMPLE_RATE = 16000
+CONFIG = {"mode": "2pass", "chunk_size": [5, 10, 5], "chunk_interval": 10,
+          "encoder_chunk_look_back": 4, "decoder_chunk_look_back": 0,
+          "wav_name": "microphone", "hotwords": "{}", "itn": True}
+
+
+def command_audio(seconds=1.0):
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    speech = rng.normal(0, 2500, len(t)) * (np.abs(np.sin(2 * np.pi * 4 * t)) + 0.2)
+    return np.clip(speech, -32768, 32767).astype(np.int16)
+
+
+async def utterance(session, audio):
+    await session.start_utterance()
+    for start in range(0, len(audio), 960):
+        await session.send_audio(audio[start:start + 960].tobytes())
+    await session.stop_utterance()
+    while (await session.recv())['mode'] != '2pass-offline':
+        pass
+
+
+async def per_utterance_connection(uri, audio, count):
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        session = await AsrSession(uri, CONFIG).open()
+        await utterance(session, audio)
+        latencies.append(time.perf_counter() - start)
+        await session.close()
+    return latencies
+
+
+async def persistent_session(uri, audio, count):
+    session = await AsrSession(uri, CONFIG).open()
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        await utterance(session, audio)
+        latencies.append(time.perf_counter() - start)
+    await session.close()
+    return latencies
+
+
+async def main(count, init_delay):
+    audio = command_audio()
+    async with AsrServer(port=0, ssl_context=self_signed_context(), init_delay=init_delay) as server:
+        for label, strategy in (('reconnect per command', per_utterance_connection),
+                                ('persistent session', persistent_session)):
+            latencies = await strategy(server.uri, audio, count)
+            later = latencies[1:] or latencies
+            print(f"{label:>22}: first {1000 * latencies[0]:6.1f} ms, "
+                  f"later p50 {1000 * statistics.median(later):6.1f} ms")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    init_delay = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.15
+    asyncio.run(main(count, init_delay))
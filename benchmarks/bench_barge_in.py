@@ -0,0 +1,92 @@
+"""
+Barge-in benchmark: the same scripted audio with and without `barge_in`, against local
+stand-in servers whose results come `latency` seconds late.
+
+The script alternates two patterns, `commands` times each:
+
+    interrupted    wake word, 0.8 s of speech, the wake word again, the real command
+    back to back   command, and the next wake word as soon as the speaker paused
+
+Without barge-in the KWS stream pauses for the whole command, so the second wake word
+of an interrupted command is sent to ASR as part of it, and a wake word said before the
+previous command's result came back is not heard. With barge-in the KWS stream goes on
+during ASR: the interrupted utterance is cancelled and restarted, and the next command
+starts while the previous result is still outstanding.
+
+Usage:
+    python -m benchmarks.bench_barge_in [commands] [latency_ms]
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import numpy as np
+
+from benchmarks.scripted import SAMPLE_RATE, ScriptedCapture, silence, speech
+from main import Speech_Assistant
+from metrics import Metrics
+from mock_servers import AsrServer, KwsServer, NluServer, serve_in_thread, wake_tone
+
+WORDS_NLU = [line.strip() for line in open('words_nlu.txt', encoding='utf-8') if line.strip()]
+
+
+def script(commands, seed=0):
+    """Interrupted and back-to-back commands; returns int16 samples and the wake words said."""
+    rng = np.random.default_rng(seed)
+    parts, wakes = [silence(0.5, rng)], 0
+    for i in range(commands):
+        parts += [wake_tone(0, 0.5), speech(0.8, rng), wake_tone(1, 0.5), speech(1.2, rng), silence(1.5, rng)]
+        wakes += 2
+    for i in range(commands):
+        # The pause is just over the VAD hangover: the command ends, its result is not back yet
+        parts += [wake_tone(i % 2, 0.5), speech(1.2, rng), silence(0.6, rng)]
+        wakes += 1
+    parts.append(silence(1.5, rng))
+    return np.clip(np.concatenate(parts), -32768, 32767).astype(np.int16), wakes
+
+
+async def run(name, barge_in, samples, servers, events):
+    kws, asr, nlu = servers
+    metrics = Metrics(jsonl=events)
+    assistant = Speech_Assistant(uri_kws=kws.uri, uri_asr=asr.uri, uri_nlu=nlu.uri, words_nlu=WORDS_NLU,
+                                 source=ScriptedCapture(samples), metrics=metrics, name=name,
+                                 barge_in=barge_in, verbose=False)
+    await assistant.run()
+    metrics.close()
+
+    counts = {'wake': 0, 'barge_in': 0, 'utterance': 0, 'timeout': 0}
+    responses = []
+    with open(events, encoding='utf-8') as f:
+        for line in f:
+            event = json.loads(line)
+            if event.get('session') != name or event['event'] not in counts:
+                continue
+            counts[event['event']] += 1
+            if event['event'] == 'utterance' and 'speech_end_ms' in event and 'matched_ms' in event:
+                responses.append(event['matched_ms'] - event['speech_end_ms'])
+    return counts, assistant.stats()['commands'], responses
+
+
+async def main(commands, latency):
+    kws = KwsServer(port=0)
+    asr = AsrServer(port=0, transcripts=['打开相机', '关闭蓝牙'], latency=latency)
+    nlu = NluServer(port=0)
+    serve_in_thread(kws, asr, nlu)
+    samples, wakes = script(commands)
+    print(f"{len(samples) / SAMPLE_RATE:.1f} s of audio: {commands} interrupted and {commands} back-to-back "
+          f"commands ({wakes} wake words, {2 * commands} commands), ASR results {1000 * latency:.0f} ms late")
+    with tempfile.TemporaryDirectory() as scratch:
+        for name, barge_in in (('serial', False), ('barge-in', True)):
+            counts, matched, responses = await run(name, barge_in, samples, (kws, asr, nlu),
+                                                   os.path.join(scratch, 'events.jsonl'))
+            response = f"{np.median(responses):.0f}" if responses else "-"
+            print(f"{name:>9}: wakes {counts['wake']}/{wakes}, barge-ins {counts['barge_in']}, "
+                  f"commands {matched}/{2 * commands}, timeouts {counts['timeout']}, "
+                  f"response p50 {response} ms")
+
+
+if __name__ == "__main__":
+    commands = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.8
+    asyncio.run(main(commands, latency))
@@ -0,0 +1,99 @@
+"""
+ASR uplink codecs: bandwidth, encode CPU, quality and added latency.
+
+Part one encodes a synthetic utterance (noise "speech" between silences) in the 60 ms
+windows the assistant sends, with every codec available here (Opus needs opuslib), and
+reports the bit rate on the wire, the encode CPU per second of audio, the SNR after
+decoding, and the latency the codec adds: audio held back waiting for a full frame.
+ADPCM is measured both with the `audioop` accelerator (when the interpreter still has
+it) and in pure Python.
+
+Part two runs `Speech_Assistant` with each codec against the local stand-ins, which
+decode the audio before their VAD and partials, and reports the ASR bytes the server
+received relative to raw PCM, commands matched and response latency.
+
+Usage:
+    python -m benchmarks.bench_codec [commands]
+"""
+import asyncio
+import sys
+import time
+import numpy as np
+
+import audio_codec
+from benchmarks.scripted import SAMPLE_RATE, ScriptedCapture, dialogue, silence, speech
+from main import Speech_Assistant
+from mock_servers import AsrServer, KwsServer, NluServer, serve_in_thread
+
+WORDS_NLU = [line.strip() for line in open('words_nlu.txt', encoding='utf-8') if line.strip()]
+WINDOW = 960
+
+
+def utterance(seed=0):
+    rng = np.random.default_rng(seed)
+    parts = [silence(0.5, rng), speech(3.0, rng), silence(0.5, rng), speech(2.0, rng), silence(1.0, rng)]
+    return np.clip(np.concatenate(parts), -32768, 32767).astype(np.int16)
+
+
+def measure(codec, samples, pure_python=False):
+    accelerator = audio_codec.audioop
+    if pure_python:
+        audio_codec.audioop = None
+    try:
+        encoder, decoder = audio_codec.encoder(codec), audio_codec.decoder(codec)
+        windows = [samples[i:i + WINDOW].tobytes() for i in range(0, len(samples) - WINDOW + 1, WINDOW)]
+        start = time.process_time()
+        messages = [encoder.encode(window) if encoder else window for window in windows]
+        cpu = time.process_time() - start
+        decoded = np.concatenate([decoder.decode(message) for message in messages])
+    finally:
+        audio_codec.audioop = accelerator
+    seconds = len(windows) * WINDOW / SAMPLE_RATE
+    held = len(getattr(encoder, 'pending', b"")) // 2  # samples waiting for a full codec frame
+    reference = samples[:len(decoded)].astype(np.float64)
+    noise = np.sum((reference - decoded) ** 2)
+    snr = 10 * np.log10(np.sum(reference ** 2) / noise) if noise else float('inf')
+    return {
+        'kbit/s': 8 * sum(len(m) for m in messages) / seconds / 1000,
+        'encode ms per s': 1000 * cpu / seconds,
+        'snr_db': snr,
+        'added latency ms': 1000 * max(held, getattr(encoder, 'frame_size', 0)) / SAMPLE_RATE if codec == 'opus' else 0.0,
+    }
+
+
+async def end_to_end(codec, commands):
+    kws = KwsServer(port=0)
+    asr = AsrServer(port=0, transcripts=['打开相机', '关闭蓝牙'])
+    nlu = NluServer(port=0)
+    serve_in_thread(kws, asr, nlu)
+    assistant = Speech_Assistant(uri_kws=kws.uri, uri_asr=asr.uri, uri_nlu=nlu.uri, words_nlu=WORDS_NLU,
+                                 source=ScriptedCapture(dialogue(commands, seed=0), speed=4.0),
+                                 asr_codec=codec, asr_standby=False, verbose=False)
+    await assistant.run()
+    return assistant.asr.codec, asr.bytes_received, assistant.stats()
+
+
+def main(commands):
+    samples = utterance()
+    print(f"{len(samples) / SAMPLE_RATE:.1f} s utterance in {WINDOW}-sample windows")
+    print(f"{'codec':>16} {'kbit/s':>8} {'encode ms/s':>12} {'SNR dB':>7} {'added ms':>9}")
+    rows = [(codec, codec, False) for codec in audio_codec.available()]
+    if audio_codec.audioop is not None:
+        rows.insert(rows.index(('adpcm', 'adpcm', False)) + 1, ('adpcm (python)', 'adpcm', True))
+    for label, codec, pure_python in rows:
+        result = measure(codec, samples, pure_python)
+        print(f"{label:>16} {result['kbit/s']:>8.1f} {result['encode ms per s']:>12.2f} "
+              f"{result['snr_db']:>7.1f} {result['added latency ms']:>9.1f}")
+
+    print(f"\nend to end, {commands} commands at 4x (ASR bytes relative to raw PCM):")
+    baseline = None
+    for codec in reversed(audio_codec.available()):  # 'pcm' first
+        negotiated, received, stats = asyncio.run(end_to_end(codec, commands))
+        baseline = baseline or received
+        print(f"{codec:>16}: negotiated {negotiated}, server received {received / 1000:.1f} kB "
+              f"({100 * received / baseline:.0f}%), commands {stats['commands']}/{commands}, "
+              f"latency p50 {stats['latency_p50_ms']} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 4)
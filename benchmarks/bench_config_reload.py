@@ -0,0 +1,90 @@
+"""
+Word list hot reload: `Speech_Assistant` plays wake word + command dialogues against the
+local stand-ins while a `config.ConfigWatcher` polls a copy of the word list files.
+
+Halfway through, all three files are rewritten: the keywords are reordered (the wake tone
+the KWS stand-in maps to the first keyword now names another one), a hotword is added,
+and the command "关闭蓝牙" becomes "关掉蓝牙". The changes are applied on the live
+connections, so the keywords and commands after the edit come out renamed while the
+audio keeps flowing.
+
+Reported: time from saving the files to the lists applied, the wake keywords and matched
+commands before and after, reconnects, hotword updates seen by the ASR stand-in and
+uplink audio dropped.
+
+Usage:
+    python -m benchmarks.bench_config_reload [commands] [speed]
+"""
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import config
+from benchmarks.scripted import SAMPLE_RATE, ScriptedCapture, dialogue
+from main import Speech_Assistant
+from mock_servers import AsrServer, KwsServer, NluServer
+
+
+def rewrite(directory):
+    """Apply the edits of the benchmark to the word list files in `directory`."""
+    words = config.WordLists.load(directory)
+    with open(os.path.join(directory, 'words_kws.txt'), 'wt', encoding='utf-8') as f:
+        f.write("\n".join(words.kws[1:] + words.kws[:1]) + "\n")
+    with open(os.path.join(directory, 'words_asr.txt'), 'wt', encoding='utf-8') as f:
+        f.write("".join(f"{word} {weight}\n" for word, weight in dict(words.asr, 蓝牙=30).items()))
+    with open(os.path.join(directory, 'words_nlu.txt'), 'wt', encoding='utf-8') as f:
+        f.write("\n".join('关掉蓝牙' if command == '关闭蓝牙' else command for command in words.nlu) + "\n")
+
+
+async def run(commands, speed, directory, events):
+    async with KwsServer(port=0) as kws, AsrServer(port=0, transcripts=['打开相机', '关掉蓝牙']) as asr, \
+            NluServer(port=0) as nlu:
+        watcher = config.ConfigWatcher(directory, interval=0.1)
+        saved = {}
+
+        async def edit():
+            rewrite(directory)
+            saved['at'] = time.monotonic()
+        samples = dialogue(commands, seed=0)
+        capture = ScriptedCapture(samples, speed=speed, actions={len(samples) / SAMPLE_RATE / 2: edit})
+        assistant = Speech_Assistant(uri_kws=kws.uri, uri_asr=asr.uri, uri_nlu=nlu.uri, **watcher.words.kwargs(),
+                                     source=capture, verbose=False, metrics_log=events)
+
+        async def applied(words, changed):
+            await assistant.update_words(words, changed)
+            saved.setdefault('applied', time.monotonic())
+        watcher.subscribe(applied)
+        async with watcher:
+            await assistant.run()
+        return assistant, asr, saved
+
+
+def main(commands, speed):
+    with tempfile.TemporaryDirectory() as directory:
+        for name in config.WORD_FILES.values():
+            shutil.copy(name, directory)
+        events = os.path.join(directory, 'events.jsonl')
+        assistant, asr, saved = asyncio.run(run(commands, speed, directory, events))
+        with open(events, encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+
+    edited = next(record['mono'] for record in records if record['event'] == 'words_updated')
+    wakes = [(record['mono'] > edited, record['keyword']) for record in records if record['event'] == 'wake']
+    matched = [(record['mono'] > edited, record['command']) for record in records if record['event'] == 'utterance']
+    print(f"{commands} commands at {speed}x, word lists edited halfway")
+    print(f"applied {1000 * (saved['applied'] - saved['at']):.0f} ms after saving (polling every 100 ms)")
+    for after, label in ((False, 'before'), (True, 'after')):
+        print(f"{label:>7}: wakes {[keyword for later, keyword in wakes if later == after]}, "
+              f"commands {[command for later, command in matched if later == after]}")
+    uplink = assistant.stats()['uplink']
+    print(f"reconnects kws {assistant.kws_link.reconnects} asr {assistant.asr_link.reconnects}, "
+          f"ASR hotword updates {asr.hotword_updates}, uplink dropped kws {uplink['kws']['dropped_seconds']} "
+          f"asr {uplink['asr']['dropped_seconds']} s, commands {assistant.stats()['commands']}/{commands}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 6, float(sys.argv[2]) if len(sys.argv) > 2 else 2.0)
@@ -0,0 +1,152 @@
+"""
+Audio front-end: cost and quality of `AudioFrontend` on device formats the servers do
+not take, and an end-to-end run from a quiet microphone array.
+
+    cpu         CPU time per stream, as % of one core, for 30 s of 16 kHz mono,
+                44.1 kHz stereo and 48 kHz 4- and 8-channel input in 20 ms frames
+    resampler   SNR of a 1 kHz tone resampled to 16 kHz (error against the best-fitting
+                1 kHz sine), and attenuation of a 10 kHz tone that would alias into the band
+    mixer       how often `best` picks the channel of the talker on a 4-mic array
+                where the others hear the talker 12 dB lower over their own noise
+    agc         level of quiet (-40 dBFS) and loud (-10 dBFS) speech after the AGC
+    end-to-end  `Speech_Assistant` on a 48 kHz 4-mic array with a quiet talker and a DC
+                offset, against the local stand-ins: resampled only (mean of the
+                channels, no high-pass or AGC) vs the full front-end
+
+Usage:
+    python -m benchmarks.bench_frontend [commands] [speed]
+"""
+import asyncio
+import sys
+import time
+import numpy as np
+
+from audio_frontend import AudioFrontend, ChannelMixer, FrontendCapture, Resampler
+from audio_source import ArraySource
+from benchmarks.scripted import SAMPLE_RATE, dialogue
+from main import Speech_Assistant
+from mock_servers import AsrServer, KwsServer, NluServer
+
+FORMATS = ((16000, 1), (44100, 2), (48000, 4), (48000, 8))
+
+
+def frames(samples, input_rate, frame=0.02):
+    blocksize = round(frame * input_rate)
+    return [samples[i:i + blocksize] for i in range(0, len(samples), blocksize)]
+
+
+def cpu(seconds=30.0):
+    rng = np.random.default_rng(0)
+    for input_rate, channels in FORMATS:
+        samples = rng.normal(0, 2000, (int(seconds * input_rate), channels)).astype(np.int16)
+        if channels == 1:
+            samples = samples[:, 0]
+        frontend = AudioFrontend(input_rate, channels)
+        blocks = frames(samples, input_rate)
+        start = time.process_time()
+        for block in blocks:
+            frontend.process(block)
+        used = time.process_time() - start
+        print(f"{input_rate:>6} Hz x{channels}: {100 * used / seconds:.2f}% of a core, "
+              f"{1e6 * used / len(blocks):.0f} us per 20 ms frame")
+
+
+def tone(hz, rate, seconds, amplitude=10000.0):
+    return amplitude * np.sin(2 * np.pi * hz * np.arange(int(seconds * rate)) / rate)
+
+
+def resampler():
+    for input_rate in (48000, 44100, 32000, 22050, 8000):
+        resampler = Resampler(input_rate)
+        output = np.concatenate([resampler.process(block.astype(np.float32))
+                                 for block in frames(tone(1000, input_rate, 2.0), input_rate)])[1600:]
+        # the filter delays the tone by a fraction of a sample: fit its phase and amplitude
+        t = 2 * np.pi * 1000 * np.arange(1600, 1600 + len(output)) / SAMPLE_RATE
+        basis = np.stack([np.sin(t), np.cos(t)], axis=1)
+        fitted = basis @ np.linalg.lstsq(basis, output, rcond=None)[0]
+        snr = 10 * np.log10(np.mean(fitted ** 2) / np.mean((output - fitted) ** 2))
+        line = f"{input_rate:>6} Hz: {resampler.up}/{resampler.down}, {resampler.taps} taps per phase, SNR {snr:.0f} dB"
+        if input_rate > 20000:
+            resampler = Resampler(input_rate)
+            alias = np.concatenate([resampler.process(block.astype(np.float32))
+                                    for block in frames(tone(10000, input_rate, 1.0), input_rate)])
+            attenuation = 10 * np.log10(np.mean(alias[1600:] ** 2) / (10000.0 ** 2 / 2))
+            line += f", 10 kHz tone {attenuation:.0f} dB"
+        print(line)
+
+
+def array(samples, talker, channels=4, rng=None, gain=1.0, offset=0.0):
+    """`channels` mics at 48 kHz: `talker`'s hears `samples`, the others 12 dB lower over their own noise."""
+    rng = rng or np.random.default_rng(0)
+    upsampled = Resampler(SAMPLE_RATE, 48000).process(np.asarray(samples, dtype=np.float32))
+    mics = np.stack([upsampled * (1.0 if mic == talker else 0.25) + rng.normal(0, 150 if mic != talker else 30,
+                                                                               len(upsampled))
+                     for mic in range(channels)], axis=1)
+    return np.clip(mics * gain + offset, -32768, 32767).astype(np.int16)
+
+
+def mixer():
+    rng = np.random.default_rng(1)
+    picked = total = 0
+    for talker in range(4):
+        samples = array(dialogue(2, seed=talker), talker, rng=rng)
+        mix = ChannelMixer('best')
+        for i, block in enumerate(frames(samples.astype(np.float32), 48000)):
+            mix.process(block)
+            if i >= 50:  # after one second to settle
+                picked += mix.channel == talker
+                total += 1
+        print(f"talker on mic {talker}: picked mic {mix.channel}, {mix.switches} switches")
+    print(f"best channel on the talker's mic {100 * picked / total:.1f}% of frames")
+
+
+def agc():
+    rng = np.random.default_rng(2)
+    t = np.arange(5 * SAMPLE_RATE) / SAMPLE_RATE
+    speech = rng.normal(0, 1, len(t)) * (np.abs(np.sin(2 * np.pi * 4 * t)) + 0.2)
+    speech /= np.sqrt(np.mean(speech ** 2))
+    for dbfs in (-40, -10):
+        samples = (speech * 32768 * 10 ** (dbfs / 20)).astype(np.int16)
+        frontend = AudioFrontend(SAMPLE_RATE, highpass=None)
+        output = np.concatenate([frontend.process(block) for block in frames(samples, SAMPLE_RATE)])
+        level = 20 * np.log10(np.sqrt(np.mean(output[-SAMPLE_RATE:].astype(np.float64) ** 2)) / 32768)
+        print(f"speech at {dbfs} dBFS: {level:.1f} dBFS after the AGC (gain {frontend.stats()['gain_db']} dB)")
+
+
+async def assistant(samples, speed, **options):
+    async with KwsServer(port=0) as kws, AsrServer(port=0, transcripts=['打开相机', '关闭蓝牙']) as asr, \
+            NluServer(port=0) as nlu:
+        source = FrontendCapture(ArraySource(samples, 48000, 960, speed), AudioFrontend(48000, samples.shape[1], **options))
+        assistant = Speech_Assistant(uri_kws=kws.uri, uri_asr=asr.uri, uri_nlu=nlu.uri,
+                                     words_nlu=['打开相机', '关闭蓝牙'], source=source, verbose=False)
+        await assistant.run()
+        return assistant.stats(), source.stats()
+
+
+def end_to_end(commands, speed):
+    samples = array(dialogue(commands, seed=3), talker=2, gain=0.03, offset=800.0)
+    level = 20 * np.log10(np.std(samples[:, 2].astype(np.float64)) / 32768)
+    print(f"{commands} commands, talker at {level:.0f} dBFS on mic 2 of 4, DC offset 800, {speed}x real time")
+    for label, options in (('resampled only', {'mix': 'mean', 'highpass': None, 'agc': False}),
+                           ('front-end', {})):
+        stats, frontend = asyncio.run(assistant(samples, speed, **options))
+        print(f"{label:>15}: wakes {stats['wakes']}, commands {stats['commands']}/{commands}, "
+              f"mic {frontend['channel']}, gain {frontend['gain_db']} dB, "
+              f"front-end {1000 * frontend['frontend_seconds']:.0f} ms")
+
+
+def main(commands, speed):
+    print("== cpu")
+    cpu()
+    print("== resampler")
+    resampler()
+    print("== mixer")
+    mixer()
+    print("== agc")
+    agc()
+    print("== end-to-end")
+    end_to_end(commands, speed)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 4, float(sys.argv[2]) if len(sys.argv) > 2 else 2.0)
@@ -0,0 +1,92 @@
+"""
+Hub load test: N synthetic sessions in one `AssistantHub` against local stand-ins.
+
+Every session plays its own wake-word + command dialogue in real time, with a random
+start offset so wake-ups do not coincide. The stand-in servers run on their own
+thread, so the CPU time reported is the hub's (its thread only). Per session it
+reports commands recognized and the response latency from end of speech to the
+matched command; for the hub, CPU per session and the worst event-loop stall.
+
+Usage:
+    python -m benchmarks.bench_hub [sessions] [commands]
+"""
+import asyncio
+import statistics
+import sys
+import time
+import numpy as np
+
+from audio_source import ArraySource
+from benchmarks.scripted import dialogue, silence
+from hub import AssistantHub
+from mock_servers import AsrServer, KwsServer, NluServer, serve_in_thread
+
+WORDS = [line.strip() for line in open('words_nlu.txt', encoding='utf-8') if line.strip()]
+
+
+async def ticker(lags, period=0.005):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(period)
+        lags.append(time.perf_counter() - start - period)
+
+
+async def main(sessions, commands):
+    kws = KwsServer(port=0)
+    asr = AsrServer(port=0, transcripts=['打开相机', '关闭蓝牙'])
+    nlu = NluServer(port=0)
+    serve_in_thread(kws, asr, nlu)
+
+    rng = np.random.default_rng(0)
+    lags = []
+    async with AssistantHub(uri_kws=kws.uri, uri_asr=asr.uri, uri_nlu=nlu.uri, words_nlu=WORDS) as hub:
+        tick = asyncio.create_task(ticker(lags))
+        cpu, wall = time.thread_time(), time.perf_counter()
+        started = []  # the hub drops sessions as they end
+        rows = {}
+        remove_session = hub.remove_session
+
+        def record(name, session=None):
+            # the hub drops the metric series of a session that ended: take its stats first
+            if session is not None and hub.tasks.get(name) is not None and hub.tasks[name].done():
+                rows[name] = session.stats()
+            remove_session(name, session)
+        hub.remove_session = record
+        for i in range(sessions):
+            lead = silence(rng.uniform(0, 3.0), rng).astype(np.int16)
+            samples = np.concatenate([lead, dialogue(commands, seed=i)])
+            started.append(hub.add_session(f"s{i:03d}", ArraySource(samples)))
+        await hub.wait()
+        cpu, wall = time.thread_time() - cpu, time.perf_counter() - wall
+        tick.cancel()
+        stats = hub.stats()
+        rows = {session.name: rows[session.name] for session in started if session.name in rows}
+        snapshot = hub.metrics.snapshot()
+        left = (len(stats['sessions']), len(hub.metrics.registry.collectors),
+                sum('session' in series['labels'] for kind in snapshot.values() for series in kind))
+
+    latencies = [s['latency_p50_ms'] for s in rows.values() if s['latency_p50_ms'] is not None]
+    recognized = sum(s['commands'] for s in rows.values())
+    for name, s in list(rows.items())[:10]:
+        print(f"{name}: wakes {s['wakes']}, commands {s['commands']}/{commands}, "
+              f"latency p50 {s['latency_p50_ms']} ms p95 {s['latency_p95_ms']} ms, "
+              f"reconnects kws {s['kws']['reconnects']} asr {s['asr']['reconnects']}")
+    if len(rows) > 10:
+        print(f"... {len(rows) - 10} more sessions")
+    print(f"\n{sessions} sessions, {wall:.1f} s wall: commands {recognized}/{sessions * commands}, "
+          f"ASR connections opened {asr.connections}")
+    if latencies:
+        print(f"response latency p50 across sessions: median {statistics.median(latencies):.1f} ms, "
+              f"worst {max(latencies):.1f} ms")
+    print(f"hub CPU {1000 * cpu:.0f} ms ({100 * cpu / wall:.1f}% of one core), "
+          f"{1000 * cpu / sessions / wall:.2f} ms per session per second of audio, "
+          f"max loop stall {1000 * max(lags, default=0):.1f} ms")
+    print(f"shared: NLU cache {stats['nlu_cache']}, ASR pool {stats['asr_pool']}")
+    print(f"left in the hub after the sessions ended: sessions {left[0]}, metrics collectors {left[1]}, "
+          f"session metric series {left[2]}")
+
+
+if __name__ == "__main__":
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    commands = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    asyncio.run(main(sessions, commands))
@@ -0,0 +1,82 @@
+"""
+Bytes-on-wire and encode cost of the KWS `listen` transports.
+
+Encodes 100 ms windows with each transport, then streams them to a local
+`mock_servers.KwsServer` and checks the wake tone is still detected.
+
+Usage:
+    python -m benchmarks.bench_kws_transport [seconds]
+"""
+import asyncio
+import json
+import sys
+import time
+import numpy as np
+import websockets
+
+import kws_transport
+from mock_servers import KwsServer, wake_tone
+from pcm_buffer import PcmRingBuffer
+
+SAMPLE_RATE = 16000
+WINDOW = 1600
+
+
+def make_audio(seconds):
+    rng = np.random.default_rng(0)
+    audio = rng.normal(0, 800, size=seconds * SAMPLE_RATE).astype(np.int16)
+    tone = wake_tone(1, seconds=0.5)
+    audio[SAMPLE_RATE:SAMPLE_RATE + len(tone)] += tone
+    return audio
+
+
+def windows(audio):
+    pcm = PcmRingBuffer(capacity=SAMPLE_RATE)
+    reader = pcm.reader(WINDOW)
+    for start in range(0, len(audio), 320):
+        pcm.write(audio[start:start + 320])
+        window = reader.read()
+        if window is not None:
+            yield window
+
+
+def bench_encode(audio, transport):
+    count = 0
+    size = 0
+    elapsed = 0.0
+    for window in windows(audio):
+        start = time.perf_counter()
+        message = kws_transport.encode_listen(window, SAMPLE_RATE, transport)
+        elapsed += time.perf_counter() - start
+        size += len(message) if isinstance(message, str) else message.nbytes
+        count += 1
+    return size / count, 1e6 * elapsed / count
+
+
+async def bench_stream(audio, transport, uri):
+    offered = kws_transport.offer(transport)
+    async with websockets.connect(uri) as ws:
+        await ws.send(json.dumps({'remote': 'init', 'words': ['小新小新', '小爱同学'],
+                                  'transports': offered, 'sample_rate': SAMPLE_RATE}))
+        active = kws_transport.negotiate(offered, json.loads(await ws.recv()))
+        start = time.perf_counter()
+        for window in windows(audio):
+            await ws.send(kws_transport.encode_listen(window, SAMPLE_RATE, active))
+        detected = json.loads(await asyncio.wait_for(ws.recv(), 5))['message']
+        return active, time.perf_counter() - start, detected
+
+
+async def main(seconds):
+    audio = make_audio(seconds)
+    async with KwsServer(port=0) as server:
+        for transport in kws_transport.TRANSPORTS:
+            size, encode_us = bench_encode(audio, transport)
+            active, wall, detected = await bench_stream(audio, transport, server.uri)
+            wire = size * SAMPLE_RATE / WINDOW
+            print(f"{transport:>7}: {size:8.0f} B/window, encode {encode_us:7.1f} us/window, "
+                  f"{wire / 1024:7.1f} KiB/s on wire, stream {wall * 1000:6.0f} ms "
+                  f"(negotiated {active}, detected {detected})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10))
@@ -0,0 +1,133 @@
+"""
+NLU round trips: blocking `requests.post` versus the pooled asyncio `NluClient`.
+
+Runs a burst of `/match_sentence` calls against a local `mock_servers.NluServer`
+(served from its own thread and loop) with artificial latency, while a ticker task
+measures how long the client's event loop is stalled, which is what delays audio
+sending and KWS receiving in `Speech_Assistant`. The burst cycles through the same
+sentences, so the pooled client is measured with its match cache off, and then once
+more with it on.
+
+Then the cache is checked: LRU eviction, TTL expiry, and that a match in flight while
+a new word list is uploaded, or that is answered while the upload is still in flight,
+is not cached (its result belongs to the old list).
+
+Usage:
+    python -m benchmarks.bench_nlu_client [calls] [latency_ms]
+"""
+import asyncio
+import statistics
+import sys
+import time
+import requests
+
+from mock_servers import NluServer, serve_in_thread
+from nlu_client import MatchCache, NluClient
+
+WORDS = [line.strip() for line in open('words_nlu.txt', encoding='utf-8') if line.strip()]
+
+
+async def ticker(lags, period=0.005):
+    """Record how late each loop wake-up is compared to the requested period."""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(period)
+        lags.append(time.perf_counter() - start - period)
+
+
+async def run(label, call, calls):
+    lags = []
+    tick = asyncio.create_task(ticker(lags))
+    await asyncio.sleep(0)
+    rtts = []
+    for i in range(calls):
+        start = time.perf_counter()
+        await call(WORDS[i % len(WORDS)])
+        rtts.append(time.perf_counter() - start)
+    await asyncio.sleep(0.01)
+    tick.cancel()
+    print(f"{label:>14}: rtt p50 {1000 * statistics.median(rtts):6.2f} ms, "
+          f"max loop stall {1000 * max(lags, default=0):6.2f} ms")
+
+
+async def main(calls, latency):
+    server = NluServer(port=0, latency=latency)
+    serve_in_thread(server)
+    url = f'{server.uri}/match_sentence'
+
+    async def blocking(sentence):
+        requests.post(url, json={'source_sentence': sentence})
+
+    async with NluClient(server.uri, cache_size=0) as client:
+        await client.upload_words(WORDS)
+        peers = len(server.peers)
+        await run('requests.post', blocking, calls)
+        blocking_peers = len(server.peers) - peers
+        peers = len(server.peers)
+        await run('NluClient', client.match_sentence, calls)
+        pooled_peers = len(server.peers) - peers
+    print(f"New TCP connections during the burst: requests.post {blocking_peers}, NluClient {pooled_peers}")
+
+    async with NluClient(server.uri) as client:
+        await client.upload_words(WORDS)
+        requests_before = server.requests
+        await run('NluClient+cache', client.match_sentence, calls)
+        print(f"cached: {server.requests - requests_before} requests for {calls} calls, {client.cache.stats()}")
+
+    checks = [check_eviction(), check_ttl(), await check_generation(server), await check_upload_in_flight(server)]
+    for name, ok in checks:
+        print(f"{name}: {'PASS' if ok else 'FAIL'}")
+    print(f"{sum(ok for _, ok in checks)}/{len(checks)} cache checks passed")
+
+
+def check_eviction():
+    cache = MatchCache(max_size=2, ttl=None)
+    cache.put('打开相机', {'code': 0})
+    cache.put('关闭蓝牙', {'code': 0})
+    cache.get('打开相机')  # now the most recently used
+    cache.put('播放音乐', {'code': 0})
+    return ('LRU eviction', cache.get('关闭蓝牙') is None and cache.get('打开相机') is not None
+            and cache.stats()['evictions'] == 1)
+
+
+def check_ttl():
+    cache = MatchCache(max_size=2, ttl=0.05)
+    cache.put('打开相机', {'code': 0})
+    fresh = cache.get('打开 相机。') is not None  # same normalized key
+    time.sleep(0.1)
+    return ('TTL expiry', fresh and cache.get('打开相机') is None and not cache.entries)
+
+
+async def check_generation(server):
+    latency, server.faults.latency = server.faults.latency, 0.2
+    try:
+        async with NluClient(server.uri) as client:
+            await client.upload_words(WORDS)
+            match = asyncio.create_task(client.match_sentence(WORDS[0]))
+            await asyncio.sleep(0.05)
+            await client.upload_words(WORDS[1:])
+            result = await match
+            return ('no caching across an upload', result.get('code') == 0 and client.cache.peek(WORDS[0]) is None)
+    finally:
+        server.faults.latency = latency
+
+
+async def check_upload_in_flight(server):
+    latency, server.faults.latency = server.faults.latency, 0.2
+    try:
+        async with NluClient(server.uri) as client:
+            await client.upload_words(WORDS)
+            upload = asyncio.create_task(client.upload_words(WORDS[1:]))
+            await asyncio.sleep(0.05)
+            server.faults.latency = 0.0  # the match is answered from the old list before the upload lands
+            result = await client.match_sentence(WORDS[0])
+            await upload
+            return ('no caching during an upload', result.get('code') == 0 and client.cache.peek(WORDS[0]) is None)
+    finally:
+        server.faults.latency = latency
+
+
+if __name__ == "__main__":
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.02
+    asyncio.run(main(calls, latency))
@@ -0,0 +1,59 @@
+"""
+Throughput and accuracy of the local NLU matcher over synthetic utterances.
+
+Utterances are generated from words_nlu.txt with polite prefixes/suffixes, filler
+characters and random character substitutions; each is labelled with the command
+it was derived from. `difflib` (as used by the NLU stand-in server) is the baseline.
+
+Usage:
+    python -m benchmarks.bench_nlu_matcher [utterances]
+"""
+import difflib
+import random
+import sys
+import time
+
+from nlu_matcher import LocalMatcher
+
+WORDS = [line.strip() for line in open('words_nlu.txt', encoding='utf-8') if line.strip()]
+PREFIXES = ['', '', '请', '帮我', '麻烦', '请帮我']
+SUFFIXES = ['', '', '吧', '一下', '。', '好吗']
+NOISE = '的了一点个把那'
+
+
+def synthesize(count, seed=0):
+    rng = random.Random(seed)
+    utterances = []
+    for _ in range(count):
+        target = rng.choice(WORDS)
+        chars = list(target)
+        if rng.random() < 0.3:
+            chars.insert(rng.randrange(len(chars) + 1), rng.choice(NOISE))
+        if rng.random() < 0.2:
+            chars[rng.randrange(len(chars))] = rng.choice(NOISE)
+        utterances.append((rng.choice(PREFIXES) + ''.join(chars) + rng.choice(SUFFIXES), target))
+    return utterances
+
+
+def difflib_match(text):
+    scores = [difflib.SequenceMatcher(None, text, s).ratio() for s in WORDS]
+    best = max(range(len(scores)), key=scores.__getitem__)
+    return {'code': 0, 'best_match': WORDS[best], 'score': scores[best]}
+
+
+def run(label, match, utterances):
+    start = time.perf_counter()
+    correct = sum(match(text)['best_match'] == target for text, target in utterances)
+    elapsed = time.perf_counter() - start
+    print(f"{label:>12}: {1e6 * elapsed / len(utterances):7.1f} us/utterance, "
+          f"accuracy {100 * correct / len(utterances):5.1f}%")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    utterances = synthesize(count)
+    start = time.perf_counter()
+    matcher = LocalMatcher(WORDS)
+    print(f"index built for {len(WORDS)} commands in {1000 * (time.perf_counter() - start):.2f} ms")
+    run('LocalMatcher', matcher.match, utterances)
+    run('difflib', difflib_match, utterances)
@@ -0,0 +1,89 @@
+"""
+Micro-benchmark of the per-frame PCM path in `Speech_Assistant.run`.
+
+Compares the original list/queue.Queue framing against `PcmRingBuffer` views for
+KWS (1600-sample) and ASR (960-sample) windows, reporting CPU time per second of
+audio and the peak memory allocated while framing (for the ring this is dominated
+by its one-off 2 x 1 s preallocation).
+
+Usage:
+    python -m benchmarks.bench_pcm_pipeline [seconds]
+"""
+import queue
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+from pcm_buffer import PcmRingBuffer
+
+SAMPLE_RATE = 16000
+UNIT = 320
+KWS = 1600
+ASR = 960
+
+
+def make_frames(seconds):
+    rng = np.random.default_rng(0)
+    audio = rng.integers(-3000, 3000, size=seconds * SAMPLE_RATE, dtype=np.int16)
+    return [audio[i:i + UNIT].copy() for i in range(0, len(audio), UNIT)]
+
+
+def pipeline_list(frames, sink):
+    """Original path: tolist() per frame, queue.Queue, extend, np.array(...).tobytes()."""
+    kws_times, asr_times = KWS // UNIT, ASR // UNIT
+    kws_queue, asr_queue = queue.Queue(), queue.Queue()
+    for frame in frames:
+        samples = frame.flatten().tolist()
+        kws_queue.put(samples)
+        if kws_queue.qsize() >= kws_times:
+            kws_data = []
+            for _ in range(kws_times):
+                kws_data.extend(kws_queue.get())
+            sink(kws_data)
+        asr_queue.put(samples)
+        if asr_queue.qsize() >= asr_times:
+            asr_data = []
+            for _ in range(asr_times):
+                asr_data.extend(asr_queue.get())
+            sink(np.array(asr_data, dtype='int16').tobytes())
+
+
+def pipeline_ring(frames, sink):
+    """New path: one preallocated ring, windows handed out as views."""
+    pcm = PcmRingBuffer(capacity=SAMPLE_RATE)
+    kws_reader, asr_reader = pcm.reader(KWS), pcm.reader(ASR)
+    for frame in frames:
+        pcm.write(frame)
+        window = kws_reader.read()
+        if window is not None:
+            sink(window)
+        window = asr_reader.read()
+        if window is not None:
+            sink(window.data.cast('B'))
+
+
+def measure(pipeline, frames, seconds):
+    sink = lambda item: None
+    start = time.process_time()
+    pipeline(frames, sink)
+    cpu = time.process_time() - start
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    pipeline(frames, sink)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'cpu_ms_per_audio_s': 1000 * cpu / seconds,
+        'peak_kib': peak / 1024,
+    }
+
+
+if __name__ == "__main__":
+    seconds = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    frames = make_frames(seconds)
+    for name, pipeline in (('list+queue', pipeline_list), ('ring views', pipeline_ring)):
+        result = measure(pipeline, frames, seconds)
+        print(f"{name:>12}: {result['cpu_ms_per_audio_s']:.3f} ms CPU / audio s, "
+              f"peak {result['peak_kib']:.1f} KiB allocated")
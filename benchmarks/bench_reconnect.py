@@ -0,0 +1,81 @@
+"""
+Fault injection: `Speech_Assistant` against local stand-ins whose connections are
+aborted or whose server goes away for a while.
+
+Each scenario plays two wake-word + command dialogues and checks that both
+commands are still recognized (which needs both wake words to get through), and
+reports how many reconnects the supervisors made. In the last one the ASR server
+loses the final result of a first, extra command: the assistant has to give up on
+it and go back to listening for the wake word, or the two commands after it are lost.
+
+Usage:
+    python -m benchmarks.bench_reconnect [speed]
+"""
+import asyncio
+import sys
+
+from benchmarks.scripted import ScriptedCapture, dialogue
+from main import Speech_Assistant
+from mock_servers import AsrServer, KwsServer, NluServer
+
+
+async def scenario(name, actions_for, speed, commands=2, **options):
+    async with KwsServer(port=0) as kws, AsrServer(port=0, transcripts=['打开相机', '关闭蓝牙']) as asr, \
+            NluServer(port=0) as nlu:
+        words = [line.strip() for line in open('words_nlu.txt', encoding='utf-8') if line.strip()]
+        capture = ScriptedCapture(dialogue(commands), speed=speed, actions=actions_for(kws, asr))
+        assistant = Speech_Assistant(uri_kws=kws.uri, uri_asr=asr.uri, uri_nlu=nlu.uri,
+                                     words_nlu=words, source=capture, **options)
+        assistant.kws_link.initial_delay = assistant.asr_link.initial_delay = 0.1
+        await assistant.run()
+        ok = asr.finals == 2 and assistant.stats()['commands'] == 2
+        print(f"\n==> {name}: {'PASS' if ok else 'FAIL'} (commands {assistant.stats()['commands']}/2, "
+              f"reconnects kws {assistant.kws_link.reconnects} asr {assistant.asr_link.reconnects})\n")
+        return ok
+
+
+def drop(server, limit=None):
+    async def action():
+        server.drop_connections(limit)
+    return action
+
+
+def lose_final(asr, kws):
+    async def action():
+        asr.lose_finals += 1
+        # KWS hears the silence after the command only once the result is given up on,
+        # less of it than its refractory period after the wake word
+        kws.refractory = 0.25
+    return action
+
+
+def outage(server, seconds):
+    async def action():
+        await server.stop()
+
+        async def restart():
+            await asyncio.sleep(seconds)
+            await server.start()
+        asyncio.create_task(restart())
+    return action
+
+
+async def run_all(speed):
+    results = [
+        await scenario('KWS connection aborted just before the wake word',
+                       lambda kws, asr: {0.9: drop(kws)}, speed),
+        await scenario('KWS server down while the wake word is spoken',
+                       lambda kws, asr: {0.45: outage(kws, 0.8 / speed)}, speed),
+        await scenario('ASR connection aborted mid-command, standby promoted',
+                       lambda kws, asr: {1.6: drop(asr, limit=1)}, speed),
+        await scenario('ASR connection aborted mid-command, no standby',
+                       lambda kws, asr: {1.6: drop(asr)}, speed, asr_standby=False),
+        await scenario('ASR final result of the first command lost',
+                       lambda kws, asr: {0.0: lose_final(asr, kws)}, speed, commands=3,
+                       final_timeout=0.3),
+    ]
+    print(f"{sum(results)}/{len(results)} scenarios passed")
+
+
+if __name__ == "__main__":
+    asyncio.run(run_all(float(sys.argv[1]) if len(sys.argv) > 1 else 2.0))
@@ -0,0 +1,177 @@
+"""
+Corpus replay: play a directory of recordings through `Speech_Assistant` against the
+local stand-in servers, faster than real time, and score it.
+
+The corpus is a directory of 16 kHz WAV/PCM files with an optional `manifest.jsonl`
+giving, per file, the expected wake words and (optionally) commands:
+
+    {"file": "kitchen_01.wav", "wakes": ["小新小新"], "commands": ["打开相机"]}
+
+Without a corpus argument a synthetic one (wake tones + noise "speech", see
+`benchmarks.scripted`) is generated into a temporary directory. Results come from the
+assistants' JSON lines event log: wake accuracy (misses / false wakes), commands
+matched, throughput in audio seconds per wall second, and latency percentiles.
+Note that the stand-in ASR cannot recognize speech, so command texts are only
+meaningful against real servers.
+
+Usage:
+    python -m benchmarks.bench_replay [corpus_dir|synthetic] [speed, 0 = as fast as possible] [jobs] [latency_ms]
+
+`latency_ms` is added by the stand-ins to every result (with jitter of half of it).
+With latency, replay at a finite speed: a wake-up that takes `latency` wall seconds
+arrives `latency x speed` seconds of audio late, and beyond the wake look-back the
+command is cut. Latencies are wall-clock; they match production only at 1x.
+"""
+import asyncio
+import difflib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from audio_source import FileSource, save_wav
+from benchmarks.scripted import dialogue
+from main import Speech_Assistant
+from metrics import Metrics
+from mock_servers import AsrServer, KwsServer, NluServer, serve_in_thread
+
+WORDS_KWS = ['小新小新', '小爱同学']
+WORDS_NLU = [line.strip() for line in open('words_nlu.txt', encoding='utf-8') if line.strip()]
+
+
+def synthesize(directory, files=8):
+    """Write a synthetic corpus with a manifest; file `i` holds 1-3 dialogues."""
+    with open(os.path.join(directory, 'manifest.jsonl'), 'w', encoding='utf-8') as manifest:
+        for i in range(files):
+            commands = 1 + i % 3
+            name = f"synthetic_{i:02d}.wav"
+            save_wav(os.path.join(directory, name), dialogue(commands, seed=i))
+            wakes = [WORDS_KWS[j % 2] for j in range(commands)]
+            manifest.write(json.dumps({'file': name, 'wakes': wakes}, ensure_ascii=False) + '\n')
+
+
+def load_corpus(directory):
+    """Return [(path, expectation dict)] for every WAV/PCM file of the corpus."""
+    expected = {}
+    manifest = os.path.join(directory, 'manifest.jsonl')
+    if os.path.exists(manifest):
+        with open(manifest, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    expected[entry['file']] = entry
+    names = sorted(name for name in os.listdir(directory) if name.lower().endswith(('.wav', '.pcm')))
+    return [(os.path.join(directory, name), expected.get(name, {})) for name in names]
+
+
+def matches(expected, actual):
+    """Number of items of `expected` found, in order, in `actual`."""
+    return sum(block.size for block in difflib.SequenceMatcher(None, expected, actual).get_matching_blocks())
+
+
+def percentiles(label, values):
+    if not values:
+        return f"{label:>14}: -"
+    values = sorted(values)
+    p95 = values[min(len(values) - 1, int(0.95 * len(values)))]
+    return f"{label:>14}: p50 {statistics.median(values):7.1f} ms  p95 {p95:7.1f} ms  (n={len(values)})"
+
+
+async def replay(corpus, speed, jobs, events, latency=0.0):
+    faults = dict(latency=latency, jitter=latency / 2, seed=0)
+    kws = KwsServer(port=0, **faults)
+    asr = AsrServer(port=0, transcripts=WORDS_NLU[:4] or ['打开相机'], **faults)
+    nlu = NluServer(port=0, **faults)
+    serve_in_thread(kws, asr, nlu)
+
+    metrics = Metrics(jsonl=events)
+    limit = asyncio.Semaphore(jobs)
+    audio_seconds = 0.0
+
+    async def play(path):
+        nonlocal audio_seconds
+        async with limit:
+            source = FileSource(path, speed=speed)
+            audio_seconds += len(source.samples) / source.sample_rate
+            assistant = Speech_Assistant(uri_kws=kws.uri, uri_asr=asr.uri, uri_nlu=nlu.uri,
+                                         words_kws=WORDS_KWS, words_nlu=WORDS_NLU, source=source,
+                                         metrics=metrics, name=os.path.basename(path), verbose=False)
+            await assistant.run()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(play(path) for path, _ in corpus))
+    wall = time.perf_counter() - start
+    metrics.close()
+    return audio_seconds, wall
+
+
+def score(corpus, events):
+    sessions = {}
+    latencies = {'wake': [], 'first partial': [], 'final': [], 'response': []}
+    with open(events, encoding='utf-8') as f:
+        for line in f:
+            event = json.loads(line)
+            session = sessions.setdefault(event.get('session'), {'wakes': [], 'commands': []})
+            if event['event'] == 'wake':
+                session['wakes'].append(event['keyword'])
+            elif event['event'] == 'utterance':
+                if event['code'] == 0:
+                    session['commands'].append(event['command'])
+                for label, start, end in (('wake', 'kws_sent_ms', 'wake_ms'),
+                                          ('first partial', 'speech_start_ms', 'first_partial_ms'),
+                                          ('final', 'speech_end_ms', 'final_ms'),
+                                          ('response', 'speech_end_ms', 'matched_ms')):
+                    if start in event and end in event:
+                        latencies[label].append(event[end] - event[start])
+
+    expected_wakes = found_wakes = false_wakes = expected_commands = found_commands = matched = 0
+    for path, expected in corpus:
+        session = sessions.get(os.path.basename(path), {'wakes': [], 'commands': []})
+        wakes = expected.get('wakes', [])
+        found = matches(wakes, session['wakes'])
+        expected_wakes += len(wakes)
+        found_wakes += found
+        false_wakes += len(session['wakes']) - found
+        matched += len(session['commands'])
+        if 'commands' in expected:
+            expected_commands += len(expected['commands'])
+            found_commands += matches(expected['commands'], session['commands'])
+    return {
+        'expected_wakes': expected_wakes, 'found_wakes': found_wakes, 'false_wakes': false_wakes,
+        'matched': matched, 'expected_commands': expected_commands, 'found_commands': found_commands,
+    }, latencies
+
+
+async def main(corpus_dir, speed, jobs, latency):
+    with tempfile.TemporaryDirectory() as scratch:
+        if corpus_dir == 'synthetic':
+            corpus_dir = os.path.join(scratch, 'corpus')
+            os.mkdir(corpus_dir)
+            synthesize(corpus_dir)
+        corpus = load_corpus(corpus_dir)
+        events = os.path.join(scratch, 'events.jsonl')
+        audio_seconds, wall = await replay(corpus, speed, jobs, events, latency)
+        result, latencies = score(corpus, events)
+
+    pace = f"{speed}x" if speed else "as fast as possible"
+    print(f"{len(corpus)} files, {audio_seconds:.1f} s of audio in {wall:.2f} s ({pace}, {jobs} jobs): "
+          f"{audio_seconds / wall:.1f} audio-seconds per wall-second")
+    if result['expected_wakes']:
+        print(f"wake accuracy {result['found_wakes']}/{result['expected_wakes']} "
+              f"({100 * result['found_wakes'] / result['expected_wakes']:.1f}%), false wakes {result['false_wakes']}")
+    print(f"commands matched {result['matched']}", end="")
+    if result['expected_commands']:
+        print(f", correct {result['found_commands']}/{result['expected_commands']}", end="")
+    print()
+    for label, values in latencies.items():
+        print(percentiles(label, values))
+
+
+if __name__ == "__main__":
+    corpus_dir = sys.argv[1] if len(sys.argv) > 1 else 'synthetic'
+    speed = float(sys.argv[2]) if len(sys.argv) > 2 else 0
+    jobs = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    latency = float(sys.argv[4]) / 1000 if len(sys.argv) > 4 else 0.0
+    asyncio.run(main(corpus_dir, speed or None, jobs, latency))
@@ -0,0 +1,111 @@
+"""
+Event-loop lag and audio jitter with and without the dedicated audio thread, under
+CPU contention.
+
+One assistant plays wake word + command dialogues in real time against the local
+stand-ins, with the expensive per-message work switched on: the legacy JSON KWS
+transport and the ADPCM ASR codec in pure Python. It encodes either on the event loop
+or on `runtime.AudioThread`; contention comes from `busy` threads spinning in pure
+Python, which take the GIL from the loop. Event loops: asyncio, plus uvloop when it is
+installed.
+
+Reported per run: loop lag (the `LoopWatchdog` histogram), stalls the watchdog caught,
+frame jitter (how late each frame was processed after it was due) and commands matched,
+as medians over `repeats` runs of each mode.
+
+Usage:
+    python -m benchmarks.bench_runtime [commands] [busy threads] [repeats]
+"""
+import statistics
+import sys
+import threading
+import time
+import numpy as np
+
+import audio_codec
+import runtime
+from benchmarks.scripted import SAMPLE_RATE, ScriptedCapture, dialogue
+from main import Speech_Assistant
+from mock_servers import AsrServer, KwsServer, NluServer, serve_in_thread
+
+WORDS_NLU = [line.strip() for line in open('words_nlu.txt', encoding='utf-8') if line.strip()]
+
+
+class JitterCapture(ScriptedCapture):
+    """`ScriptedCapture` recording how late each frame is handed out after it was due."""
+
+    def __init__(self, samples) -> None:
+        super().__init__(samples)
+        self.late = []
+
+    async def read(self):
+        frame = await super().read()
+        # Frames are due on the schedule `ArraySource` paces them by, from the first read on
+        self.late.append(time.monotonic() - self._start - self.position / SAMPLE_RATE)
+        return frame
+
+
+def busy(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(2000))
+
+
+def ms(value):
+    return f"{1000 * value:6.1f}"
+
+
+def run(loop, audio_thread, contention, commands, servers):
+    kws, asr, nlu = servers
+    capture = JitterCapture(dialogue(commands, seed=0))
+    assistant = Speech_Assistant(uri_kws=kws.uri, uri_asr=asr.uri, uri_nlu=nlu.uri, words_nlu=WORDS_NLU,
+                                 kws_transport='json', asr_codec='adpcm', audio_thread=audio_thread,
+                                 source=capture, verbose=False)
+    stop = threading.Event()
+    threads = [threading.Thread(target=busy, args=(stop,), daemon=True) for _ in range(contention)]
+    for thread in threads:
+        thread.start()
+    try:
+        runtime.run(assistant.run(), loop=loop)
+    finally:
+        stop.set()
+    lag = assistant.metrics.histogram('loop_lag_seconds')
+    late = np.array(capture.late)
+    return {'lag_p50': lag.quantile(0.5), 'lag_p95': lag.quantile(0.95), 'lag_max': lag.max,
+            'stalls': assistant.watchdog.stalls, 'jitter_p95': np.percentile(late, 95), 'jitter_max': late.max(),
+            'commands': assistant.stats()['commands']}
+
+
+def summary(runs, commands):
+    """Medians over the repeated runs: one run's maximum is mostly down to luck."""
+    median = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+    return (f"lag p50 {ms(median['lag_p50'])} p95 {ms(median['lag_p95'])} max {ms(median['lag_max'])} ms, "
+            f"stalls {median['stalls']:g}, frame jitter p95 {ms(median['jitter_p95'])} "
+            f"max {ms(median['jitter_max'])} ms, commands {min(run['commands'] for run in runs)}/{commands}")
+
+
+def main(commands, contention, repeats):
+    kws = KwsServer(port=0)
+    asr = AsrServer(port=0, transcripts=['打开相机', '关闭蓝牙'])
+    nlu = NluServer(port=0)
+    serve_in_thread(kws, asr, nlu)
+    audio_codec.audioop = None  # pure-Python ADPCM: the costly encoder the audio thread is for
+    loops = ['asyncio'] + (['uvloop'] if runtime.uvloop is not None else [])
+    print(f"{commands} commands in real time, JSON KWS transport, pure-Python ADPCM; "
+          f"contention: {contention} busy threads; medians of {repeats} runs each")
+    for loop in loops:
+        for busy_threads in (0, contention):
+            # The two modes take turns, so a slow spell of the machine hits both alike
+            runs = {False: [], True: []}
+            for _ in range(repeats):
+                for audio_thread in runs:
+                    runs[audio_thread].append(run(loop, audio_thread, busy_threads, commands, (kws, asr, nlu)))
+            for audio_thread, results in runs.items():
+                label = f"{loop}, {'audio thread' if audio_thread else 'on the loop'}, {busy_threads} busy"
+                print(f"{label:>34}: {summary(results, commands)}")
+
+
+if __name__ == "__main__":
+    commands = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    contention = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    main(commands, contention, repeats)
@@ -0,0 +1,89 @@
+"""
+Time to command with and without speculative NLU, replaying a corpus against the local
+stand-in servers.
+
+With `speculative_nlu` the online partial text is matched, by the local matcher or from
+the NLU cache (partials never go to the NLU server), while the final result is awaited,
+and the match is taken as is when the final text is the same. Both cases are run, the
+second with `nlu_threshold` above any local score so that every match goes to the NLU
+server (which answers `nlu_latency_ms` late): there speculation only confirms commands
+already in the cache, and the NLU requests counted must not grow with it.
+
+Usage:
+    python -m benchmarks.bench_speculative [corpus_dir|synthetic] [speed] [nlu_latency_ms]
+"""
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+
+from audio_source import FileSource
+from benchmarks.bench_replay import WORDS_KWS, WORDS_NLU, load_corpus, synthesize
+from main import Speech_Assistant
+from metrics import Metrics
+from mock_servers import AsrServer, KwsServer, NluServer, serve_in_thread
+
+CONFIGS = {
+    'local': dict(speculative_nlu=False),
+    'local, speculative': dict(speculative_nlu=True),
+    'server': dict(speculative_nlu=False, nlu_threshold=2.0),
+    'server, speculative': dict(speculative_nlu=True, nlu_threshold=2.0),
+}
+
+
+def total(metrics, name):
+    """Counter `name` summed over all sessions."""
+    return sum(value for (counter, _), value in metrics.registry.counters.items() if counter == name)
+
+
+async def replay(corpus, speed, servers, options, events):
+    kws, asr, nlu = servers
+    metrics = Metrics(jsonl=events)
+    await asyncio.gather(*(Speech_Assistant(uri_kws=kws.uri, uri_asr=asr.uri, uri_nlu=nlu.uri, words_kws=WORDS_KWS,
+                                            words_nlu=WORDS_NLU, source=FileSource(path, speed=speed), metrics=metrics,
+                                            name=os.path.basename(path), verbose=False, **options).run()
+                           for path, _ in corpus))
+    metrics.close()
+    responses, commands = [], 0
+    with open(events, encoding='utf-8') as f:
+        for line in f:
+            event = json.loads(line)
+            if event['event'] == 'utterance' and event['code'] == 0:
+                commands += 1
+                if 'speech_end_ms' in event and 'matched_ms' in event:
+                    responses.append(event['matched_ms'] - event['speech_end_ms'])
+    return commands, responses, metrics
+
+
+async def main(corpus_dir, speed, nlu_latency):
+    kws = KwsServer(port=0)
+    asr = AsrServer(port=0, transcripts=WORDS_NLU[:4] or ['打开相机'])
+    nlu = NluServer(port=0, latency=nlu_latency)
+    serve_in_thread(kws, asr, nlu)
+    with tempfile.TemporaryDirectory() as scratch:
+        if corpus_dir == 'synthetic':
+            corpus_dir = os.path.join(scratch, 'corpus')
+            os.mkdir(corpus_dir)
+            synthesize(corpus_dir)
+        corpus = load_corpus(corpus_dir)
+        print(f"{len(corpus)} files at {speed}x, NLU server latency {1000 * nlu_latency:.0f} ms; "
+              f"time to command = speech end (VAD) to command matched")
+        for index, (name, options) in enumerate(CONFIGS.items()):
+            events = os.path.join(scratch, f"events_{index}.jsonl")
+            requests = nlu.requests
+            commands, responses, metrics = await replay(corpus, speed, (kws, asr, nlu), options, events)
+            p50 = statistics.median(responses) if responses else float('nan')
+            mean = statistics.fmean(responses) if responses else float('nan')
+            print(f"{name:>20}: commands {commands}, time to command p50 {p50:6.1f} ms, mean {mean:6.1f} ms, "
+                  f"speculations {total(metrics, 'nlu_speculative_total')}, "
+                  f"confirmed {total(metrics, 'nlu_speculative_hits_total')}, "
+                  f"NLU requests {nlu.requests - requests}")
+
+
+if __name__ == "__main__":
+    corpus_dir = sys.argv[1] if len(sys.argv) > 1 else 'synthetic'
+    speed = float(sys.argv[2]) if len(sys.argv) > 2 else 4.0
+    nlu_latency = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.1
+    asyncio.run(main(corpus_dir, speed, nlu_latency))
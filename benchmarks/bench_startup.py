@@ -0,0 +1,113 @@
+"""
+Startup benchmark: time from process start to a ready assistant, per phase.
+
+The local stand-ins sit behind proxies that add `rtt` seconds to every client flight
+(the WebSocket upgrade, the TLS handshake of the ASR connection, the KWS init message),
+and the NLU stand-in answers after `rtt` as well. Each run starts a fresh interpreter, so
+import costs are paid as after a boot:
+
+    serial      as before: aiohttp (and sounddevice) imported with `main`, KWS, ASR and
+                the NLU upload initialized one after the other, capture opened after that
+    concurrent  heavy imports deferred, KWS, ASR and NLU initialized concurrently (aiohttp
+                imported on a worker thread meanwhile), capture opened right away
+
+Reported per mode, as the median over `runs`: import time of `main`, when audio starts
+being kept (capture opened), when the assistant is ready, and the per-phase breakdown.
+
+Usage:
+    python -m benchmarks.bench_startup [rtt ms] [runs]
+"""
+import time
+
+BOOT = time.monotonic()
+
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+
+PHASES = ('kws_connect', 'kws_init', 'asr_connect', 'asr_init', 'nlu_import', 'nlu_upload')
+
+
+def child(mode, uri_kws, uri_asr, uri_nlu):
+    """Start one assistant and print its startup breakdown as a JSON line."""
+    if mode == 'serial':
+        import aiohttp  # noqa: F401
+        try:
+            import sounddevice  # noqa: F401
+        except (ImportError, OSError):
+            pass
+    from main import Speech_Assistant
+    from audio_source import ArraySource
+    import numpy as np
+    imported = time.monotonic()
+
+    class SerialAssistant(Speech_Assistant):
+        """Connects and initializes one service after the other, before capturing."""
+
+        async def start_up(self, since):
+            await self.kws_link.start()
+            await self.asr_link.start()
+            await self.init_model_nlu()
+            self.startup_phase('ready', since)
+
+    class UntilReady(ArraySource):
+        """Silence in real time, ending the run once the assistant is ready."""
+
+        async def read(self):
+            if 'ready' in assistant.startup:
+                return None
+            return await super().read()
+
+    cls = SerialAssistant if mode == 'serial' else Speech_Assistant
+    source = UntilReady(np.zeros(10 * 16000, dtype=np.int16), 16000, 320, 1.0)
+    assistant = cls(uri_kws=uri_kws, uri_asr=uri_asr, uri_nlu=uri_nlu, words_nlu=['打开相机', '关闭蓝牙'],
+                    source=source, verbose=False)
+    asyncio.run(assistant.run())
+    startup = dict(assistant.startup)
+    if mode == 'serial':
+        startup['capture_start'] = startup['ready']  # the capture used to be opened after startup
+    startup['import'] = round(1000 * (imported - BOOT), 1)
+    print(json.dumps(startup))
+
+
+def measure(mode, uris, runs):
+    results = []
+    for _ in range(runs):
+        process = subprocess.run([sys.executable, '-m', 'benchmarks.bench_startup', '--child', mode, *uris],
+                                 capture_output=True, text=True)
+        if process.returncode:
+            sys.exit(f"{mode} run failed:\n{process.stderr}")
+        results.append(json.loads(process.stdout.strip().splitlines()[-1]))
+    return {key: statistics.median(result.get(key, 0.0) for result in results) for key in results[0]}
+
+
+def main(rtt, runs):
+    from mock_servers import AsrServer, KwsServer, NluServer, self_signed_context, serve_in_thread
+    from mock_servers.throttle import ThrottledProxy
+
+    kws = KwsServer(port=0)
+    asr = AsrServer(port=0, ssl_context=self_signed_context())
+    nlu = NluServer(port=0, latency=rtt)
+    loop = serve_in_thread(kws, asr, nlu)
+    proxies = [ThrottledProxy('127.0.0.1', server.port, bandwidth=None, delay=rtt) for server in (kws, asr)]
+    for proxy in proxies:
+        asyncio.run_coroutine_threadsafe(proxy.start(), loop).result()
+    uris = [proxies[0].uri('ws'), proxies[1].uri('wss'), nlu.uri]
+
+    print(f"rtt {1000 * rtt:.0f} ms, median of {runs} runs, ms")
+    print(f"{'':>10} {'import':>7} {'capture':>8} {'ready':>6} {'boot->ready':>12}   "
+          + " ".join(f"{phase:>11}" for phase in PHASES))
+    for mode in ('serial', 'concurrent'):
+        result = measure(mode, uris, runs)
+        print(f"{mode:>10} {result['import']:7.0f} {result['capture_start']:8.0f} {result['ready']:6.0f} "
+              f"{result['import'] + result['ready']:12.0f}   "
+              + " ".join(f"{result.get(phase, 0.0):11.0f}" for phase in PHASES))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--child']:
+        child(*sys.argv[2:6])
+    else:
+        main(float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.1, int(sys.argv[2]) if len(sys.argv) > 2 else 5)
@@ -0,0 +1,110 @@
+"""
+Transcript assembly over hour-long dictation streams: the old whole-string approach of
+`client_asr.py` against `Transcript` deltas.
+
+A synthetic 2pass result stream is generated: an online partial of 1-4 characters every
+600 ms and, every 3-8 s of speech, the offline result of the utterance with `stamp_sents`.
+Both consumers "display" every message into a counting sink:
+
+    concat      `text_offline += ...` for the whole session and the full line reprinted
+                on every message (what `client_asr.py` did)
+    transcript  `Transcript` with segment rotation, printing only the deltas
+
+It reports CPU time, bytes written and peak traced memory.
+
+Usage:
+    python -m benchmarks.bench_transcript [hours ...]
+"""
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from transcript import Transcript
+
+CHARS = "打开关闭相机蓝牙空调音乐灯光窗帘播放暂停明天天气怎么样提醒我下午三点开会"
+
+
+def stream(hours, seed=0):
+    """JSON messages of a synthetic 2pass session lasting `hours` of audio."""
+    rng = random.Random(seed)
+    messages = []
+    now = 0
+    while now < hours * 3600 * 1000:
+        start, text = now, ""
+        for _ in range(rng.randint(5, 13)):
+            piece = "".join(rng.choice(CHARS) for _ in range(rng.randint(1, 4)))
+            text += piece
+            now += 600
+            messages.append(json.dumps({'mode': '2pass-online', 'text': piece}, ensure_ascii=False))
+        half = len(text) // 2
+        sentences = [(text[:half], start, (start + now) // 2), (text[half:], (start + now) // 2, now)]
+        messages.append(json.dumps({
+            'mode': '2pass-offline',
+            'text': text,
+            'stamp_sents': [{'text_seg': " ".join(seg), 'punc': "，", 'start': begin, 'end': end}
+                            for seg, begin, end in sentences],
+        }, ensure_ascii=False))
+        now += 1000
+    return messages
+
+
+class Sink:
+    """Encodes what would have been printed, like a terminal stream, and counts the bytes."""
+
+    written = 0
+
+    def write(self, text):
+        self.written += len(text.encode('utf-8'))
+
+
+def concat(messages, sink):
+    text_online = ""
+    text_offline = ""
+    for message in messages:
+        response = json.loads(message)
+        if response['mode'] == '2pass-online':
+            text_online += response['text']
+        if response['mode'] == '2pass-offline':
+            text_offline += response['text'].replace(" ", "")
+            text_online = text_offline
+        sink.write(f'\r[我]：{text_online}')
+
+
+def deltas(messages, sink):
+    transcript = Transcript()
+    for message in messages:
+        response = json.loads(message)
+        if response['mode'] == '2pass-online':
+            first = not transcript.partial
+            _, text = transcript.add_partial(response['text'])
+            sink.write(f'\r[我]：{text}' if first else text)
+        if response['mode'] == '2pass-offline':
+            _, text = transcript.add_final(response['text'], response['stamp_sents'])
+            sink.write(f'\r[我]：{text}\n')
+    return transcript
+
+
+def measure(consumer, messages):
+    sink = Sink()
+    tracemalloc.start()
+    start = time.process_time()
+    consumer(messages, sink)
+    elapsed = time.process_time() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, sink.written, peak
+
+
+def main(hours_list):
+    print(f"{'hours':>5} {'messages':>9} {'consumer':>11} {'CPU s':>8} {'bytes written':>14} {'peak memory':>12}")
+    for hours in hours_list:
+        messages = stream(hours)
+        for name, consumer in (('concat', concat), ('transcript', deltas)):
+            elapsed, written, peak = measure(consumer, messages)
+            print(f"{hours:>5g} {len(messages):>9} {name:>11} {elapsed:>8.3f} {written:>14,} {peak / 1024:>9.0f} KB")
+
+
+if __name__ == "__main__":
+    main([float(arg) for arg in sys.argv[1:]] or [0.25, 1, 4])
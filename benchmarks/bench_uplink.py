@@ -0,0 +1,152 @@
+"""
+Uplink benchmark: one assistant streaming through a throttled, stalling link to the local
+stand-ins.
+
+Both the KWS and the ASR connection go through a `ThrottledProxy` limited to `bandwidth`
+(16 kHz PCM takes 32 kB/s), which also stalls completely for a few seconds now and then,
+like a fading radio link. Each configuration plays the same real-time audio: `lead`
+seconds of idle listening, then wake word + command dialogues.
+
+    unthrottled  default sender, no proxy limit or stalls (baseline)
+    unbounded    no coalescing, no backpressure, never drop: the backlog of a stall is
+                 caught up at the link's spare bandwidth only
+    adaptive     default sender: backpressure, coalescing and at most `uplink_max_lag`
+                 seconds of backlog
+
+It reports the audio backlog at send time, how late each wake-up is detected after its
+wake word ended, the response latency, dropped audio and the worst loop stall.
+
+Usage:
+    python -m benchmarks.bench_uplink [bandwidth bytes/s] [commands] [lead seconds]
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+from benchmarks.scripted import ScriptedCapture, dialogue, silence
+from main import Speech_Assistant
+from metrics import Metrics
+from mock_servers import AsrServer, KwsServer, NluServer, serve_in_thread
+from mock_servers.throttle import ThrottledProxy
+
+WORDS_NLU = [line.strip() for line in open('words_nlu.txt', encoding='utf-8') if line.strip()]
+CONFIGS = {
+    'unthrottled': {},
+    'unbounded': dict(kws_coalesce=1, asr_coalesce=1, uplink_high_water=1 << 30, uplink_max_lag=None),
+    'adaptive': {},
+}
+CYCLE = 0.5 + 1.2 + 1.5  # wake tone, speech, silence of one `dialogue` command
+
+
+class TimedCapture(ScriptedCapture):
+    """`ScriptedCapture` remembering when its first frame was read, to place audio time on the clock."""
+
+    started = None
+
+    async def read(self):
+        if self.started is None:
+            self.started = time.monotonic()
+        return await super().read()
+
+
+def wake_ends(commands, lead):
+    """Audio seconds at which each wake tone ends."""
+    return [lead + 0.5 + i * CYCLE + 0.5 for i in range(commands)]
+
+
+def stalls(commands, lead):
+    """(audio second, duration) of the link stalls: one while idle, one before every third wake word."""
+    return [(lead / 3, lead / 2)] + [(lead + i * CYCLE, 2.0) for i in range(2, commands, 3)]
+
+
+def ms(value):
+    return f"{1000 * value:.0f}" if value is not None else "-"
+
+
+async def run(name, options, bandwidth, commands, lead, servers, events):
+    kws, asr, nlu, loop = servers
+    throttled = name != 'unthrottled'
+    proxies = [ThrottledProxy('127.0.0.1', server.port, bandwidth=bandwidth if throttled else None)
+               for server in (kws, asr)]
+    for proxy in proxies:
+        asyncio.run_coroutine_threadsafe(proxy.start(), loop).result()
+
+    def stall(seconds):
+        async def action():
+            for proxy in proxies:
+                proxy.stall(seconds)
+        return action
+
+    samples = np.concatenate([silence(lead, np.random.default_rng(0)).astype(np.int16), dialogue(commands, seed=1)])
+    actions = {at: stall(seconds) for at, seconds in stalls(commands, lead)} if throttled else {}
+    capture = TimedCapture(samples, actions=actions)
+    metrics = Metrics(jsonl=events)
+    assistant = Speech_Assistant(uri_kws=proxies[0].uri('ws'), uri_asr=proxies[1].uri('ws'), uri_nlu=nlu.uri,
+                                 words_nlu=WORDS_NLU, source=capture, metrics=metrics,
+                                 name=name, verbose=False, **options)
+    lags = []
+    lag_task = asyncio.create_task(lag_monitor(lags))
+    await assistant.run()
+    lag_task.cancel()
+    metrics.close()
+    for proxy in proxies:
+        asyncio.run_coroutine_threadsafe(proxy.stop(), loop).result()
+
+    wakes, responses = [], []
+    with open(events, encoding='utf-8') as f:
+        for line in f:
+            event = json.loads(line)
+            if event.get('session') != name:
+                continue
+            if event['event'] == 'wake':
+                wakes.append(event['mono'] - capture.started)
+            elif event['event'] == 'utterance' and 'speech_end_ms' in event and 'matched_ms' in event:
+                responses.append((event['matched_ms'] - event['speech_end_ms']) / 1000)
+    # Each detection belongs to the last wake word that had begun (the tone lasts 0.5 s)
+    delays = []
+    for detected in wakes:
+        begun = [end for end in wake_ends(commands, lead) if end - 0.5 < detected]
+        delays.append(detected - begun[-1] if begun else None)
+
+    print(f"\n{name}: wakes {len(wakes)}/{commands}, commands {assistant.stats()['commands']}/{commands}")
+    for link in ('kws', 'asr'):
+        backlog = metrics.labelled(session=name, link=link).histogram('uplink_lag_seconds')
+        uplink = getattr(assistant, f'{link}_uplink').stats()
+        print(f"  {link} backlog ms: p50 {ms(backlog and backlog.quantile(0.5))} "
+              f"p95 {ms(backlog and backlog.quantile(0.95))} max {ms(backlog and backlog.max)} | "
+              f"messages {uplink['messages']} coalesced {uplink['coalesced']} "
+              f"backpressure {uplink['backpressure']} dropped {uplink['dropped_seconds']} s")
+    print(f"  wake detected after the wake word ended, ms: {' '.join(ms(d) for d in delays) or '-'}")
+    print(f"  response latency ms: {' '.join(ms(r) for r in responses) or '-'}")
+    print(f"  max loop stall {1000 * max(lags, default=0):.1f} ms")
+
+
+async def lag_monitor(lags, period=0.005):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(period)
+        lags.append(time.perf_counter() - start - period)
+
+
+async def main(bandwidth, commands, lead):
+    kws = KwsServer(port=0)
+    asr = AsrServer(port=0, transcripts=['打开相机', '关闭蓝牙'])
+    nlu = NluServer(port=0)
+    loop = serve_in_thread(kws, asr, nlu)
+    print(f"uplink throttled to {bandwidth / 1000:.1f} kB/s (16 kHz PCM takes 32 kB/s), "
+          f"stalls (audio s, duration) {stalls(commands, lead)}; {commands} commands after {lead} s idle")
+    with tempfile.TemporaryDirectory() as scratch:
+        for name, options in CONFIGS.items():
+            await run(name, options, bandwidth, commands, lead, (kws, asr, nlu, loop),
+                      os.path.join(scratch, 'events.jsonl'))
+
+
+if __name__ == "__main__":
+    bandwidth = float(sys.argv[1]) if len(sys.argv) > 1 else 48000
+    commands = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+    lead = float(sys.argv[3]) if len(sys.argv) > 3 else 8.0
+    asyncio.run(main(bandwidth, commands, lead))
@@ -0,0 +1,73 @@
+"""
+Uplink bytes saved by gating the ASR stream with `EnergyVad`.
+
+Each WAV file (16 kHz mono int16) is treated as one post-wake utterance. Without the
+VAD every sample is streamed until the server endpoints; with it only the span from
+the first speech start (minus pre-roll) to the first speech end (plus hangover) is
+sent, and `is_speaking: false` goes out at that point. With no files given, a
+synthetic corpus of noise-modulated bursts between silences is used.
+
+Usage:
+    python -m benchmarks.bench_vad [file.wav ...]
+"""
+import sys
+import time
+import wave
+import numpy as np
+
+from vad import EnergyVad
+
+SAMPLE_RATE = 16000
+
+
+def load_wav(path):
+    with wave.open(path, 'rb') as f:
+        if f.getsampwidth() != 2 or f.getframerate() != SAMPLE_RATE:
+            raise ValueError(f"{path}: expected 16-bit {SAMPLE_RATE} Hz audio")
+        samples = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+        return samples.reshape(-1, f.getnchannels())[:, 0]
+
+
+def synthetic_corpus(count=20, seed=0):
+    rng = np.random.default_rng(seed)
+    corpus = []
+    for i in range(count):
+        lead, speech, trail = rng.uniform(0.3, 1.5), rng.uniform(0.8, 3.0), rng.uniform(1.0, 3.0)
+        t = np.arange(int(speech * SAMPLE_RATE)) / SAMPLE_RATE
+        envelope = np.abs(np.sin(2 * np.pi * rng.uniform(3, 6) * t)) + 0.2
+        parts = [rng.normal(0, 40, int(lead * SAMPLE_RATE)),
+                 rng.normal(0, 2500, len(t)) * envelope,
+                 rng.normal(0, 40, int(trail * SAMPLE_RATE))]
+        corpus.append((f"synthetic-{i}", np.clip(np.concatenate(parts), -32768, 32767).astype(np.int16),
+                       lead + speech))
+    return corpus
+
+
+def gated_span(vad, samples):
+    """Samples streamed with the VAD, and where `is_speaking: false` is sent."""
+    segments = vad.segments(samples)
+    if not segments:
+        return 0, None
+    start, end = segments[0]
+    return end - start, end
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        corpus = [(path, load_wav(path), None) for path in sys.argv[1:]]
+    else:
+        corpus = synthetic_corpus()
+    vad = EnergyVad(sample_rate=SAMPLE_RATE)
+    total_raw = total_sent = 0
+    cpu = 0.0
+    for name, samples, speech_end in corpus:
+        start = time.process_time()
+        sent, end = gated_span(vad, samples)
+        cpu += time.process_time() - start
+        total_raw += 2 * len(samples)
+        total_sent += 2 * sent
+        delay = "" if speech_end is None or end is None else f", end detected {end / SAMPLE_RATE - speech_end:+.2f} s after speech"
+        print(f"{name}: {2 * len(samples) / 1024:7.1f} KiB -> {2 * sent / 1024:7.1f} KiB{delay}")
+    seconds = total_raw / 2 / SAMPLE_RATE
+    print(f"total: {total_raw / 1024:.1f} KiB -> {total_sent / 1024:.1f} KiB "
+          f"({100 * (1 - total_sent / total_raw):.1f}% saved), VAD CPU {1000 * cpu / seconds:.3f} ms / audio s")
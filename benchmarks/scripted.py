@@ -0,0 +1,44 @@
+"""
+Scripted audio for driving `Speech_Assistant` against the local stand-in servers.
+"""
+import numpy as np
+
+from audio_source import ArraySource
+from mock_servers import wake_tone
+
+SAMPLE_RATE = 16000
+
+
+def silence(seconds, rng):
+    return rng.normal(0, 30, int(seconds * SAMPLE_RATE))
+
+
+def speech(seconds, rng):
+    """Noise with a syllable-rate envelope, loud enough for the VAD and ASR stand-in."""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return rng.normal(0, 2500, len(t)) * (np.abs(np.sin(2 * np.pi * 4 * t)) + 0.2)
+
+
+def dialogue(commands=2, seed=0):
+    """Wake tone + command speech + silence, `commands` times; returns int16 samples."""
+    rng = np.random.default_rng(seed)
+    parts = [silence(0.5, rng)]
+    for i in range(commands):
+        parts += [wake_tone(i % 2, 0.5), speech(1.2, rng), silence(1.5, rng)]
+    return np.clip(np.concatenate(parts), -32768, 32767).astype(np.int16)
+
+
+class ScriptedCapture(ArraySource):
+    """
+    `ArraySource` that plays a fixed signal at `speed` x real time and runs `actions`
+    (audio time in seconds -> coroutine function) along the way.
+    """
+
+    def __init__(self, samples, blocksize=320, speed=1.0, actions=None) -> None:
+        super().__init__(samples, SAMPLE_RATE, blocksize, speed)
+        self.actions = sorted((actions or {}).items())
+
+    async def read(self):
+        while self.actions and self.actions[0][0] * SAMPLE_RATE <= self.position:
+            await self.actions.pop(0)[1]()
+        return await super().read()
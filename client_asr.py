@@ -1,10 +1,14 @@
 import websockets
 import asyncio
+import sys
 import json
 import ssl
-import queue
-import sounddevice as sd
-import numpy as np
+from audio_capture import AudioCapture
+from audio_source import open_source
+import audio_frontend
+from pcm_buffer import PcmRingBuffer
+from transcript import Transcript
+import config
 
 class SpeechRecognitionAssistant:
     """
@@ -13,17 +17,24 @@ class SpeechRecognitionAssistant:
 
     def __init__(self,
                  uri_asr="wss://47.96.15.141:10095",
-                 words_asr={"鸿合科技": 20}) -> None:
+                 words_asr={"鸿合科技": 20},
+                 source=None) -> None:
         """
         Initializes the ASR Assistant with the WebSocket URL and hotword configurations.
         
         Args:
             uri_asr (str): URL for the ASR WebSocket server.
             words_asr (dict): Dictionary of hotwords and their weights for ASR.
+            source: Audio source with the `AudioCapture` interface (see `audio_source`), None
+                for the default microphone; `run` ends when the source is exhausted.
         """
         self.uri_asr = uri_asr
         self.words_asr = words_asr
         self.sample_rate = 16000
+        self.source = source
+        self.capture = None
+        self.final_received = asyncio.Event()
+        self.transcript = Transcript()
 
     async def init_websocket_asr(self):
         """Initialize WebSocket connection for ASR."""
@@ -59,18 +70,22 @@ class SpeechRecognitionAssistant:
     async def receiver_asr(self):
         """Receive ASR results and print recognized text."""
         try:
-            text_online = ""
-            text_offline = ""
             while True:
                 response = json.loads(await self.ws_session_asr.recv())
+                # Print only what changed: partials are appended to the current line, and
+                # the final result rewrites that line once and ends it
                 if response['mode'] == '2pass-online':
-                    text_online += response['text']
-                    
+                    first = not self.transcript.partial
+                    _, text = self.transcript.add_partial(response['text'])
+                    print(f'\r[我]：{text}' if first else text, end="")
+
                 if response['mode'] == '2pass-offline':
-                    text_offline += response['text'].replace(" ", "")
-                    text_online = text_offline
-                    
-                print(f'\r[我]：{text_online}', end="")
+                    retract, text = self.transcript.add_final(response['text'].replace(" ", ""), response.get('stamp_sents'))
+                    if text:
+                        print(f'\r[我]：{text}')
+                    elif retract:
+                        print()
+                    self.final_received.set()
 
 
         except websockets.ConnectionClosedError as e:
@@ -89,30 +104,32 @@ class SpeechRecognitionAssistant:
 
         chunk_size_unit = 320
         chunk_size_asr = 960
-        asr_times = chunk_size_asr // chunk_size_unit
-        asr_queue = queue.Queue()
+        pcm = PcmRingBuffer(capacity=self.sample_rate)
+        asr_reader = pcm.reader(chunk_size_asr)
 
         try:
             # Start the receiver task for ASR
             receive_task_asr = asyncio.create_task(self.receiver_asr())
 
             # Start recording audio and sending it to the ASR model
-            with sd.InputStream(channels=1, dtype="int16", samplerate=self.sample_rate) as stream:
+            self.capture = self.source or AudioCapture(sample_rate=self.sample_rate, blocksize=chunk_size_unit)
+            async with self.capture:
                 print("Recording... Press Ctrl+C to stop.")
                 while True:
-                    samples, _ = stream.read(chunk_size_unit)  # Blocking read
-                    samples = samples.flatten().tolist()
+                    frame = await self.capture.read()  # Filled by the audio callback
+                    if frame is None:
+                        # End of a file: have the server finalize what it heard
+                        self.final_received.clear()
+                        await self.ws_session_asr.send(json.dumps({"is_speaking": False}))
+                        await asyncio.wait_for(self.final_received.wait(), 10)
+                        print()
+                        break
+                    pcm.write(frame)
 
                     # ASR Stream
-                    asr_queue.put(samples)
-                    if asr_queue.qsize() >= asr_times:
-                        asr_data = []
-                        for _ in range(asr_times):
-                            asr_data.extend(asr_queue.get())
-                        asr_data = np.array(asr_data, dtype='int16').tobytes()
-                        await self.ws_session_asr.send(asr_data)
-
-                    await asyncio.sleep(0.001)
+                    window = asr_reader.read()
+                    if window is not None:
+                        await self.ws_session_asr.send(window.data.cast('B'))
 
         except KeyboardInterrupt:
             print("Recording stopped.")
@@ -120,21 +137,19 @@ class SpeechRecognitionAssistant:
             print(f"An error occurred: {e}")
         finally:
             receive_task_asr.cancel()
+            if self.capture:
+                print(f"Capture stats: {self.capture.stats()}")
             await self.close_websocket_asr()
 
 
 if __name__ == "__main__":
     """Main entry point to load configurations and run the Speech Recognition Assistant."""
 
-    # Load hotword list and weights for ASR
-    with open('words_asr.txt', 'rt', encoding='utf-8') as f:
-        words_asr = f.readlines()
-        words_asr = [line.strip() for line in words_asr]
-        words_asr_dct = {}
-        for line in words_asr:
-            word, weight = line.split()
-            words_asr_dct[word] = int(weight)
+    # Hotword list and weights for ASR, from words_asr.txt
+    words = config.WordLists.load()
 
     # Instantiate and run the Speech Recognition Assistant
-    assistant = SpeechRecognitionAssistant(uri_asr="wss://47.96.15.141:10095", words_asr=words_asr_dct)
+    # An optional WAV/PCM file or directory argument is recognized instead of the microphone
+    source = open_source(sys.argv[1]) if len(sys.argv) > 1 else audio_frontend.open_device()
+    assistant = SpeechRecognitionAssistant(uri_asr=config.server_uris()['uri_asr'], words_asr=words.asr, source=source)
     asyncio.get_event_loop().run_until_complete(assistant.run())
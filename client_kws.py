@@ -1,10 +1,13 @@
 import websockets
 import asyncio
+import sys
 import json
-import queue
-import sounddevice as sd
-import numpy as np
-import base64
+from audio_capture import AudioCapture
+from audio_source import open_source
+import audio_frontend
+from pcm_buffer import PcmRingBuffer
+import kws_transport
+import config
 
 class KeywordSpottingAssistant:
     """
@@ -13,17 +16,26 @@ class KeywordSpottingAssistant:
 
     def __init__(self,
                  uri_kws="ws://47.96.15.141:10094",
-                 words_kws=['小新小新', '小爱同学']) -> None:
+                 words_kws=['小新小新', '小爱同学'],
+                 kws_transport='auto',
+                 source=None) -> None:
         """
         Initializes the KWS Assistant with the WebSocket URL and keyword configurations.
         
         Args:
             uri_kws (str): URL for the KWS WebSocket server.
             words_kws (list): List of keywords for KWS.
+            kws_transport (str): KWS audio encoding to negotiate: 'auto', 'binary', 'base64' or 'json'.
+            source: Audio source with the `AudioCapture` interface (see `audio_source`), None
+                for the default microphone; `run` ends when the source is exhausted.
         """
         self.uri_kws = uri_kws
         self.words_kws = words_kws
+        self.kws_transport = kws_transport
+        self.kws_transport_active = 'json'
         self.sample_rate = 16000
+        self.source = source
+        self.capture = None
         self.state = 'kws'
 
     async def init_websocket_kws(self):
@@ -39,14 +51,18 @@ class KeywordSpottingAssistant:
 
     async def init_model_kws(self):
         """Initialize KWS model by sending configuration."""
+        offered = kws_transport.offer(self.kws_transport)
         conf = {
             'remote': 'init',
-            'words': self.words_kws
+            'words': self.words_kws,
+            'transports': offered,
+            'sample_rate': self.sample_rate
         }
         await self.ws_session_kws.send(json.dumps(conf))
         response = json.loads(await self.ws_session_kws.recv())
         print(response)
-        print("Successfully initialized KWS model")
+        self.kws_transport_active = kws_transport.negotiate(offered, response)
+        print(f"Successfully initialized KWS model (transport: {self.kws_transport_active})")
 
     async def receiver_kws(self):
         """Receive KWS results and print the detected keyword."""
@@ -73,37 +89,29 @@ class KeywordSpottingAssistant:
 
         chunk_size_unit = 320
         chunk_size_kws = 1600
-        kws_times = chunk_size_kws // chunk_size_unit
-        kws_queue = queue.Queue()
+        pcm = PcmRingBuffer(capacity=self.sample_rate)
+        kws_reader = pcm.reader(chunk_size_kws)
 
         try:
             # Start the receiver task for KWS
             receive_task_kws = asyncio.create_task(self.receiver_kws())
 
             # Start recording audio and sending it to the KWS model
-            with sd.InputStream(channels=1, dtype="int16", samplerate=self.sample_rate) as stream:
+            self.capture = self.source or AudioCapture(sample_rate=self.sample_rate, blocksize=chunk_size_unit)
+            async with self.capture:
                 print("Recording... Press Ctrl+C to stop.")
                 while True:
-                    samples, _ = stream.read(chunk_size_unit)  # Blocking read
-                    samples = samples.flatten().tolist()
+                    frame = await self.capture.read()  # Filled by the audio callback
+                    if frame is None:
+                        break
+                    pcm.write(frame)
 
                     # KWS Stream
                     if self.state == 'kws':
-                        kws_queue.put(samples)
-                        if kws_queue.qsize() >= kws_times:
-                            kws_data = []
-                            for _ in range(kws_times):
-                                kws_data.extend(kws_queue.get())
-                            samples = kws_data                            
-                            # samples = base64.b64encode(np.array(kws_data,dtype='int16').tobytes()).decode('utf-8')
-                            data = {
-                                "remote": 'listen',
-                                "samples": samples,
-                                "sample_rate": self.sample_rate
-                            }
-                            await self.ws_session_kws.send(json.dumps(data))
-
-                    await asyncio.sleep(0.001)
+                        window = kws_reader.read()
+                        if window is not None:
+                            data = kws_transport.encode_listen(window, self.sample_rate, self.kws_transport_active)
+                            await self.ws_session_kws.send(data)
 
         except KeyboardInterrupt:
             print("Recording stopped.")
@@ -112,17 +120,19 @@ class KeywordSpottingAssistant:
             print(f"An error occurred: {e}")
         finally:
             receive_task_kws.cancel()
+            if self.capture:
+                print(f"Capture stats: {self.capture.stats()}")
             await self.close_websocket_kws()
 
 
 if __name__ == "__main__":
     """Main entry point to load configurations and run the Keyword Spotting Assistant."""
 
-    # Load keyword list for KWS
-    with open('words_kws.txt', 'rt', encoding='utf-8') as f:
-        words_kws = f.readlines()
-        words_kws = [line.strip() for line in words_kws]
+    # Keyword list for KWS, from words_kws.txt
+    words = config.WordLists.load()
 
     # Instantiate and run the Keyword Spotting Assistant
-    assistant = KeywordSpottingAssistant(uri_kws="ws://47.96.15.141:10094", words_kws=words_kws)
+    # An optional WAV/PCM file or directory argument is scanned instead of the microphone
+    source = open_source(sys.argv[1]) if len(sys.argv) > 1 else audio_frontend.open_device()
+    assistant = KeywordSpottingAssistant(uri_kws=config.server_uris()['uri_kws'], words_kws=words.kws, source=source)
     asyncio.get_event_loop().run_until_complete(assistant.run())
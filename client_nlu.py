@@ -1,53 +1,49 @@
-import requests
-import json
+import asyncio
+import os
+import aiohttp
+from nlu_client import NluClient
 
 # Define the base URL of the Flask server
-BASE_URL = 'http://127.0.0.1:10096'
+BASE_URL = f"http://{os.environ.get('FUNSOUND_HOST', '127.0.0.1')}:10096"
+
+# Shared client: keeps one pooled keep-alive session for all calls
+client = NluClient(BASE_URL)
 
 # Function to upload the word list to the server
-def upload_words(word_list):
-    url = f'{BASE_URL}/upload_words'
-    payload = {
-        'sentences_to_compare': word_list
-    }
-    headers = {'Content-Type': 'application/json'}
-    
+async def upload_words(word_list):
     try:
-        response = requests.post(url, json=payload, headers=headers)
-        response.raise_for_status()
-        print("Word list uploaded successfully.")
-    except requests.exceptions.HTTPError as http_err:
-        print(f"HTTP error occurred: {http_err}")
-        print(f"Response: {response.json()}")
-    except Exception as err:
-        print(f"Other error occurred: {err}")
+        result = await client.upload_words(word_list)
+        if result.get('code') == 0:
+            print("Word list uploaded successfully.")
+        else:
+            print(f"Failed to upload word list: {result}")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+        print(f"HTTP error occurred: {err!r}")
 
 # Function to get the best match for a source sentence
-def match_sentence(source_sentence):
-    url = f'{BASE_URL}/match_sentence'
-    payload = {
-        'source_sentence': source_sentence
-    }
-    headers = {'Content-Type': 'application/json'}
-    
+async def match_sentence(source_sentence):
     try:
-        response = requests.post(url, json=payload, headers=headers)
-        response.raise_for_status()
-        result = response.json()
-        print(f"Best match: {result['best_match']}")
-        print(f"Score: {result['score']}")
-    except requests.exceptions.HTTPError as http_err:
-        print(f"HTTP error occurred: {http_err}")
-        print(f"Response: {response.json()}")
-    except Exception as err:
-        print(f"Other error occurred: {err}")
+        result = await client.match_sentence(source_sentence)
+        if result.get('code') == 0:
+            print(f"Best match: {result['best_match']}")
+            print(f"Score: {result['score']}")
+        else:
+            print(f"Failed to match sentence: {result}")
+        return result
+    except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+        print(f"HTTP error occurred: {err!r}")
 
 # Example usage
-if __name__ == '__main__':
+async def main():
     # Step 1: Upload a list of sentences to compare
     word_list = ["开启wps软件", "关闭wps软件", "打开浏览器"]
-    upload_words(word_list)
-    
+    await upload_words(word_list)
+
     # Step 2: Match a source sentence against the uploaded list
     source_sentence = "打开wps软件"
-    match_sentence(source_sentence)
+    await match_sentence(source_sentence)
+
+    await client.close()
+
+if __name__ == '__main__':
+    asyncio.run(main())
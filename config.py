@@ -0,0 +1,237 @@
+import asyncio
+import os
+
+WORD_FILES = {'kws': 'words_kws.txt', 'asr': 'words_asr.txt', 'nlu': 'words_nlu.txt'}
+
+
+class ConfigError(ValueError):
+    """A word list file that does not validate; the message names the file and line."""
+
+
+def _lines(path):
+    """(line number, stripped text) of the non-blank lines of `path`."""
+    with open(path, 'rt', encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if line:
+                yield number, line
+
+
+def _unique(path, items):
+    seen = {}
+    for number, item in items:
+        if item in seen:
+            raise ConfigError(f"{path}:{number}: {item!r} already listed on line {seen[item]}")
+        seen[item] = number
+    return list(seen)
+
+
+def parse_kws(path):
+    """
+    Parse a keyword list: one wake word per line.
+
+    Returns:
+        list: The keywords, in file order.
+    """
+    words = _unique(path, _lines(path))
+    if not words:
+        raise ConfigError(f"{path}: no keywords")
+    return words
+
+
+def parse_asr(path):
+    """
+    Parse a hotword list: one `word weight` per line, the weight a positive integer.
+
+    Returns:
+        dict: Hotword -> weight, in file order.
+    """
+    hotwords = {}
+    lines = {}
+    for number, line in _lines(path):
+        fields = line.split()
+        if len(fields) != 2 or not fields[1].isdigit() or int(fields[1]) < 1:
+            raise ConfigError(f"{path}:{number}: expected 'hotword weight', got {line!r}")
+        word, weight = fields
+        if word in hotwords:
+            raise ConfigError(f"{path}:{number}: {word!r} already listed on line {lines[word]}")
+        hotwords[word] = int(weight)
+        lines[word] = number
+    return hotwords
+
+
+def parse_nlu(path):
+    """
+    Parse a command list: one command sentence per line.
+
+    Returns:
+        list: The commands, in file order.
+    """
+    return _unique(path, _lines(path))
+
+
+PARSERS = {'kws': parse_kws, 'asr': parse_asr, 'nlu': parse_nlu}
+
+
+class WordLists:
+    """
+    The KWS keywords, ASR hotwords and NLU commands, parsed and validated once and
+    shared by every client instead of each re-reading the files.
+    """
+
+    def __init__(self, kws, asr, nlu, directory='.') -> None:
+        """
+        Initializes the word lists.
+
+        Args:
+            kws (list): Keywords for KWS.
+            asr (dict): Hotwords and their weights for ASR.
+            nlu (list): Command sentences for NLU.
+            directory (str): Directory the lists were loaded from, for `reload`.
+        """
+        self.kws = kws
+        self.asr = asr
+        self.nlu = nlu
+        self.directory = directory
+
+    @classmethod
+    def load(cls, directory='.'):
+        """
+        Parse the word list files in `directory`.
+
+        Raises:
+            ConfigError: A file does not validate.
+        """
+        return cls(**{kind: PARSERS[kind](os.path.join(directory, name)) for kind, name in WORD_FILES.items()},
+                   directory=directory)
+
+    def reload(self, kinds):
+        """New word lists with the files of `kinds` parsed again and the others kept."""
+        lists = {kind: getattr(self, kind) for kind in WORD_FILES}
+        for kind in kinds:
+            lists[kind] = PARSERS[kind](os.path.join(self.directory, WORD_FILES[kind]))
+        return WordLists(**lists, directory=self.directory)
+
+    def changed(self, other):
+        """Kinds ('kws', 'asr', 'nlu') whose list differs in `other`; the order of hotwords does not count."""
+        return {kind for kind in WORD_FILES if getattr(self, kind) != getattr(other, kind)}
+
+    def kwargs(self):
+        """The lists as `words_kws`/`words_asr`/`words_nlu` arguments."""
+        return {'words_kws': self.kws, 'words_asr': self.asr, 'words_nlu': self.nlu}
+
+
+class ConfigWatcher:
+    """
+    Watches the word list files and pushes changed lists to the live clients.
+
+    The files' modification times are polled every `interval` seconds (cheap, and
+    portable where inotify is not). A changed file is parsed again; when the list in it
+    really changed, every listener is awaited with the new `WordLists` and the kinds that
+    changed, e.g. `Speech_Assistant.update_words`, which applies them on its open
+    connections. A file that does not validate (e.g. caught mid-edit) is reported and
+    the previous list stays in effect until the file is saved again.
+    """
+
+    def __init__(self, directory='.', interval=1.0, words=None) -> None:
+        """
+        Initializes the watcher; `start` (or `async with`) starts polling.
+
+        Args:
+            directory (str): Directory of the word list files.
+            interval (float): Seconds between polls.
+            words (WordLists): Lists already loaded from `directory`, None to load them.
+        """
+        self.directory = directory
+        self.interval = interval
+        self.words = words or WordLists.load(directory)
+        self.listeners = []
+        self.reloads = 0
+        self.errors = 0
+        self._stamps = self._stat()
+        self._task = None
+
+    def _stat(self):
+        stamps = {}
+        for kind, name in WORD_FILES.items():
+            try:
+                status = os.stat(os.path.join(self.directory, name))
+                stamps[kind] = (status.st_mtime_ns, status.st_size)
+            except OSError:
+                stamps[kind] = None
+        return stamps
+
+    def subscribe(self, listener):
+        """Have `listener(words, changed)` (a coroutine function) awaited on every change."""
+        self.listeners.append(listener)
+
+    async def check(self):
+        """
+        Reload the files modified since the last check and push what changed.
+
+        Returns:
+            set: Kinds whose list changed, empty if none did.
+        """
+        stamps = self._stat()
+        modified = [kind for kind in WORD_FILES if stamps[kind] != self._stamps[kind]]
+        if not modified:
+            return set()
+        self._stamps = stamps
+        try:
+            words = self.words.reload(modified)
+        except (OSError, ConfigError) as e:
+            self.errors += 1
+            print(f"Ignoring word lists that do not load: {e}")
+            return set()
+        changed = self.words.changed(words)
+        if not changed:
+            return set()
+        self.words = words
+        self.reloads += 1
+        results = await asyncio.gather(*(listener(words, changed) for listener in self.listeners),
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"Failed to apply word lists: {result!r}")
+        return changed
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.check()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self):
+        return {'reloads': self.reloads, 'errors': self.errors}
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def server_uris(host=None):
+    """
+    URLs of the KWS, ASR and NLU servers on `host`, as `uri_kws`/`uri_asr`/`uri_nlu` arguments.
+
+    Args:
+        host (str): Servers host, None for `FUNSOUND_HOST` (e.g. 127.0.0.1 with
+            `python -m mock_servers` runs offline) or the public servers.
+    """
+    host = host or os.environ.get('FUNSOUND_HOST', '47.96.15.141')
+    return {'uri_kws': f"ws://{host}:10094", 'uri_asr': f"wss://{host}:10095", 'uri_nlu': f"http://{host}:10096"}
+
+
+def event_loop():
+    """Event loop to run on (see `runtime.run`): `FUNSOUND_LOOP`, 'auto' by default."""
+    return os.environ.get('FUNSOUND_LOOP', 'auto')
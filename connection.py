@@ -0,0 +1,100 @@
+import asyncio
+import random
+
+
+def backoff_delay(attempt, initial=0.5, maximum=30.0, jitter=0.5):
+    """
+    Exponential backoff with jitter for reconnect attempt number `attempt` (0-based).
+
+    The delay doubles per attempt up to `maximum`, then a random fraction of up to
+    `jitter` is taken off so many clients do not reconnect in lockstep.
+    """
+    delay = min(maximum, initial * (2 ** attempt))
+    return delay * (1 - random.uniform(0, jitter))
+
+
+class ConnectionSupervisor:
+    """
+    Keeps one server connection alive.
+
+    `connect` is an async callable that opens the connection and replays its
+    initialization (e.g. `init_websocket_kws` + `init_model_kws`). When a user of the
+    connection notices it closed it calls `lost`, which reconnects in the background
+    with jittered exponential backoff while others `wait` for it to come back. Any error
+    from `connect` (not only network errors, e.g. a malformed init reply) counts as a
+    failed attempt and is retried, so the connection never stays down for good.
+    """
+
+    def __init__(self,
+                 name,
+                 connect,
+                 initial_delay=0.5,
+                 max_delay=30.0,
+                 jitter=0.5,
+                 log=print) -> None:
+        """
+        Initializes the supervisor.
+
+        Args:
+            name (str): Connection name used in log messages.
+            connect (callable): Coroutine function that (re)establishes the connection.
+            initial_delay (float): Delay in seconds before the first retry.
+            max_delay (float): Upper bound of the retry delay in seconds.
+            jitter (float): Fraction of the delay that is randomized away.
+            log (callable): Prints a log line, e.g. the owner's (quiet unless verbose) `log`.
+        """
+        self.name = name
+        self.connect = connect
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.log = log
+        self.connected = asyncio.Event()
+        self.reconnects = 0  # connections lost and re-established
+        self.failures = 0    # failed connection attempts
+        self.closing = False
+        self._task = None
+
+    @property
+    def is_connected(self):
+        return self.connected.is_set()
+
+    async def _connect_with_retry(self):
+        attempt = 0
+        while True:
+            try:
+                await self.connect()
+                self.connected.set()
+                return
+            except Exception as e:  # also protocol errors of the init exchange: retry, never give up silently
+                self.failures += 1
+                delay = backoff_delay(attempt, self.initial_delay, self.max_delay, self.jitter)
+                self.log(f"Failed to connect {self.name}: {e!r}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def start(self):
+        """Establish the initial connection, retrying until it succeeds."""
+        await self._connect_with_retry()
+
+    def lost(self):
+        """Report the connection as closed and start reconnecting (no-op if already reconnecting)."""
+        if self.closing or not self.connected.is_set():
+            return
+        self.connected.clear()
+        self.reconnects += 1
+        self.log(f"Lost {self.name}, reconnecting")
+        self._task = asyncio.create_task(self._connect_with_retry())
+
+    async def wait(self):
+        """Wait until the connection is available."""
+        await self.connected.wait()
+
+    def stop(self):
+        """Stop reconnecting, e.g. before closing the connection on shutdown."""
+        self.closing = True
+        if self._task:
+            self._task.cancel()
+
+    def stats(self):
+        return {'connected': self.is_connected, 'reconnects': self.reconnects, 'failures': self.failures}
@@ -0,0 +1,267 @@
+import asyncio
+from asr_session import AsrSessionPool, twopass_config
+from audio_frontend import open_device
+from audio_source import NetworkSource, open_source
+from main import Speech_Assistant
+from metrics import Metrics
+import runtime
+from nlu_client import NluClient, request_errors
+from nlu_matcher import LocalMatcher
+
+
+class AssistantHub:
+    """
+    Many `Speech_Assistant` sessions (microphones, files or network PCM streams) in one
+    process and one event loop.
+
+    Each session keeps its own KWS -> ASR -> NLU state machine and its own KWS and ASR
+    connections, since both protocols hold per-stream decoder state on the server. What
+    the sessions share is everything that is not per-stream: one pooled NLU client and
+    local matcher (the word list is uploaded once), one SSL context, and one pool of
+    pre-warmed ASR sessions for failover instead of an idle standby connection per session.
+    """
+
+    def __init__(self,
+                 uri_kws="ws://0.0.0.0:10094",
+                 uri_asr="wss://0.0.0.0:10095",
+                 uri_nlu="http://0.0.0.0:10096",
+                 words_kws=['小新小新', '小爱同学'],
+                 words_asr={"小米手机":20},
+                 words_nlu=[],
+                 asr_pool_size=2,
+                 nlu_connections=8,
+                 ping_interval=20,
+                 verbose=False,
+                 metrics_log=None,
+                 metrics_port=None,
+                 **options) -> None:
+        """
+        Initializes the hub.
+
+        Args:
+            uri_kws (str): URL for the KWS WebSocket server.
+            uri_asr (str): URL for the ASR WebSocket server.
+            uri_nlu (str): URL for the NLU HTTP server.
+            words_kws (list): List of keywords for KWS.
+            words_asr (dict): Dictionary of hotwords and their weights for ASR.
+            words_nlu (list): List of sentences to compare for NLU.
+            asr_pool_size (int): Pre-warmed ASR sessions shared by all sessions, 0 to disable.
+            nlu_connections (int): Size of the shared NLU connection pool.
+            ping_interval (float): WebSocket keepalive ping interval in seconds, None to disable.
+            verbose (bool): Print each session's dialogue and connection events.
+            metrics_log (str): JSON lines file for the pipeline events of all sessions.
+            metrics_port (int): Serve Prometheus metrics of all sessions on this port.
+            **options: Further `Speech_Assistant` arguments applied to every session;
+                `audio_thread=True` gives all sessions one shared audio thread.
+        """
+        self.uri_kws = uri_kws
+        self.uri_asr = uri_asr
+        self.uri_nlu = uri_nlu
+        self.words_kws = words_kws
+        self.words_asr = words_asr
+        self.words_nlu = words_nlu
+        self.ping_interval = ping_interval
+        self.verbose = verbose
+        self.audio_thread = runtime.AudioThread() if options.get('audio_thread') is True else None
+        if self.audio_thread:
+            options['audio_thread'] = self.audio_thread
+        self.options = options
+        self.nlu = NluClient(uri_nlu, max_connections=nlu_connections, max_concurrency=nlu_connections)
+        self.matcher = LocalMatcher(words_nlu)
+        asr_config = twopass_config(words_asr, codec=options.get('asr_codec', 'pcm'))
+        self.asr_pool = AsrSessionPool(uri_asr, asr_config, size=asr_pool_size, ping_interval=ping_interval,
+                                       log=print if verbose else lambda message: None) if asr_pool_size else None
+        self.metrics = Metrics(jsonl=metrics_log)
+        self.metrics_port = metrics_port
+        self.sessions = {}
+        self.tasks = {}
+        self.servers = []
+        self.watchdog = None
+        self._metrics_runner = None
+
+    async def start(self):
+        """Start the metrics, then upload the NLU word list once for all sessions while the ASR pool warms up."""
+        self.watchdog = runtime.LoopWatchdog(self.metrics, log=print if self.verbose else None)
+        self.watchdog.start()
+        if self.metrics_port:
+            self._metrics_runner = await self.metrics.serve(port=self.metrics_port)
+        await asyncio.gather(self.upload_words(), self.asr_pool.fill() if self.asr_pool else asyncio.sleep(0))
+        return self
+
+    async def upload_words(self):
+        """Upload the NLU word list shared by all sessions."""
+        try:
+            result = await self.nlu.upload_words(self.words_nlu)
+        except request_errors() as e:
+            result = {'code': 1, 'message': repr(e)}
+        if result.get('code') != 0:
+            print(f"Failed to upload word list: {result}")
+
+    async def update_words(self, words, changed):
+        """
+        Apply changed word lists to the shared NLU client, matcher and ASR pool once, and to
+        every session's live connections (a `config.ConfigWatcher` listener).
+
+        Args:
+            words (config.WordLists): The new word lists.
+            changed (set): Kinds of list that changed: 'kws', 'asr' and/or 'nlu'.
+        """
+        self.words_kws, self.words_asr, self.words_nlu = words.kws, words.asr, words.nlu
+        if 'nlu' in changed:
+            self.matcher = LocalMatcher(words.nlu)
+            for session in self.sessions.values():
+                session.matcher = self.matcher
+            await self.upload_words()
+        if 'asr' in changed and self.asr_pool:
+            await self.asr_pool.update_hotwords(words.asr)
+        await asyncio.gather(*(session.update_words(words, changed) for session in self.sessions.values()))
+
+    def add_session(self, name, source=None):
+        """
+        Start a session; it is removed from the hub (`sessions`, `stats`) when it ends.
+
+        Args:
+            name (str): Unique session name, used in logs and `stats`.
+            source: Audio source (see `audio_source`), None for the default microphone.
+
+        Returns:
+            Speech_Assistant: The running session.
+        """
+        if name in self.sessions:
+            raise ValueError(f"session {name!r} already exists")
+        session = Speech_Assistant(uri_kws=self.uri_kws,
+                                   uri_asr=self.uri_asr,
+                                   uri_nlu=self.uri_nlu,
+                                   words_kws=self.words_kws,
+                                   words_asr=self.words_asr,
+                                   words_nlu=self.words_nlu,
+                                   ping_interval=self.ping_interval,
+                                   source=source,
+                                   nlu=self.nlu,
+                                   matcher=self.matcher,
+                                   asr_pool=self.asr_pool,
+                                   name=name,
+                                   verbose=self.verbose,
+                                   metrics=self.metrics,
+                                   **self.options)
+        self.sessions[name] = session
+        self.tasks[name] = task = asyncio.create_task(session.run())
+        task.add_done_callback(lambda _: self.remove_session(name, session))
+        return session
+
+    def remove_session(self, name, session=None):
+        """
+        Stop a session if it still runs and drop it with its metric series, so ended
+        sessions (e.g. closed PCM connections) do not pile up in a long-running hub.
+
+        Args:
+            name (str): Session name.
+            session (Speech_Assistant): Only remove the session if it is this one, not a
+                newer session that took the name over.
+        """
+        if session is not None and self.sessions.get(name) is not session:
+            return
+        task = self.tasks.get(name)
+        if task is not None and not task.done():
+            task.cancel()  # removed by its done callback once it has stopped
+            return
+        self.sessions.pop(name, None)
+        self.tasks.pop(name, None)
+        self.metrics.remove_labels(session=name)
+
+    def add_device(self, device, name=None):
+        """Start a session on a local input device (index or name substring), in its own format."""
+        return self.add_session(name or f"mic{device}", open_device(device))
+
+    def add_file(self, path, name=None, speed=1.0):
+        """Start a session playing a WAV or raw PCM file, or a directory of them."""
+        return self.add_session(name or path, open_source(path, speed=speed))
+
+    async def serve_pcm(self, host='0.0.0.0', port=10097):
+        """
+        Accept raw 16 kHz int16 PCM streams over TCP, one session per connection.
+
+        Returns:
+            asyncio.Server: The listening server (closed by `close`).
+        """
+        async def handle(reader, writer):
+            peer = writer.get_extra_info('peername')
+            name = f"tcp:{peer[0]}:{peer[1]}" if peer else f"tcp{len(self.sessions)}"
+            session = self.add_session(name, NetworkSource(reader))
+            task = self.tasks[name]
+            try:
+                await task
+            finally:
+                self.remove_session(name, session)
+                writer.close()
+
+        server = await asyncio.start_server(handle, host, port)
+        self.servers.append(server)
+        return server
+
+    async def wait(self):
+        """Wait until every session has ended (i.e. its audio source was exhausted)."""
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+
+    def stats(self):
+        """Per-session stats plus the shared NLU cache and ASR pool counters."""
+        return {
+            'sessions': {name: session.stats() for name, session in self.sessions.items()},
+            'nlu_cache': self.nlu.cache.stats() if self.nlu.cache is not None else None,
+            'asr_pool': self.asr_pool.stats() if self.asr_pool else None,
+            'loop_lag': self.metrics.histogram('loop_lag_seconds').snapshot()
+            if self.metrics.histogram('loop_lag_seconds') else None,
+            'watchdog': self.watchdog.stats() if self.watchdog else None,
+        }
+
+    async def close(self):
+        """Stop all sessions and close the shared connections."""
+        for server in self.servers:
+            server.close()
+        for task in self.tasks.values():
+            task.cancel()
+        await self.wait()
+        if self.asr_pool:
+            await self.asr_pool.close()
+        await self.nlu.close()
+        if self.audio_thread:
+            self.audio_thread.close()
+        if self.watchdog:
+            self.watchdog.stop()
+        if self._metrics_runner:
+            await self._metrics_runner.cleanup()
+        self.metrics.event('metrics', **self.metrics.snapshot())
+        self.metrics.close()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+if __name__ == "__main__":
+    """
+    Run one hub for several audio sources, e.g.:
+        python hub.py 0 2 recordings/room3.wav tcp:10097
+    where numbers are input devices, `tcp:PORT` accepts PCM streams and anything else is a
+    WAV/PCM file or a directory of them.
+    """
+    import sys
+    import config
+
+    watcher = config.ConfigWatcher()
+
+    async def main():
+        async with AssistantHub(**config.server_uris(), **watcher.words.kwargs(), verbose=True) as hub, watcher:
+            watcher.subscribe(hub.update_words)
+            for arg in sys.argv[1:] or ['0']:
+                if arg.startswith('tcp:'):
+                    await hub.serve_pcm(port=int(arg[4:]))
+                elif arg.isdigit():
+                    hub.add_device(int(arg))
+                else:
+                    hub.add_file(arg)
+            await asyncio.Future()
+
+    runtime.run(main(), loop=config.event_loop())
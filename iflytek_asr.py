@@ -1,127 +1,651 @@
 # -*- encoding:utf-8 -*-
+import asyncio
+import base64
+import collections
 import hashlib
 import hmac
-import base64
-from socket import *
-import json, time, threading
-from websocket import create_connection
-import websocket
+import json
+import os
+import sys
+import time
 from urllib.parse import quote
-import logging
-import pyaudio
-
-# reload(sys)
-# sys.setdefaultencoding("utf8")
-class Client():
-    def __init__(self):
-        base_url = "ws://rtasr.xfyun.cn/v1/ws"
-        ts = str(int(time.time()))
-        tt = (app_id + ts).encode('utf-8')
-        md5 = hashlib.md5()
-        md5.update(tt)
-        baseString = md5.hexdigest()
-        baseString = bytes(baseString, encoding='utf-8')
-
-        apiKey = api_key.encode('utf-8')
-        signa = hmac.new(apiKey, baseString, hashlib.sha1).digest()
-        signa = base64.b64encode(signa)
-        signa = str(signa, 'utf-8')
-        self.end_tag = "{\"end\": true}"
-
-        self.ws = create_connection(base_url + "?appid=" + app_id + "&ts=" + ts + "&signa=" + quote(signa) + "&roleType=2")
-        self.trecv = threading.Thread(target=self.recv)
-        self.trecv.start()
+import websockets
+
+from asr_session import AsrSession
+from audio_capture import AudioCapture
+from audio_source import open_source
+from connection import ConnectionSupervisor
+from metrics import Metrics, SIZE_BUCKETS, write_buffer_size
+from pcm_buffer import PcmRingBuffer
+from transcript import Transcript
+from uplink import UplinkSender
+import runtime
+import config
+
+END_TAG = json.dumps({"end": True})
+
+
+def signed_url(base_url, app_id, api_key, ts=None, role_type=2):
+    """
+    Handshake URL of the RTASR service, signed for timestamp `ts` (now if None).
+
+    The signature, base64(HMAC-SHA1(api_key, md5(app_id + ts))), is only accepted close
+    to its timestamp, so it is computed anew for every connection.
+
+    Args:
+        base_url (str): Service URL, e.g. "ws://rtasr.xfyun.cn/v1/ws".
+        app_id (str): Application ID.
+        api_key (str): API key of the application.
+        ts (int): Unix time to sign, None for the current time.
+        role_type (int): 2 to have speakers told apart (`rl` in the results), None for not.
+    """
+    ts = str(int(time.time()) if ts is None else ts)
+    base = hashlib.md5((app_id + ts).encode('utf-8')).hexdigest().encode('utf-8')
+    signa = base64.b64encode(hmac.new(api_key.encode('utf-8'), base, hashlib.sha1).digest()).decode('utf-8')
+    url = f"{base_url}?appid={app_id}&ts={ts}&signa={quote(signa)}"
+    return url + f"&roleType={role_type}" if role_type else url
+
+
+def parse_result(data, role=0):
+    """
+    Parse the `data` of an RTASR `result` message into speaker turns.
+
+    Words carry the speaker (`rl`) only where it changes, 0 meaning "same as before", so
+    the speaker of the previous result is passed in as `role` and carried on.
+
+    Args:
+        data (str): JSON `data` field of the message.
+        role (int): Speaker at the end of the previous result, 0 if unknown.
+
+    Returns:
+        dict: `seg_id`, `final` (False for an intermediate result), `start`/`end` of the
+        segment in ms of the connection's audio, `turns` (one dict per run of words of a
+        speaker: `speaker`, `text`, `start`, `end`) and the `role` the result ends with.
+    """
+    data = json.loads(data)
+    st = data['cn']['st']
+    start = int(st['bg'])
+    turns = []
+    for rt in st['rt']:
+        for word in rt['ws']:
+            candidate = word['cw'][0]
+            speaker = int(candidate.get('rl') or 0) or role
+            # wb/we are in 10 ms frames from the start of the segment
+            begin, end = start + 10 * int(word.get('wb', 0)), start + 10 * int(word.get('we', 0))
+            if turns and turns[-1]['speaker'] == speaker:
+                turns[-1]['text'] += candidate['w']
+                turns[-1]['end'] = end
+            else:
+                turns.append({'speaker': speaker, 'text': candidate['w'], 'start': begin, 'end': end})
+            role = speaker
+    return {'seg_id': data.get('seg_id'), 'final': st['type'] == '0', 'start': start,
+            'end': int(st['ed']), 'turns': turns, 'role': role}
+
+
+class RtasrSession:
+    """One RTASR connection: its own signature, and its own time base for the results."""
+
+    def __init__(self, base_url, app_id, api_key, role_type=2, ping_interval=None) -> None:
+        self.base_url = base_url
+        self.app_id = app_id
+        self.api_key = api_key
+        self.role_type = role_type
+        self.ping_interval = ping_interval
+        self.ws = None
+        self.sid = None
+        self.opened = None   # monotonic time the service started the session
+        self.origin = None   # absolute sample position of the first audio sent, see `mark_origin`
+        self.ended = False   # the end tag was sent
+        self.bytes_sent = 0
+
+    async def open(self):
+        """
+        Connect and wait for the service to start the session.
+
+        Raises:
+            ConnectionRefusedError: The service answered the handshake with an error.
+        """
+        url = signed_url(self.base_url, self.app_id, self.api_key, role_type=self.role_type)
+        self.ws = await websockets.connect(url, compression=None, ping_interval=self.ping_interval)
+        response = json.loads(await self.ws.recv())
+        if response.get('action') != 'started':
+            await self.ws.close()
+            raise ConnectionRefusedError(f"RTASR handshake failed: {response.get('code')} {response.get('desc')}")
+        self.sid = response.get('sid')
+        self.opened = time.monotonic()
+        return self
+
+    def mark_origin(self, position):
+        """Record where in the stream this session's audio starts (once)."""
+        if self.origin is None:
+            self.origin = position
+
+    async def send_audio(self, data):
+        await self.ws.send(data)
+        self.bytes_sent += len(data)
+
+    async def end(self):
+        """Send the end tag: the service finalizes what it heard, then closes."""
+        await self.ws.send(END_TAG)
+        self.ended = True
+
+    async def recv(self):
+        return json.loads(await self.ws.recv())
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+
+class RtasrAsrSession(AsrSession):
+    """
+    The RTASR service behind the `AsrSession` interface, as an ASR backend of
+    `Speech_Assistant` or `AsrRouter`.
+
+    RTASR has no utterance lifecycle on a connection, so each utterance gets one of its
+    own, ended with the end tag. The next connection is opened while the current one is
+    in use, so `start_utterance` does not wait for a handshake; when none is ready the
+    backend counts as disconnected (`ConnectionClosed`) and is reopened by its owner.
+
+    Results are translated to the 2pass format: an intermediate result becomes a
+    `2pass-online` result with the text it added, and when the service has finalized an
+    ended connection and closed it, its final results become one `2pass-offline` result.
+    """
+
+    def __init__(self, uri, app_id, api_key, speakers=True, ping_interval=None, log=print) -> None:
+        """
+        Initializes the session; `open` connects.
+
+        Args:
+            uri (str): URL of the RTASR service.
+            app_id (str): Application ID.
+            api_key (str): API key the connections are signed with.
+            speakers (bool): Have the service tell speakers apart.
+            ping_interval (float): WebSocket keepalive ping interval, None to disable.
+            log (callable): Prints a log line, e.g. the owner's (quiet unless verbose) `log`.
+        """
+        super().__init__(uri, {}, ping_interval)
+        self.log = log
+        self.app_id = app_id
+        self.api_key = api_key
+        self.role_type = 2 if speakers else None
+        self.current = None  # connection of the utterance being sent or finalized last
+        self.next = None     # connection opened ahead for the next utterance
         self.role = 0
+        self.results = asyncio.Queue()
+        self._prefetch = None
+        self._readers = set()
+        self._closed = False
 
+    @property
+    def closed(self):
+        return self._closed
 
+    def new_connection(self):
+        return RtasrSession(self.uri_asr, self.app_id, self.api_key, self.role_type, self.ping_interval)
 
+    async def connect(self):
+        start = time.perf_counter()
+        self.next = await self.new_connection().open()
+        self.ws = self.next.ws
+        self.connect_time = time.perf_counter() - start
+
+    async def configure(self, is_speaking=False):
+        """Nothing to configure: the connection is signed for the service's one model."""
+
+    async def update_hotwords(self, hotwords):
+        """Nothing to update: RTASR takes its hotwords from the application's settings on the console."""
+
+    async def _open_next(self):
+        try:
+            self.next = await self.new_connection().open()
+        except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+            self.log(f"Failed to prepare the next websocket_rtasr: {e!r}")
 
-    def send(self,):
-        # 配置音频流
-        chunk_size = 1280  # 每次读取的字节数
-        sample_format = pyaudio.paInt16  # 16位采样深度
-        channels = 1  # 单声道
-        rate = 16000  # 采样率
+    async def start_utterance(self):
+        """Begin an utterance on the connection opened ahead (no-op if one is already open)."""
+        if self.speaking:
+            return
+        connection, self.next = self.next, None
+        if connection is None or connection.ws.close_code is not None:
+            raise websockets.ConnectionClosed(None, None)
+        self.current = connection
+        self.ws = connection.ws
+        reader = asyncio.create_task(self._read(connection))
+        self._readers.add(reader)
+        reader.add_done_callback(self._readers.discard)
+        self._prefetch = asyncio.create_task(self._open_next())
+        self.speaking = True
+        self.utterances += 1
 
-        p = pyaudio.PyAudio()
+    async def stop_utterance(self):
+        """End the current utterance: the service finalizes its connection and closes it."""
+        if self.speaking:
+            await self.current.end()
+            self.speaking = False
+            self.outstanding.append(False)
 
-        # 打开音频流
-        stream = p.open(format=sample_format,
-                        channels=channels,
-                        rate=rate,
-                        input=True,
-                        frames_per_buffer=chunk_size)
+    async def send_audio(self, data, audio_thread=None):
+        await self.current.send_audio(data)
 
+    async def _read(self, connection):
+        partial = ""  # text of the open segment
+        turns = []    # final speaker turns of the utterance
         try:
-            print("开始录音...")
             while True:
-                chunk = stream.read(chunk_size)
-                self.ws.send(chunk)
-                time.sleep(0.04)  # 控制发送速率
-        finally:
-            # 关闭音频流
-            stream.stop_stream()
-            stream.close()
-            p.terminate()
-            print("录音结束")
+                message = await connection.recv()
+                if message.get('action') != 'result' or message.get('code') != '0':
+                    continue
+                result = parse_result(message['data'], self.role)
+                self.role = result['role']
+                text = "".join(turn['text'] for turn in result['turns'])
+                if result['final']:
+                    turns += result['turns']
+                    partial = ""
+                    continue
+                added = text[len(partial):] if text.startswith(partial) else text
+                partial = text
+                if added:
+                    self.results.put_nowait({'mode': '2pass-online', 'text': added, 'is_final': False})
+        except websockets.ConnectionClosed:
+            pass
+        if not connection.ended:
+            return  # lost mid-utterance: the sender sees it and the utterance is replayed
+        text = "".join(turn['text'] for turn in turns)
+        # A command is one sentence; the speaker is the one who started it
+        self.results.put_nowait({'mode': '2pass-offline', 'text': text, 'is_final': True, 'stamp_sents': [{
+            'text_seg': text, 'punc': '', 'start': turns[0]['start'], 'end': turns[-1]['end'],
+            'speaker': turns[0]['speaker'],
+        }] if turns else []})
+
+    async def recv(self):
+        return await self.results.get()
+
+    async def close(self):
+        self._closed = True
+        if self._prefetch:
+            self._prefetch.cancel()
+        for reader in list(self._readers):
+            reader.cancel()
+        for connection in (self.current, self.next):
+            if connection is not None:
+                await connection.close()
+
+
+class RtasrClient:
+    """
+    Streaming client of the iFlytek real-time ASR (RTASR) service.
+
+    It has the same audio source and metrics interfaces as `Speech_Assistant`, so both
+    ASR backends can run on the same audio. Capture writes the shared `PcmRingBuffer`
+    and an `UplinkSender` sends it in `chunk`-sample messages (1280 bytes, as the service
+    wants them), with backpressure and replay after a reconnect. The service expects
+    audio at real time: a source that is not paced itself (e.g. a file replayed with
+    `speed=None`) is paced here against the monotonic clock at `pace` x real time.
+
+    Every connection is signed anew. A new connection after a drop is sent the audio
+    since the last final result again, so an utterance cut off by the drop is
+    recognized whole. Well before the service's own session limit a session is renewed
+    right after a final result, between utterances: the next one is opened first, then
+    the old one is ended and drained, so no audio or result is lost in the switch.
+
+    Results are parsed incrementally into `transcript`: an intermediate result replaces
+    the open partial text, a final one becomes segments, one per speaker turn.
+    """
+
+    def __init__(self,
+                 uri="ws://rtasr.xfyun.cn/v1/ws",
+                 app_id=None,
+                 api_key=None,
+                 speakers=True,
+                 chunk=640,
+                 pace=1.0,
+                 renew_after=300.0,
+                 audio_buffer=3.0,
+                 uplink_high_water=4096,
+                 uplink_max_lag=2.0,
+                 ping_interval=20,
+                 source=None,
+                 name=None,
+                 verbose=True,
+                 metrics=None,
+                 metrics_log=None,
+                 metrics_port=None) -> None:
+        """
+        Initializes the client.
 
-        self.ws.send(bytes(self.end_tag.encode('utf-8')))
-        print("send end tag success")
+        Args:
+            uri (str): URL of the RTASR service.
+            app_id (str): Application ID.
+            api_key (str): API key the connections are signed with.
+            speakers (bool): Have the service tell speakers apart.
+            chunk (int): Samples per audio message (640, i.e. 40 ms, as the service recommends).
+            pace (float): Speed relative to real time at which audio from an unpaced source is sent.
+            renew_after (float): Seconds after which a session is renewed at the next final result, None for never.
+            audio_buffer (float): Seconds of recent audio kept for replay after a reconnect.
+            uplink_high_water (int): Bytes queued on the socket above which the link counts as congested.
+            uplink_max_lag (float): Seconds of audio held back on a congested link before the
+                oldest is dropped, None to never drop.
+            ping_interval (float): WebSocket keepalive ping interval in seconds, None to disable.
+            source: Audio source with the `AudioCapture` interface; None captures the default
+                microphone. A source whose `read` returns None ends `run`.
+            name (str): Session name prefixed to log lines.
+            verbose (bool): Print the transcript and connection events.
+            metrics (Metrics): Shared metrics; this session's series get a `session` label.
+            metrics_log (str): JSON lines file for events, if we own the metrics.
+            metrics_port (int): Serve Prometheus metrics on this port, if we own the metrics.
+        """
+        self.uri = uri
+        self.app_id = app_id
+        self.api_key = api_key
+        self.role_type = 2 if speakers else None
+        self.chunk = chunk
+        self.pace = pace
+        self.renew_after = renew_after
+        self.sample_rate = 16000
+        self.audio_buffer_samples = int(audio_buffer * self.sample_rate)
+        self.uplink_high_water = uplink_high_water
+        self.uplink_max_lag = uplink_max_lag
+        self.ping_interval = ping_interval
+        self.session = None
+        self.uplink = None
+        self.renewals = 0
+        self.renewing = None  # task opening the next session
+        self.role = 0         # current speaker, carried across results
+        self.seg_id = None    # segment of the open partial text
+        self.finalized = 0    # absolute sample position up to which the audio has final results
+        self.frame_times = collections.deque(maxlen=1000)  # (end sample position, monotonic time) of captured frames
+        self.name = name
+        self.verbose = verbose
+        self.link = ConnectionSupervisor('websocket_rtasr', self.connect, log=self.log)
+        self.source = source
+        self.capture = None
+        self.watchdog = None
+        self.owns_metrics = metrics is None
+        self.metrics_port = metrics_port
+        metrics = Metrics(jsonl=metrics_log) if metrics is None else metrics
+        self.metrics = metrics.labelled(session=name) if name else metrics
+        self.asr_metrics = self.metrics.labelled(link='asr')
+        self.metrics.add_collector(self.collect_metrics)
+        self.transcript = Transcript()
 
+    def log(self, message, end="\n"):
+        """Print a log line (prefixed with the session name, if any) unless not verbose."""
+        if not self.verbose:
+            return
+        if self.name:
+            body = message.lstrip("\r\n")
+            message = f"{message[:len(message) - len(body)]}<{self.name}> {body}"
+        print(message, end=end)
 
-    def recv(self):
+    def collect_metrics(self):
+        """Refresh the gauges of live objects before a metrics export."""
+        self.asr_metrics.set('connected', int(self.link.is_connected))
+        self.asr_metrics.set('reconnects', self.link.reconnects)
+        self.asr_metrics.set('connect_failures', self.link.failures)
+        if self.uplink:
+            self.asr_metrics.set('uplink_backlog_seconds', self.uplink.backlog() / self.sample_rate)
+
+    def latency_stats(self):
+        """p50/p95 in ms of the latency histograms."""
+        summary = {}
+        for name in ('first_partial_latency_seconds', 'final_latency_seconds', 'loop_lag_seconds'):
+            histogram = self.metrics.histogram(name)
+            if histogram:
+                summary[name[:-len('_seconds')]] = (round(1000 * histogram.quantile(0.5), 1),
+                                                    round(1000 * histogram.quantile(0.95), 1))
+        return summary
+
+    def stats(self):
+        """Counters, final latency percentiles and connection stats."""
+        final = self.metrics.histogram('final_latency_seconds')
+
+        def percentile(q):
+            value = final.quantile(q) if final else None
+            return round(1000 * value, 1) if value is not None else None
+        return {
+            'finals': self.metrics.value('finals_total'),
+            'errors': self.metrics.value('rtasr_errors_total'),
+            'renewals': self.renewals,
+            'final_latency_p50_ms': percentile(0.5),
+            'final_latency_p95_ms': percentile(0.95),
+            'asr': self.link.stats(),
+            'capture': self.capture.stats() if self.capture else None,
+            'uplink': self.uplink.stats() if self.uplink else None,
+            'transcript': self.transcript.stats(),
+            'watchdog': self.watchdog.stats() if self.watchdog else None,
+        }
+
+    def new_session(self):
+        return RtasrSession(self.uri, self.app_id, self.api_key, self.role_type, self.ping_interval)
+
+    async def connect(self):
+        """
+        (Re)connect with a freshly signed handshake.
+
+        A new session has not heard the audio the old one had not finalized yet, so the
+        uplink goes back to the end of the last final result (as far as the ring holds).
+        """
+        session = await self.new_session().open()
+        self.session = session
+        if self.uplink:
+            self.uplink.reader.seek(self.finalized)
+        self.log(f"Connected to websocket_rtasr (sid {session.sid})")
+
+    async def renew(self, timeout=5.0):
+        """
+        Open the next session, switch the uplink to it, then end the old one and wait (up to
+        `timeout` seconds) until the service has sent its last results and closed it.
+        """
+        try:
+            session = await self.new_session().open()
+        except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+            self.log(f"Failed to renew websocket_rtasr: {e!r}")
+            return
+        old, self.session = self.session, session
+        self.renewals += 1
+        self.metrics.inc('rtasr_renewals_total')
+        self.log(f"Renewed websocket_rtasr (sid {session.sid})")
         try:
-            while self.ws.connected:
-                result = str(self.ws.recv())
-                if len(result) == 0:
-                    print("receive result end")
-                    break
-                result_dict = json.loads(result)
-
-                
-                if  result_dict['code']=='0' and result_dict['action'] == 'result':
-                    data = json.loads(result_dict['data'])
-                    tmp = data['cn']['st']['rt'][0]['ws']
-                    for seg in tmp:
-                        ret = seg['cw'][0]
-                        text = ret['w']
-                        rl = int(ret['rl'])
-                        if rl>0:
-                            self.role = rl
-                        print(f"Speaker-{self.role}: {text}")
-                    # for result in results:
-                    #     result
-
-                # print(result_dict)
-                # # 解析结果
-                # if result_dict["action"] == "started":
-                #     print("handshake success, result: " + result)
-
-                # if result_dict["action"] == "result":
-                #     result_1 = result_dict
-                #     # result_2 = json.loads(result_1["cn"])
-                #     # result_3 = json.loads(result_2["st"])
-                #     # result_4 = json.loads(result_3["rt"])
-                #     print("rtasr result: " + result_1["data"])
-
-                # if result_dict["action"] == "error":
-                #     print("rtasr error: " + result)
-                #     self.ws.close()
-                #     return
-        except websocket.WebSocketConnectionClosedException:
-            print("receive result end")
-
-    def close(self):
-        self.ws.close()
-        print("connection closed")
+            await old.end()
+            await asyncio.wait_for(old.ws.wait_closed(), timeout)
+        except websockets.ConnectionClosed:
+            pass
+        except asyncio.TimeoutError:
+            self.log("Timed out waiting for the last results of the renewed websocket_rtasr")
+            await old.close()  # lets the receiver go on with the new session
 
+    async def send_window(self, window):
+        """
+        Send one window of the ring to the current session.
 
-if __name__ == '__main__':
-    logging.basicConfig()
+        Returns:
+            bool: True if the window was sent, False if the connection was lost.
+        """
+        session = self.session
+        session.mark_origin(self.uplink.reader.position - len(window))
+        try:
+            await session.send_audio(window.data.cast('B'))
+        except websockets.ConnectionClosed:
+            if session is self.session:
+                self.link.lost()
+            return False
+        self.asr_metrics.observe('send_queue_bytes', write_buffer_size(session.ws), SIZE_BUCKETS)
+        return True
+
+    async def end_stream(self, timeout=5.0):
+        """Send the end tag and wait until the service has returned its last results and closed."""
+        self.link.stop()  # the service closing the connection now is no reason to reconnect
+        session = self.session
+        try:
+            await session.end()
+            await asyncio.wait_for(session.ws.wait_closed(), timeout)
+        except websockets.ConnectionClosed:
+            pass
+        except asyncio.TimeoutError:
+            self.log("Timed out waiting for the last RTASR results")
+        return True
+
+    def captured_at(self, position):
+        """Monotonic time the audio at absolute sample `position` was captured, None if no longer known."""
+        captured = None
+        for end, at in reversed(self.frame_times):
+            if end <= position:
+                return captured
+            captured = at
+        return captured if len(self.frame_times) < self.frame_times.maxlen else None
+
+    def handle_result(self, session, result):
+        """Apply a parsed result to the transcript and the metrics."""
+        self.role = result['role']
+        text = "".join(turn['text'] for turn in result['turns'])
+        if not result['final']:
+            if self.seg_id != result['seg_id']:
+                # First text of a segment: from the capture of its start to here
+                self.seg_id = result['seg_id']
+                captured = self.captured_at(session.origin + result['start'] * self.sample_rate // 1000)
+                if captured is not None:
+                    self.metrics.observe('first_partial_latency_seconds', time.monotonic() - captured)
+            # Intermediate results carry the whole segment so far: print only what was added
+            previous = self.transcript.partial
+            self.transcript.discard()
+            self.transcript.add_partial(text)
+            if previous and text.startswith(previous):
+                self.log(text[len(previous):], end="")
+            else:
+                self.log(f"\r[Speaker-{self.role}]：{text}", end="")
+            return
+
+        offset = 1000 * session.origin // self.sample_rate  # ms of the session's audio in the stream
+        self.transcript.add_final(text, [{'text_seg': turn['text'], 'speaker': turn['speaker'],
+                                          'start': offset + turn['start'], 'end': offset + turn['end']}
+                                         for turn in result['turns']])
+        self.seg_id = None
+        self.log("\r" + "".join(f"[Speaker-{turn['speaker']}]：{turn['text']}\n" for turn in result['turns']), end="")
+        self.metrics.inc('finals_total')
+        self.finalized = max(self.finalized, session.origin + result['end'] * self.sample_rate // 1000)
+        if (self.renew_after and session is self.session and self.renewing is None
+                and time.monotonic() - session.opened > self.renew_after):
+            # Between segments is where a switch splits no speech
+            self.renewing = asyncio.create_task(self.renew())
+            self.renewing.add_done_callback(lambda task: setattr(self, 'renewing', None))
+        # From the capture of the last audio of the segment, as the service ended it, to its final text
+        captured = self.captured_at(session.origin + result['end'] * self.sample_rate // 1000 - 1)
+        if captured is not None:
+            self.metrics.observe('final_latency_seconds', time.monotonic() - captured)
+        self.metrics.event('utterance', text=text, seg_id=result['seg_id'],
+                           speakers=sorted({turn['speaker'] for turn in result['turns']}),
+                           start_ms=offset + result['start'], end_ms=offset + result['end'])
+
+    async def receiver(self):
+        """
+        Receive results from the current session. A renewed one is read until the service
+        has closed it, so all of its results come in, and in order, before the new one's.
+        """
+        try:
+            session = self.session
+            while True:
+                try:
+                    message = await session.recv()
+                except websockets.ConnectionClosed as e:
+                    if self.link.closing and session is self.session:
+                        return  # the stream was ended
+                    if session is self.session:  # not a renewed session that was drained
+                        self.log(f"Connection closed: {e}")
+                        self.link.lost()
+                        await self.link.wait()
+                        self.transcript.discard()
+                        self.seg_id = None
+                    session = self.session
+                    continue
+                if message.get('action') == 'error':
+                    self.log(f"RTASR error: {message.get('code')} {message.get('desc')}")
+                    self.metrics.inc('rtasr_errors_total')
+                    self.metrics.event('rtasr_error', code=message.get('code'), desc=message.get('desc'))
+                elif message.get('action') == 'result' and message.get('code') == '0':
+                    self.handle_result(session, parse_result(message['data'], self.role))
+        except Exception as e:
+            self.log(f"Unexpected error: {e!r}")
+
+    async def run(self):
+        """Stream the audio source to the service until it ends, printing the transcript."""
+        await self.link.start()
+        pcm = PcmRingBuffer(capacity=self.audio_buffer_samples)
+        reader = pcm.reader(self.chunk)
+        # After a reconnect `connect` moves the reader back to the audio without final results
+        self.uplink = UplinkSender('rtasr', reader, self.send_window, self.link,
+                                   lambda: self.session.ws if self.session else None,
+                                   high_water=self.uplink_high_water,
+                                   max_lag=self.uplink_max_lag, sample_rate=self.sample_rate,
+                                   metrics=self.asr_metrics)
+        metrics_runner = None
+        receive_task = asyncio.create_task(self.receiver())
+        try:
+            self.uplink.start()
+            self.uplink.enable()
+            if self.owns_metrics:
+                self.watchdog = runtime.LoopWatchdog(self.metrics, log=self.log)
+                self.watchdog.start()
+                if self.metrics_port:
+                    metrics_runner = await self.metrics.serve(port=self.metrics_port)
 
-    app_id = "8e901072"
-    api_key = "5fb0231d9ab71f7961025f351bcbd804"
-    file_path = r"./test_1.pcm"
+            self.capture = self.source or AudioCapture(sample_rate=self.sample_rate, blocksize=320)
+            started = None
+            async with self.capture:
+                self.log("Recording... Press Ctrl+C to stop.")
+                while True:
+                    frame = await self.capture.read()
+                    if frame is None:
+                        break
+                    if not self.capture.paced and self.pace:
+                        # Send at real time against the clock, not by sleeping per chunk (which drifts)
+                        started = started or time.monotonic()
+                        delay = started + pcm.written / self.sample_rate / self.pace - time.monotonic()
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                    pcm.write(frame)
+                    self.frame_times.append((pcm.written, time.monotonic()))
+                    self.uplink.notify()
+            # Flush the last audio, then have the service finalize it
+            done = asyncio.Event()
 
-    client = Client()
-    client.send()
+            async def finish():
+                done.set()
+                return await self.end_stream()
+            self.uplink.stop_at(pcm.written, finish)
+            await done.wait()
+            while self.uplink.enabled:
+                await asyncio.sleep(0.01)
+        except KeyboardInterrupt:
+            self.log("Recording stopped.")
+        except Exception as e:
+            self.log(f"An error occurred: {e!r}")
+        finally:
+            self.link.stop()
+            receive_task.cancel()
+            self.uplink.stop()
+            if self.renewing:
+                self.renewing.cancel()
+            self.log(f"Connection stats: {self.link.stats()}, renewals {self.renewals}")
+            self.log(f"Uplink stats: {self.uplink.stats()}")
+            self.log(f"Latency stats: {self.latency_stats()}")
+            if self.session:
+                await self.session.close()
+            if self.owns_metrics:
+                if self.watchdog:
+                    self.watchdog.stop()
+                if metrics_runner:
+                    await metrics_runner.cleanup()
+                self.metrics.event('metrics', **self.metrics.snapshot())
+                self.metrics.close()
+
+
+if __name__ == '__main__':
+    # Credentials from the console; e.g. IFLYTEK_URL=ws://127.0.0.1:10098/v1/ws with
+    # `python -m mock_servers.rtasr` runs offline
+    client = RtasrClient(uri=os.environ.get('IFLYTEK_URL', "ws://rtasr.xfyun.cn/v1/ws"),
+                         app_id=os.environ.get('IFLYTEK_APP_ID', "8e901072"),
+                         api_key=os.environ.get('IFLYTEK_API_KEY', "5fb0231d9ab71f7961025f351bcbd804"),
+                         # An optional WAV/PCM file or directory argument is streamed instead of the microphone
+                         source=open_source(sys.argv[1], speed=None) if len(sys.argv) > 1 else None)
+    runtime.run(client.run(), loop=config.event_loop())
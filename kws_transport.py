@@ -0,0 +1,68 @@
+import base64
+import json
+import numpy as np
+
+# Transports in order of preference; 'json' (decimal integer arrays) is the legacy format
+# every KWS server understands and is always the final fallback.
+TRANSPORTS = ('binary', 'base64', 'json')
+
+
+def offer(transport='auto'):
+    """Return the list of transports to offer in the KWS init message."""
+    if transport == 'auto':
+        return list(TRANSPORTS)
+    if transport not in TRANSPORTS:
+        raise ValueError(f"unknown KWS transport: {transport}")
+    return [transport]
+
+
+def negotiate(offered, response):
+    """
+    Pick the transport confirmed by the server's init response.
+
+    Servers that predate negotiation do not echo a `transport` field, in which case
+    the legacy JSON format is used.
+    """
+    transport = response.get('transport', 'json')
+    if transport not in offered:
+        return 'json'
+    return transport
+
+
+def encode_listen(window, sample_rate, transport):
+    """Encode one int16 window as a KWS `listen` message for the given transport."""
+    if transport == 'binary':
+        return window.data.cast('B')
+    if transport == 'base64':
+        samples = base64.b64encode(window).decode('ascii')
+        return json.dumps({
+            "remote": 'listen',
+            "samples": samples,
+            "encoding": 'base64',
+            "sample_rate": sample_rate
+        })
+    return json.dumps({
+        "remote": 'listen',
+        "samples": window.tolist(),
+        "sample_rate": sample_rate
+    })
+
+
+def decode_samples(request):
+    """Extract int16 samples from a parsed JSON `listen` request (legacy or base64)."""
+    if request.get('encoding') == 'base64':
+        return np.frombuffer(base64.b64decode(request['samples']), dtype=np.int16)
+    return np.asarray(request['samples'], dtype=np.int16)
+
+
+def decode_listen(message, sample_rate=16000):
+    """
+    Decode a KWS `listen` message of any transport.
+
+    Returns:
+        tuple: (int16 samples, sample rate)
+    """
+    if isinstance(message, (bytes, bytearray, memoryview)):
+        return np.frombuffer(message, dtype=np.int16), sample_rate
+    request = json.loads(message)
+    return decode_samples(request), request.get('sample_rate', sample_rate)
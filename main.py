@@ -1,11 +1,24 @@
-import sounddevice as sd
 import websockets
 import asyncio
 import json
-import ssl 
-import queue 
-import numpy as np 
-import requests
+import time
+import sys
+import collections
+from audio_capture import AudioCapture
+from audio_source import open_source
+import audio_frontend
+from pcm_buffer import PcmRingBuffer
+import kws_transport
+from nlu_client import NluClient, request_errors
+from nlu_matcher import LocalMatcher, normalize
+from vad import EnergyVad
+from asr_session import AsrSession, twopass_config
+from connection import ConnectionSupervisor
+from uplink import UplinkSender
+from transcript import Transcript
+from metrics import Metrics, SIZE_BUCKETS, write_buffer_size
+import runtime
+import config
 
 class Speech_Assistant():
     """
@@ -19,7 +32,37 @@ class Speech_Assistant():
                  uri_nlu="http://0.0.0.0:10096",
                  words_kws=['小新小新', '小爱同学'],
                  words_asr={"小米手机":20},
-                 words_nlu=[]) -> None:
+                 words_nlu=[],
+                 kws_transport='auto',
+                 nlu_threshold=0.6,
+                 speculative_nlu=True,
+                 vad=True,
+                 vad_hangover=0.5,
+                 vad_preroll=0.3,
+                 wake_lookback=0.5,
+                 final_timeout=5.0,
+                 asr_standby=True,
+                 ping_interval=20,
+                 audio_buffer=3.0,
+                 kws_chunk=1600,
+                 asr_chunk=960,
+                 kws_coalesce=1,
+                 asr_coalesce=4,
+                 uplink_high_water=4096,
+                 uplink_max_lag=2.0,
+                 asr_codec='pcm',
+                 barge_in=False,
+                 audio_thread=False,
+                 source=None,
+                 nlu=None,
+                 matcher=None,
+                 asr_pool=None,
+                 asr_router=None,
+                 name=None,
+                 verbose=True,
+                 metrics=None,
+                 metrics_log=None,
+                 metrics_port=None) -> None:
         """
         Initializes the Speech Assistant with URLs and keyword configurations.
         
@@ -30,6 +73,53 @@ class Speech_Assistant():
             words_kws (list): List of keywords for KWS.
             words_asr (dict): Dictionary of hotwords and their weights for ASR.
             words_nlu (list): List of sentences to compare for NLU.
+            kws_transport (str): KWS audio encoding to negotiate: 'auto', 'binary', 'base64' or 'json'.
+            nlu_threshold (float): Local NLU matches scoring below this fall back to the NLU server.
+            speculative_nlu (bool): Match the online partial text (locally or from the NLU cache)
+                while the final result is awaited, and take that match when the final text
+                turns out the same.
+            vad (bool): Gate the ASR stream with client-side voice activity detection.
+            vad_hangover (float): Seconds of silence that end an utterance.
+            vad_preroll (float): Seconds of audio sent from before the detected speech start.
+            wake_lookback (float): Seconds of audio from before the wake-up flushed to ASR when the
+                command follows the wake word without a pause (the ring is sized to keep them).
+            final_timeout (float): Seconds from the end of an utterance after which its final
+                result counts as lost: it is resolved as empty and the wake word listened for again.
+            asr_standby (bool): Keep a pre-warmed standby ASR session for instant failover.
+            ping_interval (float): WebSocket keepalive ping interval in seconds, None to disable.
+            audio_buffer (float): Seconds of recent audio kept, which also bounds what is
+                replayed to a server after its connection was re-established.
+            kws_chunk (int): Samples per KWS message, as the KWS server expects them.
+            asr_chunk (int): Samples per ASR message (960, i.e. 60 ms, suits the 2pass chunk size).
+            kws_coalesce (int): Most KWS chunks sent as one message when a backlog built up.
+            asr_coalesce (int): Most ASR chunks sent as one message when a backlog built up.
+            uplink_high_water (int): Bytes queued on a socket above which the link counts as
+                congested and audio is held back in the ring.
+            uplink_max_lag (float): Seconds of audio held back on a congested link before the
+                oldest is dropped, None to never drop.
+            asr_codec (str): ASR uplink codec to negotiate: 'pcm', 'adpcm', 'opus' (needs
+                opuslib) or 'auto'; servers that do not confirm it get raw PCM.
+            barge_in (bool): Keep streaming to KWS while a command is recognized: a wake word
+                then cancels the utterance in progress and starts a new one, and a wake word
+                right after a command starts the next one before the previous result is in.
+            audio_thread (bool or AudioThread): Encode KWS (JSON transports) and ASR (codecs)
+                audio on a dedicated thread instead of the event loop; an `AudioThread`
+                is shared (e.g. by a hub) and not closed by this assistant.
+            source: Audio source with the `AudioCapture` interface (e.g. `audio_source.FileSource`);
+                None captures the default microphone. A source whose `read` returns None ends `run`.
+            nlu (NluClient): Shared NLU client; the word list is then uploaded (and the client
+                closed) by its owner instead of by this assistant.
+            matcher (LocalMatcher): Shared local matcher built from `words_nlu`, None to build one
+                at startup.
+            asr_pool (AsrSessionPool): Shared pre-warmed ASR sessions, used instead of a standby
+                session of our own.
+            asr_router (AsrRouter): Routes each utterance between several ASR backends (e.g. the
+                2pass server and iFlytek RTASR), used instead of the session at `uri_asr`.
+            name (str): Session name prefixed to log lines, for several assistants in one process.
+            verbose (bool): Print the dialogue and connection events.
+            metrics (Metrics): Shared metrics; this session's series get a `session` label.
+            metrics_log (str): JSON lines file for pipeline events, if we own the metrics.
+            metrics_port (int): Serve Prometheus metrics on this port, if we own the metrics.
         """
         self.uri_kws = uri_kws
         self.uri_asr = uri_asr
@@ -37,227 +127,803 @@ class Speech_Assistant():
         self.words_kws = words_kws
         self.words_asr = words_asr
         self.words_nlu = words_nlu
+        self.kws_transport = kws_transport
+        self.kws_transport_active = 'json'
+        self.owns_nlu = nlu is None
+        self.nlu = NluClient(uri_nlu) if nlu is None else nlu
+        self.nlu_threshold = nlu_threshold
+        self.speculative_nlu = speculative_nlu
+        self.speculation = None  # (normalized partial text, its local or cached match or None)
+        self.matcher = matcher  # built by `init_model_nlu` unless shared
         self.sample_rate = 16000
+        self.vad = EnergyVad(sample_rate=self.sample_rate, hangover=vad_hangover, preroll=vad_preroll) if vad else None
+        self.asr_standby_enabled = asr_standby and asr_pool is None and asr_router is None
+        self.asr_pool = asr_pool
+        self.asr_router = asr_router
+        if asr_router is not None:
+            asr_router.log = self.log  # backends failing to connect are logged like the other connections
+        self.ws_session_kws = None
+        self.asr = None
+        self.asr_standby = None
+        self.standby_task = None
+        self.wake_lookback_samples = int(wake_lookback * self.sample_rate)
+        self.final_timeout = final_timeout
+        self.ping_interval = ping_interval
+        self.audio_buffer_samples = int(max(audio_buffer, wake_lookback + 0.5) * self.sample_rate)
+        self.kws_chunk = kws_chunk
+        self.asr_chunk = asr_chunk
+        self.kws_coalesce = kws_coalesce
+        self.asr_coalesce = asr_coalesce
+        self.uplink_high_water = uplink_high_water
+        self.uplink_max_lag = uplink_max_lag
+        self.asr_codec = asr_codec
+        self.kws_uplink = None
+        self.asr_uplink = None
+        self.barge_in = barge_in
+        self.owns_audio_thread = audio_thread is True
+        self.audio_thread = runtime.AudioThread() if audio_thread is True else audio_thread or None
+        self.watchdog = None
+        self.name = name
+        self.verbose = verbose
+        # connection events go through `log`, which prefixes the session name and is quiet unless verbose
+        self.kws_link = ConnectionSupervisor('websocket_kws', self.connect_kws, log=self.log)
+        self.asr_link = ConnectionSupervisor('websocket_asr', self.connect_asr, log=self.log)
         self.state = 'kws'
         self.assistant = "unknown"
+        self.source = source
+        self.capture = None
+        self.command_done = asyncio.Event()
+        self.owns_metrics = metrics is None
+        self.metrics_port = metrics_port
+        metrics = Metrics(jsonl=metrics_log) if metrics is None else metrics
+        self.metrics = metrics.labelled(session=name) if name else metrics
+        self.kws_metrics = self.metrics.labelled(link='kws')
+        self.asr_metrics = self.metrics.labelled(link='asr')
+        self.metrics.add_collector(self.collect_metrics)
+        self.kws_sent_at = None  # monotonic time the last KWS window was sent
+        self.wake_count = 0
+        self.trace = {}          # monotonic timestamps of the current utterance, from the wake-up on
+        self.awaiting = collections.deque()  # (trace, keyword) of ended utterances awaiting their result
+        self.transcript = Transcript()  # what was said, bounded to the last segments
+        self.startup = {}  # ms each startup phase took, and until `ready` from the start of `run`
+
+    def log(self, message, end="\n", prefix=True):
+        """Print a log line (prefixed with the session name, if any) unless not verbose; `prefix=False` continues the current line."""
+        if not self.verbose:
+            return
+        if self.name and prefix:
+            body = message.lstrip("\r\n")
+            message = f"{message[:len(message) - len(body)]}<{self.name}> {body}"
+        print(message, end=end)
+
+    def mark(self, event, trace=None):
+        """Record the time of an utterance event (only its first occurrence)."""
+        trace = self.trace if trace is None else trace
+        return trace.setdefault(event, time.monotonic())
+
+    def observe_between(self, name, start, end, trace=None):
+        """Observe the time from trace event `start` to `end` into histogram `name`, if both happened."""
+        trace = self.trace if trace is None else trace
+        if start in trace and end in trace:
+            self.metrics.observe(name, trace[end] - trace[start])
+
+    def end_trace(self, text, result, trace=None, keyword=None):
+        """Log the finished utterance as one event, with its timestamps relative to the wake-up."""
+        trace = self.trace if trace is None else trace
+        origin = trace.get('wake', 0.0)
+        self.metrics.event('utterance', keyword=keyword or self.assistant, text=text, code=result.get('code'),
+                           command=result.get('best_match'), score=result.get('score'),
+                           **{f"{event}_ms": round(1000 * (at - origin), 1) for event, at in trace.items()})
+
+    def startup_phase(self, phase, since):
+        """Record the ms startup `phase`, begun at monotonic time `since`, took (not again on reconnects)."""
+        self.startup.setdefault(phase, round(1000 * (time.monotonic() - since), 1))
+
+    def result_utterance(self):
+        """(trace, keyword) of the utterance ASR results currently belong to: the oldest one awaiting its result."""
+        return self.awaiting[0] if self.awaiting else (self.trace, self.assistant)
+
+    def collect_metrics(self):
+        """Refresh the gauges of live objects before a metrics export."""
+        for metrics, link in ((self.kws_metrics, self.kws_link), (self.asr_metrics, self.asr_link)):
+            metrics.set('connected', int(link.is_connected))
+            metrics.set('reconnects', link.reconnects)
+            metrics.set('connect_failures', link.failures)
+        for metrics, uplink in ((self.kws_metrics, self.kws_uplink), (self.asr_metrics, self.asr_uplink)):
+            if uplink:
+                metrics.set('uplink_backlog_seconds', uplink.backlog() / self.sample_rate)
+        if self.capture:
+            for key, value in self.capture.stats().items():
+                if isinstance(value, (int, float)):
+                    self.metrics.set(f'capture_{key}', value)
+
+    def latency_stats(self):
+        """p50/p95 in ms of this session's latency histograms."""
+        summary = {}
+        for name in ('wake_latency_seconds', 'first_partial_latency_seconds', 'final_latency_seconds',
+                     'nlu_rtt_seconds', 'response_latency_seconds', 'loop_lag_seconds'):
+            histogram = self.metrics.histogram(name)
+            if histogram:
+                summary[name[:-len('_seconds')]] = (round(1000 * histogram.quantile(0.5), 1),
+                                                    round(1000 * histogram.quantile(0.95), 1))
+        return summary
+
+    def stats(self):
+        """Per-session counters, response latency percentiles and connection stats."""
+        response = self.metrics.histogram('response_latency_seconds')
+
+        def percentile(q):
+            value = response.quantile(q) if response else None
+            return round(1000 * value, 1) if value is not None else None
+        return {
+            'wakes': self.metrics.value('wakes_total'),
+            'commands': self.metrics.value('commands_total'),
+            'failures': self.metrics.value('match_failures_total'),
+            'latency_p50_ms': percentile(0.5),
+            'latency_p95_ms': percentile(0.95),
+            'kws': self.kws_link.stats(),
+            'asr': self.asr_link.stats(),
+            'capture': self.capture.stats() if self.capture else None,
+            'uplink': {'kws': self.kws_uplink.stats(), 'asr': self.asr_uplink.stats()} if self.kws_uplink else None,
+            'transcript': self.transcript.stats(),
+            'asr_router': self.asr_router.stats() if self.asr_router else None,
+            'startup_ms': self.startup,
+            'watchdog': self.watchdog.stats() if self.watchdog else None,
+        }
 
     async def init_websocket_kws(self):
         """Initialize WebSocket connection for KWS."""
-        self.ws_session_kws = await websockets.connect(self.uri_kws)
-        print("Connected to websocket_kws")
+        # PCM hardly compresses: permessage-deflate would only cost CPU and latency on the uplink
+        self.ws_session_kws = await websockets.connect(self.uri_kws, ping_interval=self.ping_interval, compression=None)
+        self.log("Connected to websocket_kws")
 
     async def init_websocket_asr(self):
-        """Initialize WebSocket connection for ASR."""
-        ssl_context = ssl.SSLContext()
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE
-        self.ws_session_asr = await websockets.connect(self.uri_asr, subprotocols=["binary"], ping_interval=None, ssl=ssl_context)
-        print("Connected to websocket_asr")
+        """Initialize the long-lived WebSocket session for ASR."""
+        self.asr = AsrSession(self.uri_asr, self.asr_config(), ping_interval=self.ping_interval)
+        await self.asr.connect()
+        self.log(f"Connected to websocket_asr ({1000 * self.asr.connect_time:.0f} ms)")
 
     async def close_websockets(self):
         """Close WebSockets ."""
         if self.ws_session_kws:
             await self.ws_session_kws.close()
-            print("Closed websocket_kws")
-        if self.ws_session_asr:
-            await self.ws_session_asr.close()
-            print("Closed websocket_asr")
+            self.log("Closed websocket_kws")
+        if self.standby_task:
+            self.standby_task.cancel()
+        if self.asr_standby:
+            await self.asr_standby.close()
+        if self.asr:
+            await self.asr.close()
+            self.log("Closed websocket_asr")
+
+    def kws_config(self, offered):
+        """KWS init message for the keywords, offering the transports `offered`."""
+        return {
+            'remote': 'init',
+            'words': self.words_kws,
+            'transports': offered,
+            'sample_rate': self.sample_rate
+        }
 
     async def init_model_kws(self):
         """Initialize KWS model by sending configuration."""
-        conf = {
-            'remote': 'init',
-            'words': self.words_kws
-        }
-        await self.ws_session_kws.send(json.dumps(conf))
+        offered = kws_transport.offer(self.kws_transport)
+        await self.ws_session_kws.send(json.dumps(self.kws_config(offered)))
         response = json.loads(await self.ws_session_kws.recv())
-        print(response)
-        print("Successfully initialized KWS model")
+        self.log(response)
+        self.kws_transport_active = kws_transport.negotiate(offered, response)
+        self.log(f"Successfully initialized KWS model (transport: {self.kws_transport_active})")
+
+    def asr_config(self):
+        """ASR model configuration; `is_speaking` is managed by the session."""
+        return twopass_config(self.words_asr, codec=self.asr_codec)
 
     async def init_model_asr(self):
         """Initialize ASR model by sending configuration."""
-        conf = {
-            "mode": "2pass",
-            "chunk_size": [5, 10, 5],
-            "chunk_interval": 10,
-            "encoder_chunk_look_back": 4,
-            "decoder_chunk_look_back": 0,
-            "wav_name": "microphone",
-            "hotwords": json.dumps(self.words_asr),
-            "itn": True,
-            "is_speaking": True
-        }
-        await self.ws_session_asr.send(json.dumps(conf))
-        print("Successfully initialized ASR model")
+        await self.asr.configure()
+        self.log(f"Successfully initialized ASR model (codec: {self.asr.codec})")
+
+    async def connect_kws(self):
+        """(Re)connect to the KWS server and replay its initialization."""
+        start = time.monotonic()
+        await self.init_websocket_kws()
+        self.startup_phase('kws_connect', start)
+        start = time.monotonic()
+        await self.init_model_kws()
+        self.startup_phase('kws_init', start)
+
+    async def connect_asr(self):
+        """
+        (Re)connect the ASR session and replay its initialization.
+
+        A ready standby session (our own or one from the shared pool) is promoted instead,
+        which skips the handshake and model initialization; a new standby is then warmed
+        in the background. With a router only the backends that are down are reconnected.
+        """
+        start = time.monotonic()
+        if self.asr_router:
+            self.asr = await self.asr_router.open()
+            self.startup_phase('asr_connect', start)
+            connected = [backend.name for backend in self.asr.backends if backend.connected]
+            self.log(f"Connected to ASR backends: {', '.join(connected)}")
+        else:
+            if self.asr_standby is None or self.asr_standby.closed:
+                self.asr_standby = self.asr_pool.take() if self.asr_pool else None
+            if self.asr_standby is not None:
+                self.asr, self.asr_standby = self.asr_standby, None
+                self.log("Switched to standby websocket_asr")
+            else:
+                await self.init_websocket_asr()
+                self.startup_phase('asr_connect', start)
+                start = time.monotonic()
+                await self.init_model_asr()
+                self.startup_phase('asr_init', start)
+        # Results of utterances ended on the old connection will not come; one still being
+        # sent is replayed and its result then belongs to the current utterance
+        self.awaiting.clear()
+        if self.asr_standby_enabled and (self.standby_task is None or self.standby_task.done()):
+            self.standby_task = asyncio.create_task(self.warm_asr_standby())
+
+    async def warm_asr_standby(self):
+        """Connect and configure a standby ASR session to take over if the active one drops."""
+        try:
+            self.asr_standby = await AsrSession(self.uri_asr, self.asr_config(),
+                                                ping_interval=self.ping_interval).open()
+        except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+            self.log(f"Failed to prepare standby websocket_asr: {e!r}")
+
+    async def send_kws_audio(self, data):
+        """
+        Send a KWS window, reporting the connection as lost if it closed.
+
+        Returns:
+            bool: True if the window was sent.
+        """
+        try:
+            await self.ws_session_kws.send(data)
+        except websockets.ConnectionClosed:
+            self.kws_link.lost()
+            return False
+        self.kws_sent_at = time.monotonic()
+        self.kws_metrics.observe('send_queue_bytes', write_buffer_size(self.ws_session_kws), SIZE_BUCKETS)
+        return True
+
+    async def send_asr_audio(self, data):
+        """
+        Send ASR audio, opening the utterance on the session first if needed.
+
+        Returns:
+            bool: True if the audio was sent, False if the connection was lost.
+        """
+        try:
+            await self.asr.start_utterance()
+            await self.asr.send_audio(data, self.audio_thread)
+        except websockets.ConnectionClosed:
+            self.asr_link.lost()
+            return False
+        self.mark('speech_start')
+        self.asr_metrics.observe('send_queue_bytes', write_buffer_size(self.asr.ws), SIZE_BUCKETS)
+        return True
 
     async def init_model_nlu(self):
-        """Initialize NLU model by uploading the word list."""
-        payload = {
-            'sentences_to_compare': self.words_nlu
-        }
-        headers = {'Content-Type': 'application/json'}
-        response = requests.post(f'{self.uri_nlu}/upload_words', data=json.dumps(payload), headers=headers)
-        if response.status_code == 200:
-            print("NLU word list uploaded successfully.")
+        """Initialize NLU model by building the local index and uploading the word list."""
+        if not self.owns_nlu and self.matcher is not None:
+            return  # the owner of the shared client and matcher has initialized them
+        self.matcher = LocalMatcher(self.words_nlu)
+        if not self.owns_nlu:
+            return
+        start = time.monotonic()
+        await self.nlu.preload()
+        self.startup_phase('nlu_import', start)
+        start = time.monotonic()
+        try:
+            result = await self.nlu.upload_words(self.words_nlu)
+        except request_errors() as e:
+            result = {'code': 1, 'message': repr(e)}
+        if result.get('code') == 0:
+            self.log("NLU word list uploaded successfully.")
         else:
-            print(f"Failed to upload word list: {response.json()}")
-        print("Successfully initialized NLU model")
-        
+            self.log(f"Failed to upload word list: {result}")
+        self.startup_phase('nlu_upload', start)
+        self.log("Successfully initialized NLU model")
+
+    async def update_words(self, words, changed):
+        """
+        Apply changed word lists on the live connections (a `config.ConfigWatcher` listener).
+
+        KWS is initialized again with the new keywords on its connection, keeping the
+        negotiated transport; its reply is taken by `receiver_kws`. The ASR session gets the
+        new hotwords, applied from its next decode on, and the NLU command list is indexed
+        and uploaded again. The audio keeps flowing and nothing reconnects; a reconnect
+        later replays the new lists.
+
+        Args:
+            words (config.WordLists): The new word lists.
+            changed (set): Kinds of list that changed: 'kws', 'asr' and/or 'nlu'.
+        """
+        if 'kws' in changed:
+            self.words_kws = words.kws
+            if self.kws_link.is_connected:
+                try:
+                    await self.ws_session_kws.send(json.dumps(self.kws_config([self.kws_transport_active])))
+                except websockets.ConnectionClosed:
+                    self.kws_link.lost()
+        if 'asr' in changed:
+            self.words_asr = words.asr
+            for session in (self.asr, self.asr_standby):
+                if session is not None and not session.closed:
+                    try:
+                        await session.update_hotwords(words.asr)
+                    except websockets.ConnectionClosed:
+                        pass  # noticed by its receiver (or on promotion), and reconnected with the new list
+        if 'nlu' in changed:
+            self.words_nlu = words.nlu
+            self.discard_speculation()
+            await self.init_model_nlu()
+        self.metrics.event('words_updated', changed=sorted(changed))
+        self.log(f"Updated word lists: {', '.join(sorted(changed))}")
+
+    async def start_up(self, since):
+        """
+        Connect and initialize KWS, ASR and NLU concurrently; the supervisors replay the
+        connections after a drop.
+
+        Args:
+            since (float): Monotonic time startup began, for the `ready` phase.
+        """
+        await asyncio.gather(self.kws_link.start(), self.asr_link.start(), self.init_model_nlu())
+        self.startup_phase('ready', since)
+        self.metrics.set('startup_seconds', self.startup['ready'] / 1000)
+        self.metrics.event('startup', **{f"{phase}_ms": ms for phase, ms in self.startup.items()})
+        self.log(f"Ready in {self.startup['ready']:.0f} ms: {self.startup}")
+
+    async def match_command(self, text):
+        """
+        Match recognized text against the command list.
+
+        The local matcher answers first; the NLU server is only asked when the local
+        score is below `nlu_threshold`.
+
+        Returns:
+            dict: `code`/`best_match`/`score` result, as returned by `/match_sentence`.
+        """
+        start = time.monotonic()
+        result = self.matcher.match(text)
+        self.metrics.observe('nlu_local_seconds', time.monotonic() - start)
+        if result['code'] == 0 and result['score'] >= self.nlu_threshold:
+            self.metrics.inc('nlu_local_total')
+            return result
+        self.metrics.inc('nlu_remote_total')
+        start = time.monotonic()
+        try:
+            result = await self.nlu.match_sentence(text)
+        except request_errors() as e:
+            self.metrics.inc('nlu_errors_total')
+            return {'code': 1, 'message': repr(e)}
+        self.metrics.observe('nlu_rtt_seconds', time.monotonic() - start)
+        return result
+
+    def speculate(self, text):
+        """
+        Match the partial `text` in place of an older speculation, with the local matcher
+        or from the NLU cache only: partials never go to the NLU server nor into its cache.
+        """
+        key = normalize(text)
+        if not key or (self.speculation and self.speculation[0] == key):
+            return
+        result = self.matcher.match(text)
+        if result['code'] != 0 or result['score'] < self.nlu_threshold:
+            result = self.nlu.cache.peek(text) if self.nlu.cache is not None else None
+        self.speculation = (key, result)
+        self.metrics.inc('nlu_speculative_total')
+
+    def discard_speculation(self):
+        self.speculation = None
+
+    def speculated_match(self, text):
+        """
+        The speculative match if it was made on the same text as the final `text` and
+        matched a command, else None (and the speculation is discarded).
+        """
+        speculation, self.speculation = self.speculation, None
+        if speculation is None:
+            return None
+        key, result = speculation
+        if key == normalize(text) and result is not None and result.get('code') == 0:
+            self.metrics.inc('nlu_speculative_hits_total')
+            return result
+        return None
 
     async def receiver_kws(self):
         """Receive KWS results and transition to ASR state upon successful keyword detection."""
         try:
+            await self.kws_link.wait()
             while True:
-                response = json.loads(await self.ws_session_kws.recv())
+                ws = self.ws_session_kws
+                try:
+                    response = json.loads(await ws.recv())
+                except websockets.ConnectionClosed as e:
+                    self.log(f"Connection closed with error: {e}")
+                    if ws is self.ws_session_kws:  # not already replaced by a reconnect
+                        self.kws_link.lost()
+                    await self.kws_link.wait()
+                    continue
+                if response.get('remote') == 'init':
+                    # Reply to `update_words` initializing the new keywords
+                    self.log(f"Updated KWS keywords: {response}")
+                    continue
                 if response['code'] == 0:
+                    self.wake_count += 1
                     self.assistant = response['message']
-                    print(f"\n[{self.assistant}]: 我在")
+                    self.log(f"\n[{self.assistant}]: 我在")
+                    self.trace = {'kws_sent': self.kws_sent_at} if self.kws_sent_at is not None else {}
+                    wake = self.mark('wake')
+                    self.metrics.inc('wakes_total')
+                    if self.kws_sent_at is not None:
+                        # From sending the window that completed the wake word to its detection
+                        self.metrics.observe('wake_latency_seconds', wake - self.kws_sent_at)
+                    self.metrics.event('wake', keyword=self.assistant)
+                    self.command_done.clear()
                     self.state = 'asr'
                     
 
         except websockets.ConnectionClosedError as e:
-            print(f"Connection closed with error: {e}")
+            self.log(f"Connection closed with error: {e}")
         except Exception as e:
-            print(f"Unexpected error: {e}")
+            self.log(f"Unexpected error: {e}")
 
 
     async def receiver_asr(self):
         """Receive ASR results, process text, and interact with NLU for command matching."""
         try:
-            text_online = ""
+            await self.asr_link.wait()
             text_offline = ""
             while True:
-                response = json.loads(await self.ws_session_asr.recv())
+                session = self.asr
+                try:
+                    response = await session.recv()
+                except websockets.ConnectionClosed as e:
+                    self.log(f"Connection closed with error: {e}")
+                    if session is self.asr:  # not already replaced by a reconnect
+                        self.asr_link.lost()
+                    await self.asr_link.wait()
+                    self.transcript.discard()
+                    self.discard_speculation()
+                    continue
                 if response['mode'] == '2pass-online':
-                    text_online += response['text']
-                    print(f'\r[我]：{text_online}', end="")
+                    if session.discarding:
+                        continue  # partial of a cancelled (barged-in) utterance
+                    trace, keyword = self.result_utterance()
+                    if 'first_partial' not in trace:
+                        self.mark('first_partial', trace)
+                        self.observe_between('first_partial_latency_seconds', 'speech_start', 'first_partial', trace)
+                    # Only the new text is printed, not the whole line again
+                    first = not self.transcript.partial
+                    _, text = self.transcript.add_partial(response['text'])
+                    self.log(f'\r[我]：{text}' if first else text, end="", prefix=first)
+                    if self.speculative_nlu:
+                        self.speculate(self.transcript.partial)
 
                 if response['mode'] == '2pass-offline':
+                    if session.final_received():
+                        self.transcript.discard()
+                        self.discard_speculation()
+                        continue
+                    # Results come in utterance order: with barge-in a newer utterance may
+                    # already be in progress while this one's result arrives
+                    trace, keyword = self.awaiting.popleft() if self.awaiting else (self.trace, self.assistant)
                     if len(response['stamp_sents']) > 1:
                         text_offline = response['text'][1:]
                     else:
                         text_offline = response['text']
                     text_offline = text_offline.replace(" ", "")
-                    print(f'\r[我]：{text_offline}')
-
-                    # NLU API call for sentence matching
-                    url = f'{self.uri_nlu}/match_sentence'
-                    payload = {'source_sentence': text_offline}
-                    headers = {'Content-Type': 'application/json'}
-                    response = requests.post(url, data=json.dumps(payload), headers=headers)
-                    if response.status_code == 200:
-                        result = response.json()
-                        print(f"[{self.assistant}]: 匹配命令: <{result['best_match']}>, 得分：{result['score']}")
+                    self.transcript.add_final(text_offline, response['stamp_sents'])
+                    self.log(f'\r[我]：{text_offline}')
+                    self.mark('final', trace)
+                    # From our end-of-speech (VAD) to the final result; when the server
+                    # endpointed the utterance itself its end is only known as the final
+                    self.observe_between('final_latency_seconds', 'speech_end', 'final', trace)
+                    self.mark('speech_end', trace)
+
+                    # NLU sentence matching, local first with the server as fallback, unless
+                    # the partial text was already matched and the final confirms it
+                    result = self.speculated_match(text_offline)
+                    if result is None and not text_offline:
+                        result = {'code': 1, 'message': 'no text recognized'}  # e.g. a result a backend lost
+                    elif result is None:
+                        result = await self.match_command(text_offline)
+                    self.mark('matched', trace)
+                    if result.get('code') == 0:
+                        self.log(f"[{keyword}]: 匹配命令: <{result['best_match']}>, 得分：{result['score']}")
+                        self.metrics.inc('commands_total')
+                        self.observe_between('response_latency_seconds', 'speech_end', 'matched', trace)
                     else:
-                        print(f"{self.assistant}]: Failed to match sentence: {response.json()}")
-                        
-                    self.state = 'kws'
-                    text_online = ""
+                        self.log(f"[{keyword}]: Failed to match sentence: {result}")
+                        self.metrics.inc('match_failures_total')
+                    self.end_trace(text_offline, result, trace, keyword)
+
+                    if trace is self.trace:  # not superseded by a new wake-up meanwhile
+                        self.state = 'kws'
+                    if not self.awaiting:
+                        self.command_done.set()
                     text_offline = ""
 
 
         except websockets.ConnectionClosedError as e:
-            print(f"Connection closed with error: {e}")
+            self.log(f"Connection closed with error: {e}")
         except Exception as e:
-            print(f"Unexpected error: {e}")
+            self.log(f"Unexpected error: {e}")
 
-    async def run(self):
-        """Main run loop for handling recording, sending audio streams, and managing states."""
+    async def end_utterance(self):
+        """
+        Tell ASR the utterance is over, so it finalizes now instead of waiting for silence.
 
-        # Initialize WebSocket connections
-        await self.init_websocket_kws()
-        await self.init_websocket_asr()
+        Returns:
+            bool: True if sent, False if the connection was lost.
+        """
+        try:
+            await self.asr.stop_utterance()
+        except websockets.ConnectionClosed:
+            self.asr_link.lost()
+            return False
+        return True
 
-        # Initialize models
-        await self.init_model_kws()
-        await self.init_model_asr()
-        await self.init_model_nlu()
+    async def cancel_utterance(self):
+        """
+        Cancel the utterance in progress on ASR (barge-in); its results will be ignored.
 
-        chunk_size_unit = 320
-        chunk_size_kws = 1600
-        chunk_size_asr = 960
-        kws_times = chunk_size_kws // chunk_size_unit
-        asr_times = chunk_size_asr // chunk_size_unit
-        kws_queue = queue.Queue()
-        asr_queue = queue.Queue()
+        Returns:
+            bool: True unless the connection was lost.
+        """
+        try:
+            await self.asr.cancel_utterance()
+        except websockets.ConnectionClosed:
+            self.asr_link.lost()
+            return False
+        return True
+
+    def end_speech(self, end):
+        """The command ended at ring position `end`: queue it for its result and end it on ASR once sent."""
+        self.mark('speech_end')
+        self.awaiting.append((self.trace, self.assistant))
+        self.command_done.clear()
+        self.asr_uplink.stop_at(end, self.end_utterance)
+
+    async def finish_command(self, asr_phase, end):
+        """
+        At the end of the audio source, let a command in progress be recognized and matched.
 
+        Args:
+            asr_phase (str): Phase of the ASR stream in `run` when the audio ended.
+            end (int): Ring position of the end of the audio.
+        """
+        if asr_phase == 'speech' and self.state == 'asr':
+            self.end_speech(end)
+        if self.awaiting:
+            await self.wait_command()
+
+    async def wait_command(self):
+        """Wait for the results of the utterances sent to ASR; give them up after `final_timeout` seconds."""
+        try:
+            await asyncio.wait_for(self.command_done.wait(), self.final_timeout)
+        except asyncio.TimeoutError:
+            self.expire_results(0.0)
+
+    def expire_results(self, timeout):
+        """Resolve the utterances ended over `timeout` seconds ago whose final result is still missing as empty."""
+        now = time.monotonic()
+        expired = False
+        while self.awaiting and now - self.awaiting[0][0].get('speech_end', now) >= timeout:
+            trace, keyword = self.awaiting.popleft()
+            if self.asr:
+                self.asr.expire_utterance()
+            self.log(f"\n[{keyword}]: 指令未完成")
+            self.metrics.inc('final_timeouts_total')
+            self.end_trace("", {'code': 1, 'message': 'final result lost'}, trace, keyword)
+            if trace is self.trace:  # not superseded by a new wake-up meanwhile
+                self.transcript.discard()
+                self.discard_speculation()
+                self.state = 'kws'
+            expired = True
+        if expired and not self.awaiting:
+            self.command_done.set()
+
+    async def run(self):
+        """Main run loop for handling recording, sending audio streams, and managing states."""
+        boot = time.monotonic()
+        chunk_size_unit = 320
+        pcm = PcmRingBuffer(capacity=self.audio_buffer_samples)
+        kws_reader = pcm.reader(self.kws_chunk)
+        asr_reader = pcm.reader(self.asr_chunk)
+        asr_phase = 'idle'
+        utterance_start = 0
+        wake_position = 0  # ring position of the wake-up that opened the current utterance
+        utterance_wake = 0  # `wake_count` of the wake-up that opened the current utterance
+
+        # Audio leaves through one sender task per link, so a slow link never stalls capture
+        async def send_kws_window(window):
+            if self.audio_thread and self.kws_transport_active != 'binary':
+                data = await self.audio_thread.call(kws_transport.encode_listen, window, self.sample_rate,
+                                                    self.kws_transport_active)
+            else:
+                data = kws_transport.encode_listen(window, self.sample_rate, self.kws_transport_active)
+            return await self.send_kws_audio(data)
+
+        async def send_asr_window(window):
+            return await self.send_asr_audio(window.data.cast('B'))
+
+        uplink = dict(high_water=self.uplink_high_water, max_lag=self.uplink_max_lag, sample_rate=self.sample_rate)
+        # While disconnected the KWS reader stays put so the buffered audio is caught up after
+        # the reconnect and no wake word is lost; a new ASR session has not heard the
+        # utterance, so it is replayed from the start
+        self.kws_uplink = UplinkSender('kws', kws_reader, send_kws_window, self.kws_link,
+                                       lambda: self.ws_session_kws, on_failure=kws_reader.rewind,
+                                       max_coalesce=self.kws_coalesce, metrics=self.kws_metrics, **uplink)
+        self.asr_uplink = UplinkSender('asr', asr_reader, send_asr_window, self.asr_link,
+                                       lambda: self.asr.ws if self.asr else None,
+                                       on_failure=lambda sent: asr_reader.seek(utterance_start),
+                                       max_coalesce=self.asr_coalesce, metrics=self.asr_metrics, **uplink)
+
+        metrics_runner = None
+        # Connections and models come up concurrently while the capture already fills the
+        # ring: the uplinks wait for their link, then catch up on what was said meanwhile
+        startup_task = asyncio.create_task(self.start_up(boot))
         try:
-            # Start receiver tasks for KWS and ASR
+            # Start receiver tasks for KWS and ASR; they wait for their connection
             receive_task_kws = asyncio.create_task(self.receiver_kws())
             receive_task_asr = asyncio.create_task(self.receiver_asr())
+            self.kws_uplink.start()
+            self.asr_uplink.start()
+            if self.owns_metrics:
+                self.watchdog = runtime.LoopWatchdog(self.metrics, log=self.log)
+                self.watchdog.start()
+                if self.metrics_port:
+                    metrics_runner = await self.metrics.serve(port=self.metrics_port)
 
             # Start recording audio and sending it to the appropriate model
-            with sd.InputStream(channels=1, dtype="int16", samplerate=self.sample_rate) as stream:
-                print("Recording... Press Ctrl+C to stop.")
+            self.capture = self.source or AudioCapture(sample_rate=self.sample_rate, blocksize=chunk_size_unit)
+            async with self.capture:
+                self.startup_phase('capture_start', boot)
+                self.log("Recording... Press Ctrl+C to stop.")
+                if not self.capture.paced:
+                    # Faster than real time the ring would overrun before the servers are up
+                    await startup_task
                 while True:
-                    samples, _ = stream.read(chunk_size_unit)  # Blocking read
-                    samples = samples.flatten().tolist()
-
-                    # KWS Stream 1600 points
+                    frame = await self.capture.read()  # Filled by the audio callback
+                    if frame is None:
+                        await self.finish_command(asr_phase, pcm.written)
+                        break
+                    pcm.write(frame)
+                    # A final result that never comes must not keep the assistant from the wake word
+                    self.expire_results(self.final_timeout)
+
+                    # KWS stream, in `kws_chunk` windows; with barge-in it goes on during
+                    # ASR, both readers sharing the one ring
                     if self.state == 'kws':
-                        kws_queue.put(samples)
-                        if kws_queue.qsize() >= kws_times:
-                            kws_data = []
-                            for _ in range(kws_times):
-                                kws_data.extend(kws_queue.get())
-                            data = {
-                                "remote": 'listen',
-                                "samples": kws_data,
-                                "sample_rate": self.sample_rate
-                            }
-                            await self.ws_session_kws.send(json.dumps(data))
-
-                    # ASR Stream 960 points
-                    if self.state == 'asr':
-                        asr_queue.put(samples)
-                        if asr_queue.qsize() >= asr_times:
-                            asr_data = []
-                            for _ in range(asr_times):
-                                asr_data.extend(asr_queue.get())
-                            asr_data = np.array(asr_data, dtype='int16').tobytes()
-                            await self.ws_session_asr.send(asr_data)
-
-                    await asyncio.sleep(0.001)
+                        asr_reader.skip()
+                    if self.state == 'kws' or self.barge_in:
+                        if not self.kws_uplink.enabled:
+                            self.kws_uplink.enable()
+                        self.kws_uplink.notify()
+                    elif self.kws_uplink.enabled:
+                        self.kws_uplink.enable(False)
+
+                    # ASR stream, in `asr_chunk` windows gated by the VAD
+                    if self.state != 'asr':
+                        if asr_phase != 'idle':
+                            self.asr_uplink.enable(False)
+                        asr_phase = 'idle'
+                    else:
+                        if not self.barge_in:
+                            kws_reader.skip()
+                        elif asr_phase != 'idle' and self.wake_count != utterance_wake:
+                            # Barge-in: a new wake word restarts the command. An utterance still
+                            # being spoken is cancelled (after what was sent of it); an ended one
+                            # keeps its pending result, so commands can follow back to back
+                            if asr_phase == 'speech':
+                                self.asr_uplink.stop_at(asr_reader.position, self.cancel_utterance)
+                                self.metrics.inc('barge_ins_total')
+                                self.metrics.event('barge_in', keyword=self.assistant)
+                            asr_phase = 'idle'
+                        event = None
+                        if asr_phase == 'idle':
+                            # Just woke up: look back into the ring so speech overlapping the wake
+                            # word is not lost. The VAD only hears what comes after the wake-up, or
+                            # the tail of the wake word would count as the command
+                            utterance_wake = self.wake_count
+                            wake_position = pcm.written - len(frame)
+                            utterance_start = max(pcm.oldest(), wake_position - self.wake_lookback_samples)
+                            if self.vad:
+                                self.vad.reset()
+                                event = self.vad.update(frame)
+                                asr_phase = 'listening'
+                            else:
+                                asr_phase = 'speech'
+                                self.asr_uplink.start_at(utterance_start)
+                        elif self.vad:
+                            event = self.vad.update(frame)
+
+                        if asr_phase == 'listening':
+                            # Drop leading silence, keeping the pre-roll in the ring; speech going
+                            # on from the wake-up also keeps the look-back before it
+                            if event == 'start':
+                                speech_start = pcm.written - self.vad.preroll_samples - self.vad.min_speech_frames * chunk_size_unit
+                                if speech_start > wake_position:
+                                    utterance_start = speech_start
+                                utterance_start = max(pcm.oldest(), utterance_start)
+                                asr_phase = 'speech'
+                                self.asr_uplink.start_at(utterance_start)
+                            elif event == 'timeout':
+                                self.log(f"\n[{self.assistant}]: 没有听到指令")
+                                self.metrics.inc('no_command_total')
+                                self.metrics.event('timeout', keyword=self.assistant)
+                                self.state = 'kws'
+
+                        if asr_phase == 'speech':
+                            self.asr_uplink.notify()
+                            if event == 'end':
+                                # Speech ended: let the server finalize now instead of streaming
+                                # silence, once the audio up to here is sent
+                                self.end_speech(pcm.written)
+                                asr_phase = 'done'
+                        if asr_phase == 'done' and not self.capture.paced:
+                            # Replaying faster than real time: the audio after the command is
+                            # of no use until its result is in, so do not run ahead of the servers
+                            await self.wait_command()
 
         except KeyboardInterrupt:
-            print("Recording stopped.")
+            self.log("Recording stopped.")
         except Exception as e:
-            print(f"An error occurred: {e}")
+            self.log(f"An error occurred: {e}")
         finally:
+            startup_task.cancel()
+            self.kws_link.stop()
+            self.asr_link.stop()
             receive_task_kws.cancel()
             receive_task_asr.cancel()
+            self.kws_uplink.stop()
+            self.asr_uplink.stop()
+            self.discard_speculation()
+            if self.capture:
+                self.log(f"Capture stats: {self.capture.stats()}")
+            if self.owns_nlu and self.nlu.cache is not None:
+                self.log(f"NLU cache stats: {self.nlu.cache.stats()}")
+            self.log(f"Connection stats: kws {self.kws_link.stats()}, asr {self.asr_link.stats()}")
+            self.log(f"Uplink stats: kws {self.kws_uplink.stats()}, asr {self.asr_uplink.stats()}")
+            self.log(f"Latency stats: {self.latency_stats()}")
             await self.close_websockets()
+            self.metrics.remove_collector(self.collect_metrics)
+            if self.owns_nlu:
+                await self.nlu.close()
+            if self.owns_audio_thread:
+                self.audio_thread.close()
+            if self.owns_metrics:
+                if self.watchdog:
+                    self.watchdog.stop()
+                if metrics_runner:
+                    await metrics_runner.cleanup()
+                self.metrics.event('metrics', **self.metrics.snapshot())
+                self.metrics.close()
 
 
 if __name__ == "__main__":
     """Main entry point to load configurations and run the Speech Assistant."""
 
-    # Load keyword list for KWS
-    with open('words_kws.txt', 'rt', encoding='utf-8') as f:
-        words_kws = f.readlines()
-        words_kws = [line.strip() for line in words_kws]
-
-    # Load hotword list and weights for ASR
-    with open('words_asr.txt', 'rt', encoding='utf-8') as f:
-        words_asr = f.readlines()
-        words_asr = [line.strip() for line in words_asr]
-        words_asr_dct = {}
-        for line in words_asr:
-            word, weight = line.split()
-            words_asr_dct[word] = int(weight)
-
-    # Load sentences for NLU comparison
-    with open('words_nlu.txt', 'rt', encoding='utf-8') as f:
-        words_nlu = f.readlines()
-        words_nlu = [line.strip() for line in words_nlu]
+    # Keywords for KWS, hotwords and weights for ASR and the NLU commands, from
+    # words_kws.txt, words_asr.txt and words_nlu.txt; edits are applied while running
+    watcher = config.ConfigWatcher()
 
     # Instantiate and run the Speech Assistant
-    host = '47.96.15.141'
-    # host = 'www.funsound.cn'
-    assistant = Speech_Assistant(uri_kws=f"ws://{host}:10094",
-                                 uri_asr=f"wss://{host}:10095",
-                                 uri_nlu=f"http://{host}:10096",
-                                 words_kws=words_kws,
-                                 words_asr=words_asr_dct,
-                                 words_nlu=words_nlu)
-    asyncio.get_event_loop().run_until_complete(assistant.run())
+    # An optional WAV/PCM file or directory argument is replayed instead of the microphone,
+    # which is captured in its own rate and channels and converted by the audio front-end
+    source = open_source(sys.argv[1]) if len(sys.argv) > 1 else audio_frontend.open_device()
+    assistant = Speech_Assistant(**config.server_uris(),
+                                 **watcher.words.kwargs(),
+                                 source=source)
+    watcher.subscribe(assistant.update_words)
+
+    async def main():
+        async with watcher:
+            await assistant.run()
+
+    runtime.run(main(), loop=config.event_loop())
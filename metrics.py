@@ -0,0 +1,233 @@
+import bisect
+import json
+import time
+
+# Latency buckets in seconds, Prometheus-style upper bounds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Size buckets in bytes, for send queue depths
+SIZE_BUCKETS = (0, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram with bounded memory, exportable as a Prometheus histogram.
+
+    Quantiles are estimated by linear interpolation inside the bucket that holds them.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS) -> None:
+        """
+        Initializes an empty histogram.
+
+        Args:
+            buckets (tuple): Sorted bucket upper bounds; larger values go to the +Inf bucket.
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Estimated `q` quantile (0..1), or None if nothing was observed."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = min(self.buckets[index], self.max) if index < len(self.buckets) else self.max
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+        }
+
+
+class _Registry:
+    """Storage shared by a `Metrics` object and its labelled views."""
+
+    def __init__(self, jsonl) -> None:
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.collectors = []
+        self.sink = open(jsonl, 'a', encoding='utf-8') if jsonl else None
+
+
+class Metrics:
+    """
+    Counters, gauges and histograms for the assistant pipeline, plus a JSON lines event log.
+
+    Every series is keyed by name and labels. `labelled` returns a view that shares the
+    storage and adds labels (e.g. one view per hub session), so one `prometheus` export or
+    `snapshot` covers every session. Collectors registered with `add_collector` refresh
+    gauges from live objects (connections, capture) right before an export.
+    """
+
+    def __init__(self, jsonl=None, labels=None, registry=None) -> None:
+        """
+        Initializes the metrics.
+
+        Args:
+            jsonl (str): File to append JSON lines events to, None to not log events.
+            labels (dict): Labels applied to every series and event of this view.
+            registry (_Registry): Storage to share, used by `labelled`.
+        """
+        self.labels = labels or {}
+        self.registry = registry or _Registry(jsonl)
+        self._label_key = tuple(sorted(self.labels.items()))
+
+    def labelled(self, **labels):
+        """Return a view sharing this storage with additional labels."""
+        return Metrics(labels=dict(self.labels, **labels), registry=self.registry)
+
+    def inc(self, name, value=1):
+        key = (name, self._label_key)
+        counters = self.registry.counters
+        counters[key] = counters.get(key, 0) + value
+
+    def set(self, name, value):
+        self.registry.gauges[(name, self._label_key)] = value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS):
+        key = (name, self._label_key)
+        histogram = self.registry.histograms.get(key)
+        if histogram is None:
+            histogram = self.registry.histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    def value(self, name):
+        """Current value of a counter or gauge of this view (0 if never set)."""
+        key = (name, self._label_key)
+        return self.registry.counters.get(key, self.registry.gauges.get(key, 0))
+
+    def histogram(self, name):
+        """Histogram of this view, or None if nothing was observed."""
+        return self.registry.histograms.get((name, self._label_key))
+
+    def event(self, name, **fields):
+        """Append one JSON line (wall and monotonic time, labels, `fields`) to the event log."""
+        sink = self.registry.sink
+        if sink is None:
+            return
+        record = {'time': round(time.time(), 6), 'mono': round(time.monotonic(), 6), 'event': name}
+        record.update(self.labels)
+        record.update(fields)
+        sink.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def add_collector(self, collector):
+        """Register a callable that updates gauges before each `snapshot` / `prometheus` export."""
+        self.registry.collectors.append(collector)
+
+    def remove_collector(self, collector):
+        """Unregister a collector, e.g. when the session it reads from ends."""
+        if collector in self.registry.collectors:
+            self.registry.collectors.remove(collector)
+
+    def remove_labels(self, **labels):
+        """Drop every series carrying all of `labels`, e.g. those of a hub session that ended."""
+        wanted = set(labels.items())
+        for store in (self.registry.counters, self.registry.gauges, self.registry.histograms):
+            for key in [key for key in store if wanted <= set(key[1])]:
+                del store[key]
+
+    def collect(self):
+        for collector in self.registry.collectors:
+            collector()
+
+    def snapshot(self):
+        """
+        All series as a JSON-serializable dict.
+
+        Returns:
+            dict: {'counters'|'gauges'|'histograms': [{'name', 'labels', 'value'}, ...]}
+        """
+        self.collect()
+        registry = self.registry
+
+        def series(store, convert=lambda value: value):
+            return [{'name': name, 'labels': dict(labels), 'value': convert(value)}
+                    for (name, labels), value in sorted(store.items())]
+        return {
+            'counters': series(registry.counters),
+            'gauges': series(registry.gauges),
+            'histograms': series(registry.histograms, Histogram.snapshot),
+        }
+
+    def prometheus(self, prefix='speech_assistant_'):
+        """Export all series in the Prometheus text exposition format."""
+        self.collect()
+        registry = self.registry
+        lines = []
+
+        def labels_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}' if pairs else ''
+
+        for kind, store in (('counter', registry.counters), ('gauge', registry.gauges)):
+            declared = set()
+            for (name, labels), value in sorted(store.items()):
+                if name not in declared:
+                    lines.append(f"# TYPE {prefix}{name} {kind}")
+                    declared.add(name)
+                lines.append(f"{prefix}{name}{labels_text(labels)} {value}")
+        declared = set()
+        for (name, labels), histogram in sorted(registry.histograms.items()):
+            if name not in declared:
+                lines.append(f"# TYPE {prefix}{name} histogram")
+                declared.add(name)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                cumulative += count
+                lines.append(f"{prefix}{name}_bucket{labels_text(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{prefix}{name}_sum{labels_text(labels)} {histogram.sum}")
+            lines.append(f"{prefix}{name}_count{labels_text(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    async def serve(self, host='0.0.0.0', port=9108):
+        """
+        Serve `prometheus` on http://host:port/metrics.
+
+        Returns:
+            aiohttp.web.AppRunner: Call `cleanup()` on it to stop serving.
+        """
+        from aiohttp import web
+
+        async def handle(request):
+            return web.Response(text=self.prometheus(), content_type='text/plain')
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+    def close(self):
+        """Flush and close the event log."""
+        if self.registry.sink:
+            self.registry.sink.close()
+            self.registry.sink = None
+
+
+def write_buffer_size(ws):
+    """Bytes queued in a WebSocket's transport, i.e. written but not yet sent."""
+    transport = getattr(ws, 'transport', None)
+    return transport.get_write_buffer_size() if transport is not None else 0
@@ -0,0 +1,14 @@
+"""
+Local stand-ins for the KWS/ASR/NLU services and the iFlytek RTASR service, for offline
+benchmarks of the clients.
+
+Each server takes `latency`, `jitter` and `drop_rate` (and, for the WebSocket services,
+`disconnect_rate`) to emulate network conditions; `python -m mock_servers` runs them all.
+"""
+from mock_servers.kws import KwsServer, wake_tone
+from mock_servers.nlu import NluServer
+from mock_servers.asr import AsrServer
+from mock_servers.rtasr import RtasrServer
+from mock_servers.tls import self_signed_context
+from mock_servers.faults import Faults
+from mock_servers.threaded import serve_in_thread
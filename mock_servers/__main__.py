@@ -0,0 +1,68 @@
+"""
+Run the KWS, ASR and NLU stand-ins (and the RTASR one) together on their usual ports, e.g.:
+
+    python -m mock_servers --latency 40 --jitter 20 --drop-rate 0.01
+    FUNSOUND_HOST=127.0.0.1 python main.py
+    IFLYTEK_URL=ws://127.0.0.1:10098/v1/ws python iflytek_asr.py recording.wav
+
+Latency and jitter are in milliseconds and apply to every result; `--drop-rate` loses
+results (resets NLU requests) and `--disconnect-rate` aborts connections, per message.
+"""
+import argparse
+import asyncio
+
+from mock_servers import AsrServer, KwsServer, NluServer, RtasrServer, self_signed_context
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog='python -m mock_servers', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1', help='interface to bind')
+    parser.add_argument('--kws-port', type=int, default=10094)
+    parser.add_argument('--asr-port', type=int, default=10095)
+    parser.add_argument('--nlu-port', type=int, default=10096)
+    parser.add_argument('--rtasr-port', type=int, default=10098)
+    parser.add_argument('--no-tls', action='store_true', help='serve ASR over ws:// instead of wss://')
+    parser.add_argument('--latency', type=float, default=0.0, help='ms added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='max random ms added on top of the latency')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='probability that a response is lost')
+    parser.add_argument('--disconnect-rate', type=float, default=0.0,
+                        help='probability per received message that a KWS/ASR connection is aborted')
+    parser.add_argument('--seed', type=int, default=None, help='random seed of the fault model')
+    parser.add_argument('--transcripts', nargs='+', default=['打开相机', '关闭蓝牙'],
+                        help='texts the ASR stand-in returns for successive utterances')
+    parser.add_argument('--codecs', nargs='+', default=None,
+                        help='ASR uplink codecs accepted (default: all available, see audio_codec)')
+    parser.add_argument('--stats-interval', type=float, default=0.0, help='print counters every N seconds')
+    return parser.parse_args()
+
+
+async def main(args):
+    faults = dict(latency=args.latency / 1000, jitter=args.jitter / 1000, drop_rate=args.drop_rate, seed=args.seed)
+    kws = KwsServer(args.host, args.kws_port, disconnect_rate=args.disconnect_rate, **faults)
+    asr = AsrServer(args.host, args.asr_port, transcripts=args.transcripts,
+                    ssl_context=None if args.no_tls else self_signed_context(), codecs=args.codecs,
+                    disconnect_rate=args.disconnect_rate, **faults)
+    nlu = NluServer(args.host, args.nlu_port, **faults)
+    rtasr = RtasrServer(args.host, args.rtasr_port, transcripts=args.transcripts,
+                        disconnect_rate=args.disconnect_rate, **faults)
+    async with kws, asr, nlu, rtasr:
+        print(f"KWS stand-in listening on {kws.uri}")
+        print(f"ASR stand-in listening on {asr.uri}")
+        print(f"NLU stand-in listening on {nlu.uri}")
+        print(f"RTASR stand-in listening on {rtasr.uri}")
+        while True:
+            await asyncio.sleep(args.stats_interval or 3600)
+            if args.stats_interval:
+                print(f"kws: windows {kws.windows_received} detections {kws.detections} "
+                      f"dropped {kws.faults.dropped} disconnects {kws.faults.disconnects} | "
+                      f"asr: connections {asr.connections} finals {asr.finals} "
+                      f"dropped {asr.faults.dropped} disconnects {asr.faults.disconnects} | "
+                      f"nlu: requests {nlu.requests} dropped {nlu.faults.dropped}")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main(parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,223 @@
+import asyncio
+import json
+import numpy as np
+import websockets
+
+import audio_codec
+from mock_servers.faults import DelayedSender, Faults
+from vad import EnergyVad
+
+
+class AsrServer:
+    """
+    Stand-in for the FunASR-style 2pass ASR WebSocket service.
+
+    Speech cannot be recognized here, so each utterance is "recognized" as the next
+    entry of `transcripts`: while audio arrives, `2pass-online` partials reveal the text a
+    few characters at a time, and the utterance is finalized with a `2pass-offline`
+    result (with `stamp_sents`) when the client sends `is_speaking: false` or, like the
+    real server, when its own endpoint detection sees enough trailing silence.
+
+    A configuration offering `codecs` is answered with the first one of `codecs` it
+    decodes, and the audio of the connection is decoded with it.
+    """
+
+    def __init__(self,
+                 host='127.0.0.1',
+                 port=10095,
+                 transcripts=('打开相机',),
+                 ssl_context=None,
+                 init_delay=0.0,
+                 partial_interval=0.6,
+                 chars_per_partial=2,
+                 endpoint_silence=0.8,
+                 sample_rate=16000,
+                 codecs=None,
+                 latency=0.0,
+                 jitter=0.0,
+                 drop_rate=0.0,
+                 disconnect_rate=0.0,
+                 seed=None) -> None:
+        """
+        Initializes the stand-in server.
+
+        Args:
+            host (str): Interface to bind.
+            port (int): Port to bind, 0 for an ephemeral port.
+            transcripts (tuple): Texts returned for successive utterances (cycled).
+            ssl_context (ssl.SSLContext): Server context to serve `wss://`, None for `ws://`.
+            init_delay (float): Seconds of simulated model initialization per configuration.
+            partial_interval (float): Seconds of speech audio between online partials.
+            chars_per_partial (int): Characters revealed by each online partial.
+            endpoint_silence (float): Seconds of trailing silence that end an utterance.
+            sample_rate (int): Sampling rate of the incoming PCM.
+            codecs (list): Uplink codecs accepted, None for all of `audio_codec.available()`.
+            latency (float): Seconds added to every recognition result.
+            jitter (float): Maximum random seconds added on top of `latency`.
+            drop_rate (float): Probability that a recognition result is lost.
+            disconnect_rate (float): Probability per received message that the connection is aborted.
+            seed (int): Random seed of the fault model.
+        """
+        self.host = host
+        self.port = port
+        self.transcripts = list(transcripts)
+        self.ssl_context = ssl_context
+        self.init_delay = init_delay
+        self.partial_interval = partial_interval
+        self.chars_per_partial = chars_per_partial
+        self.endpoint_silence = endpoint_silence
+        self.sample_rate = sample_rate
+        self.codecs = audio_codec.available() if codecs is None else list(codecs)
+        self.connections = 0
+        self.configurations = 0
+        self.hotword_updates = 0  # hotwords replaced on an open connection
+        self.utterances = 0
+        self.finals = 0  # non-empty 2pass-offline results sent
+        self.lose_finals = 0  # non-empty 2pass-offline results still to lose (fault injection)
+        self.bytes_received = 0
+        self.faults = Faults(latency, jitter, drop_rate, disconnect_rate, seed)
+        self.active = {}  # open connections, oldest first
+        self.server = None
+
+    @property
+    def uri(self):
+        scheme = 'wss' if self.ssl_context else 'ws'
+        return f"{scheme}://{self.host}:{self.port}"
+
+    def next_transcript(self):
+        text = self.transcripts[self.utterances % len(self.transcripts)]
+        self.utterances += 1
+        return text
+
+    async def handler(self, ws):
+        """Serve one client connection."""
+        self.active[ws] = None
+        sender = DelayedSender(ws, self.faults)
+        try:
+            await self._serve(ws, sender)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            sender.close()
+            self.active.pop(ws, None)
+
+    async def _serve(self, ws, sender):
+        self.connections += 1
+        config = {}
+        vad = EnergyVad(sample_rate=self.sample_rate, hangover=self.endpoint_silence, timeout=None)
+        utterance = None  # {'text', 'revealed', 'samples', 'speech', 'start'} while one is open
+        position = 0      # samples received on this connection
+        pending = np.zeros(0, dtype=np.int16)  # received samples short of a VAD frame
+        decoder = audio_codec.decoder('pcm')
+
+        async def finalize():
+            nonlocal utterance
+            if utterance is None:
+                return
+            text = utterance['text'] if utterance['speech'] else ''
+            if text and self.lose_finals:
+                self.lose_finals -= 1
+                utterance = None
+                vad.reset()
+                return
+            self.finals += bool(text)
+            start_ms = 1000 * utterance['start'] // self.sample_rate
+            end_ms = 1000 * position // self.sample_rate
+            step = (end_ms - start_ms) // max(1, len(text))
+            await sender.send(json.dumps({
+                'mode': '2pass-offline',
+                'text': text,
+                'wav_name': config.get('wav_name', 'microphone'),
+                'is_final': True,
+                'stamp_sents': [{
+                    'text_seg': ' '.join(text),
+                    'punc': '',
+                    'start': start_ms,
+                    'end': end_ms,
+                    'ts_list': [[start_ms + i * step, start_ms + (i + 1) * step] for i in range(len(text))],
+                }] if text else [],
+            }, ensure_ascii=False))
+            utterance = None
+            vad.reset()
+
+        async for message in ws:
+            if self.faults.disconnect():
+                ws.transport.abort()
+                return
+            if isinstance(message, str):
+                request = json.loads(message)
+                if 'mode' in request:
+                    config.update(request)
+                    self.configurations += 1
+                    if 'codecs' in request:
+                        codec = next((c for c in request['codecs'] if c in self.codecs), 'pcm')
+                        decoder = audio_codec.decoder(codec, self.sample_rate)
+                        await ws.send(json.dumps({'mode': 'config', 'codec': codec}))
+                    if self.init_delay:
+                        await asyncio.sleep(self.init_delay)
+                elif 'hotwords' in request:
+                    config['hotwords'] = request['hotwords']
+                    self.hotword_updates += 1
+                if request.get('is_speaking') is False:
+                    await finalize()
+                continue
+
+            self.bytes_received += len(message)
+            # The endpointing runs per VAD frame, so it does not depend on how the client
+            # chunks (or coalesces) its audio
+            pending = np.concatenate((pending, decoder.decode(message)))
+            while len(pending) >= vad.frame_size:
+                samples, pending = pending[:vad.frame_size], pending[vad.frame_size:]
+                position += len(samples)
+                if utterance is None:
+                    utterance = {'text': None, 'revealed': 0, 'samples': 0, 'speech': False,
+                                 'start': position - len(samples)}
+                event = vad.update(samples)
+                if event == 'start':
+                    utterance['speech'] = True
+                    utterance['text'] = self.next_transcript()
+                if not utterance['speech']:
+                    continue
+
+                utterance['samples'] += len(samples)
+                text = utterance['text']
+                if utterance['samples'] >= self.partial_interval * self.sample_rate and utterance['revealed'] < len(text):
+                    utterance['samples'] = 0
+                    piece = text[utterance['revealed']:utterance['revealed'] + self.chars_per_partial]
+                    utterance['revealed'] += len(piece)
+                    await sender.send(json.dumps({'mode': '2pass-online', 'text': piece,
+                                              'wav_name': config.get('wav_name', 'microphone'),
+                                              'is_final': False}, ensure_ascii=False))
+                if event == 'end':
+                    await finalize()
+
+    def drop_connections(self, limit=None):
+        """Abort open client connections (the `limit` oldest, or all), as a network failure would."""
+        for ws in list(self.active)[:limit]:
+            ws.transport.abort()
+
+    async def start(self):
+        """Start listening; resolves the actual port when 0 was requested."""
+        self.server = await websockets.serve(self.handler, self.host, self.port,
+                                             ssl=self.ssl_context, subprotocols=["binary"])
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+
+if __name__ == "__main__":
+    async def main():
+        async with AsrServer(host='0.0.0.0') as server:
+            print(f"ASR stand-in listening on {server.uri}")
+            await asyncio.Future()
+
+    asyncio.run(main())
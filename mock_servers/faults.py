@@ -0,0 +1,104 @@
+import asyncio
+import random
+import time
+import websockets
+
+
+class Faults:
+    """
+    Artificial network conditions for a stand-in server.
+
+    Every response is delayed by `latency` plus up to `jitter` seconds, is lost with
+    probability `drop_rate`, and each received message aborts the connection with
+    probability `disconnect_rate`, as a flaky network or an overloaded server would.
+    """
+
+    def __init__(self,
+                 latency=0.0,
+                 jitter=0.0,
+                 drop_rate=0.0,
+                 disconnect_rate=0.0,
+                 seed=None) -> None:
+        """
+        Initializes the fault model.
+
+        Args:
+            latency (float): Seconds added to every response.
+            jitter (float): Maximum random seconds added on top of `latency`.
+            drop_rate (float): Probability that a response is silently lost.
+            disconnect_rate (float): Probability per received message that the connection is aborted.
+            seed (int): Random seed, for reproducible runs.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.disconnect_rate = disconnect_rate
+        self.random = random.Random(seed)
+        self.dropped = 0
+        self.disconnects = 0
+
+    def delay(self):
+        """Seconds to hold the next response back."""
+        return self.latency + self.random.uniform(0, self.jitter) if self.jitter else self.latency
+
+    def drop(self):
+        """Decide whether to lose the next response."""
+        if self.drop_rate and self.random.random() < self.drop_rate:
+            self.dropped += 1
+            return True
+        return False
+
+    def disconnect(self):
+        """Decide whether to abort the connection on the message just received."""
+        if self.disconnect_rate and self.random.random() < self.disconnect_rate:
+            self.disconnects += 1
+            return True
+        return False
+
+
+class DelayedSender:
+    """
+    Sends WebSocket responses after the `Faults` delay without holding up the handler,
+    like a server that keeps decoding while its results are in flight. Responses
+    stay in order: each one leaves no earlier than the one before it.
+    """
+
+    def __init__(self, ws, faults) -> None:
+        self.ws = ws
+        self.faults = faults
+        self._queue = asyncio.Queue()
+        self._pending = 0  # queued or being sent by `_run`
+        self._last = 0.0
+        self._task = asyncio.create_task(self._run())
+
+    async def send(self, message):
+        """Queue `message`, or send it right away when there is no delay to apply."""
+        if self.faults.drop():
+            return
+        delay = self.faults.delay()
+        if not delay and not self._pending:
+            await self.ws.send(message)
+            return
+        self._last = max(self._last, time.monotonic() + delay)
+        self._pending += 1
+        self._queue.put_nowait((self._last, message))
+
+    async def _run(self):
+        try:
+            while True:
+                due, message = await self._queue.get()
+                wait = due - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                await self.ws.send(message)
+                self._pending -= 1
+                self._queue.task_done()
+        except websockets.ConnectionClosed:
+            pass
+
+    async def flush(self):
+        """Wait until the queued responses are sent, e.g. before closing the connection."""
+        await self._queue.join()
+
+    def close(self):
+        self._task.cancel()
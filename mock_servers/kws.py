@@ -0,0 +1,167 @@
+import asyncio
+import json
+import numpy as np
+import websockets
+
+from kws_transport import TRANSPORTS, decode_samples
+from mock_servers.faults import DelayedSender, Faults
+
+
+def wake_tone_hz(index):
+    """Frequency of the synthetic tone that stands in for keyword `index`."""
+    return 1000 + 250 * index
+
+
+def wake_tone(index, seconds=0.5, sample_rate=16000, amplitude=8000):
+    """Synthesize the int16 tone the stand-in server detects as keyword `index`."""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return (amplitude * np.sin(2 * np.pi * wake_tone_hz(index) * t)).astype(np.int16)
+
+
+class KwsServer:
+    """
+    Stand-in for the KWS WebSocket service.
+
+    Implements the `init`/`deinit`/`listen` protocol with transport negotiation. Real
+    keyword models are replaced by tone detection: keyword `i` of the init word list is
+    "spoken" when a window is dominated by a `wake_tone_hz(i)` sine (see `wake_tone`).
+    """
+
+    def __init__(self,
+                 host='127.0.0.1',
+                 port=10094,
+                 transports=TRANSPORTS,
+                 threshold=0.5,
+                 refractory=1.0,
+                 latency=0.0,
+                 jitter=0.0,
+                 drop_rate=0.0,
+                 disconnect_rate=0.0,
+                 seed=None) -> None:
+        """
+        Initializes the stand-in server.
+
+        Args:
+            host (str): Interface to bind.
+            port (int): Port to bind, 0 for an ephemeral port.
+            transports (tuple): Transports this server accepts, in preference order.
+            threshold (float): Fraction of window energy the tone must hold to trigger.
+            refractory (float): Seconds of audio ignored after a detection.
+            latency (float): Seconds added to every detection result.
+            jitter (float): Maximum random seconds added on top of `latency`.
+            drop_rate (float): Probability that a detection result is lost.
+            disconnect_rate (float): Probability per received message that the connection is aborted.
+            seed (int): Random seed of the fault model.
+        """
+        self.host = host
+        self.port = port
+        self.transports = tuple(transports)
+        self.threshold = threshold
+        self.refractory = refractory
+        self.bytes_received = 0
+        self.windows_received = 0
+        self.detections = 0
+        self.faults = Faults(latency, jitter, drop_rate, disconnect_rate, seed)
+        self.active = {}  # open connections, oldest first
+        self.server = None
+
+    @property
+    def uri(self):
+        return f"ws://{self.host}:{self.port}"
+
+    def detect(self, samples, sample_rate, words):
+        """Return the index of the keyword whose tone dominates `samples`, or None."""
+        spectrum = np.abs(np.fft.rfft(samples.astype(np.float32))) ** 2
+        total = spectrum.sum()
+        if total <= 0:
+            return None
+        bin_hz = sample_rate / len(samples)
+        for index in range(len(words)):
+            centre = int(round(wake_tone_hz(index) / bin_hz))
+            if spectrum[max(0, centre - 2):centre + 3].sum() / total >= self.threshold:
+                return index
+        return None
+
+    async def handler(self, ws):
+        """Serve one client connection."""
+        self.active[ws] = None
+        sender = DelayedSender(ws, self.faults)
+        try:
+            await self._serve(ws, sender)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            sender.close()
+            self.active.pop(ws, None)
+
+    async def _serve(self, ws, sender):
+        words = []
+        sample_rate = 16000
+        cooldown = 0
+        async for message in ws:
+            self.bytes_received += len(message)
+            if self.faults.disconnect():
+                ws.transport.abort()
+                return
+            if isinstance(message, bytes):
+                if 'binary' not in self.transports:
+                    await ws.send(json.dumps({'code': 1, 'message': 'binary transport not supported', 'remote': 'listen'}))
+                    continue
+                samples, rate = np.frombuffer(message, dtype=np.int16), sample_rate
+            else:
+                request = json.loads(message)
+                if request['remote'] == 'init':
+                    words = request['words']
+                    sample_rate = request.get('sample_rate', sample_rate)
+                    offered = request.get('transports', ['json'])
+                    transport = next((t for t in offered if t in self.transports), 'json')
+                    response = {'code': 0, 'message': '/'.join(words), 'remote': 'init'}
+                    if 'transports' in request:
+                        response['transport'] = transport
+                    await ws.send(json.dumps(response))
+                    continue
+                if request['remote'] == 'deinit':
+                    words = []
+                    await ws.send(json.dumps({'code': 0, 'message': 'Deinitialization successful', 'remote': 'deinit'}))
+                    continue
+                samples, rate = decode_samples(request), request.get('sample_rate', sample_rate)
+
+            self.windows_received += 1
+            if cooldown > 0:
+                cooldown -= len(samples)
+                continue
+            index = self.detect(samples, rate, words)
+            if index is not None:
+                self.detections += 1
+                cooldown = int(self.refractory * rate)
+                await sender.send(json.dumps({'code': 0, 'message': words[index], 'remote': 'listen'}))
+
+    def drop_connections(self, limit=None):
+        """Abort open client connections (the `limit` oldest, or all), as a network failure would."""
+        for ws in list(self.active)[:limit]:
+            ws.transport.abort()
+
+    async def start(self):
+        """Start listening; resolves the actual port when 0 was requested."""
+        self.server = await websockets.serve(self.handler, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+
+if __name__ == "__main__":
+    async def main():
+        async with KwsServer(host='0.0.0.0') as server:
+            print(f"KWS stand-in listening on {server.uri}")
+            await asyncio.Future()
+
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+import asyncio
+import difflib
+from aiohttp import web
+
+from mock_servers.faults import Faults
+
+
+class NluServer:
+    """
+    Stand-in for the NLU HTTP service (`/upload_words` and `/match_sentence`).
+
+    Sentences are scored with `difflib.SequenceMatcher`; an artificial delay can be
+    added to every request to emulate a remote round trip, and a fraction of the
+    requests can have their connection reset instead of being answered.
+    """
+
+    def __init__(self,
+                 host='127.0.0.1',
+                 port=10096,
+                 latency=0.0,
+                 jitter=0.0,
+                 drop_rate=0.0,
+                 seed=None) -> None:
+        """
+        Initializes the stand-in server.
+
+        Args:
+            host (str): Interface to bind.
+            port (int): Port to bind, 0 for an ephemeral port.
+            latency (float): Seconds added to every request.
+            jitter (float): Maximum random seconds added on top of `latency`.
+            drop_rate (float): Probability that a request's connection is reset instead of answered.
+            seed (int): Random seed of the fault model.
+        """
+        self.host = host
+        self.port = port
+        self.faults = Faults(latency, jitter, drop_rate, seed=seed)
+        self.sentences = []
+        self.requests = 0
+        self.peers = set()  # client (host, port) pairs seen, i.e. distinct TCP connections
+        self._runner = None
+
+    @property
+    def uri(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def _delay(self, request):
+        self.requests += 1
+        self.peers.add(request.transport.get_extra_info('peername'))
+        delay = self.faults.delay()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.faults.drop():
+            request.transport.abort()
+            raise asyncio.CancelledError
+
+    async def upload_words(self, request):
+        await self._delay(request)
+        payload = await request.json()
+        if 'sentences_to_compare' not in payload:
+            return web.json_response({'code': 1, 'message': 'sentences_to_compare not provided'}, status=400)
+        self.sentences = list(payload['sentences_to_compare'])
+        return web.json_response({'code': 0, 'message': 'Word list updated successfully'})
+
+    async def match_sentence(self, request):
+        await self._delay(request)
+        payload = await request.json()
+        if not self.sentences:
+            return web.json_response({'code': 1, 'message': 'Word list is empty. Please upload words first.'}, status=400)
+        if 'source_sentence' not in payload:
+            return web.json_response({'code': 1, 'message': 'source_sentence not provided'}, status=400)
+        source = payload['source_sentence']
+        scores = [difflib.SequenceMatcher(None, source, s).ratio() for s in self.sentences]
+        best = max(range(len(scores)), key=scores.__getitem__)
+        return web.json_response({'code': 0, 'best_match': self.sentences[best], 'score': round(scores[best], 4)})
+
+    async def start(self):
+        """Start serving; resolves the actual port when 0 was requested."""
+        app = web.Application()
+        app.router.add_post('/upload_words', self.upload_words)
+        app.router.add_post('/match_sentence', self.match_sentence)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        return self
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+
+if __name__ == "__main__":
+    async def main():
+        async with NluServer(host='0.0.0.0') as server:
+            print(f"NLU stand-in listening on {server.uri}")
+            await asyncio.Future()
+
+    asyncio.run(main())
@@ -0,0 +1,236 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import time
+import uuid
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+import websockets
+
+from mock_servers.faults import DelayedSender, Faults
+from vad import EnergyVad
+
+
+def signature(app_id, api_key, ts):
+    """RTASR `signa`: base64(HMAC-SHA1(api_key, md5(app_id + ts)))."""
+    base = hashlib.md5((app_id + ts).encode('utf-8')).hexdigest().encode('utf-8')
+    return base64.b64encode(hmac.new(api_key.encode('utf-8'), base, hashlib.sha1).digest()).decode('utf-8')
+
+
+class RtasrServer:
+    """
+    Stand-in for the iFlytek real-time ASR (RTASR) WebSocket service.
+
+    The handshake URL is checked like the real service does (`appid`, a `ts` within
+    `max_skew` seconds and its `signa`) and answered with a `started` or an `error`
+    message. Binary audio is endpointed with a VAD; each utterance is "recognized" as
+    the next entry of `transcripts`, revealed by intermediate results (`type` 1) and
+    fixed by a final one (`type` 0), one word per character, with speaker roles (`rl`)
+    alternating between `speakers` speakers. `{"end": true}` finalizes and closes, and
+    a connection that streamed `session_limit` seconds of audio is closed by the server.
+    """
+
+    def __init__(self,
+                 host='127.0.0.1',
+                 port=10098,
+                 transcripts=('打开相机',),
+                 app_id=None,
+                 api_key=None,
+                 max_skew=300.0,
+                 speakers=2,
+                 partial_interval=0.4,
+                 endpoint_silence=0.6,
+                 session_limit=None,
+                 sample_rate=16000,
+                 latency=0.0,
+                 jitter=0.0,
+                 drop_rate=0.0,
+                 disconnect_rate=0.0,
+                 seed=None) -> None:
+        """
+        Initializes the stand-in server.
+
+        Args:
+            host (str): Interface to bind.
+            port (int): Port to bind, 0 for an ephemeral port.
+            transcripts (tuple): Texts returned for successive utterances (cycled).
+            app_id (str): Accepted `appid`, None to accept any without checking `signa`.
+            api_key (str): Key the `signa` is checked against.
+            max_skew (float): Seconds a handshake `ts` may be off from the server clock.
+            speakers (int): Speakers the utterances are attributed to in turn.
+            partial_interval (float): Seconds of speech audio between intermediate results.
+            endpoint_silence (float): Seconds of trailing silence that end an utterance.
+            session_limit (float): Seconds of audio after which a connection is closed, None for no limit.
+            sample_rate (int): Sampling rate of the incoming PCM.
+            latency (float): Seconds added to every result.
+            jitter (float): Maximum random seconds added on top of `latency`.
+            drop_rate (float): Probability that a result is lost.
+            disconnect_rate (float): Probability per received message that the connection is aborted.
+            seed (int): Random seed of the fault model.
+        """
+        self.host = host
+        self.port = port
+        self.transcripts = list(transcripts)
+        self.app_id = app_id
+        self.api_key = api_key
+        self.max_skew = max_skew
+        self.speakers = speakers
+        self.partial_interval = partial_interval
+        self.endpoint_silence = endpoint_silence
+        self.session_limit = session_limit
+        self.sample_rate = sample_rate
+        self.connections = 0
+        self.rejected = 0
+        self.expired = 0   # connections closed at `session_limit`
+        self.utterances = 0
+        self.finals = 0
+        self.bytes_received = 0
+        self.faults = Faults(latency, jitter, drop_rate, disconnect_rate, seed)
+        self.active = {}  # open connections, oldest first
+        self.server = None
+
+    @property
+    def uri(self):
+        return f"ws://{self.host}:{self.port}/v1/ws"
+
+    def authenticate(self, path):
+        """Error description for the handshake URL `path`, or None if it is accepted."""
+        query = {key: values[0] for key, values in parse_qs(urlsplit(path).query).items()}
+        if self.app_id is None:
+            return None
+        if query.get('appid') != self.app_id:
+            return 'invalid appid'
+        try:
+            skew = abs(time.time() - int(query.get('ts', '')))
+        except ValueError:
+            return 'invalid ts'
+        if skew > self.max_skew:
+            return 'ts expired'
+        if query.get('signa') != signature(self.app_id, self.api_key, query['ts']):
+            return 'invalid signa'
+        return None
+
+    async def handler(self, ws):
+        """Serve one client connection."""
+        sid = uuid.uuid4().hex[:16]
+        error = self.authenticate(ws.request.path)
+        if error:
+            self.rejected += 1
+            await ws.send(json.dumps({'action': 'error', 'code': '10110', 'data': '', 'desc': error, 'sid': sid}))
+            await ws.close()
+            return
+        self.active[ws] = None
+        sender = DelayedSender(ws, self.faults)
+        try:
+            await ws.send(json.dumps({'action': 'started', 'code': '0', 'data': '', 'desc': 'success', 'sid': sid}))
+            await self._serve(ws, sender, sid)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            sender.close()
+            self.active.pop(ws, None)
+
+    def result(self, sid, seg_id, text, speaker, start, end, final):
+        words = [{'cw': [{'w': char, 'wp': 'n', 'rl': str(speaker) if i == 0 else '0'}],
+                  'wb': i * 10, 'we': (i + 1) * 10} for i, char in enumerate(text)]
+        data = {'seg_id': seg_id, 'ls': False,
+                'cn': {'st': {'bg': str(start), 'ed': str(end if final else 0), 'type': '0' if final else '1',
+                              'rt': [{'ws': words}]}}}
+        return json.dumps({'action': 'result', 'code': '0', 'desc': 'success', 'sid': sid,
+                           'data': json.dumps(data, ensure_ascii=False)}, ensure_ascii=False)
+
+    async def _serve(self, ws, sender, sid):
+        self.connections += 1
+        vad = EnergyVad(sample_rate=self.sample_rate, hangover=self.endpoint_silence, timeout=None)
+        utterance = None  # {'text', 'speaker', 'revealed', 'samples', 'start'} while one is spoken
+        seg_id = 0
+        position = 0      # samples received on this connection
+        pending = np.zeros(0, dtype=np.int16)
+
+        async def finalize():
+            nonlocal utterance, seg_id
+            if utterance is None:
+                return
+            end_ms = 1000 * position // self.sample_rate
+            await sender.send(self.result(sid, seg_id, utterance['text'], utterance['speaker'],
+                                          utterance['start'], end_ms, True))
+            self.finals += 1
+            seg_id += 1
+            utterance = None
+            vad.reset()
+
+        async for message in ws:
+            if self.faults.disconnect():
+                ws.transport.abort()
+                return
+            if isinstance(message, str):
+                if json.loads(message).get('end'):
+                    await finalize()
+                    await sender.flush()
+                    await ws.close()
+                    return
+                continue
+
+            self.bytes_received += len(message)
+            pending = np.concatenate((pending, np.frombuffer(message, dtype=np.int16)))
+            while len(pending) >= vad.frame_size:
+                samples, pending = pending[:vad.frame_size], pending[vad.frame_size:]
+                position += len(samples)
+                event = vad.update(samples)
+                if event == 'start':
+                    text = self.transcripts[self.utterances % len(self.transcripts)]
+                    speaker = 1 + self.utterances % self.speakers
+                    self.utterances += 1
+                    start_ms = 1000 * max(0, position - vad.preroll_samples) // self.sample_rate
+                    utterance = {'text': text, 'speaker': speaker, 'revealed': 0, 'samples': 0, 'start': start_ms}
+                if utterance is None:
+                    continue
+                utterance['samples'] += len(samples)
+                if utterance['samples'] >= self.partial_interval * self.sample_rate and \
+                        utterance['revealed'] < len(utterance['text']):
+                    utterance['samples'] = 0
+                    utterance['revealed'] += 1
+                    await sender.send(self.result(sid, seg_id, utterance['text'][:utterance['revealed']],
+                                                  utterance['speaker'], utterance['start'], 0, False))
+                if event == 'end':
+                    await finalize()
+            if self.session_limit and position >= self.session_limit * self.sample_rate:
+                await finalize()
+                await sender.flush()
+                self.expired += 1
+                await ws.send(json.dumps({'action': 'error', 'code': '10800', 'data': '',
+                                          'desc': 'session time limit reached', 'sid': sid}))
+                await ws.close()
+                return
+
+    def drop_connections(self, limit=None):
+        """Abort open client connections (the `limit` oldest, or all), as a network failure would."""
+        for ws in list(self.active)[:limit]:
+            ws.transport.abort()
+
+    async def start(self):
+        """Start listening; resolves the actual port when 0 was requested."""
+        self.server = await websockets.serve(self.handler, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+
+if __name__ == "__main__":
+    async def main():
+        async with RtasrServer(host='0.0.0.0') as server:
+            print(f"RTASR stand-in listening on {server.uri}")
+            await asyncio.Future()
+
+    asyncio.run(main())
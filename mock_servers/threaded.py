@@ -0,0 +1,30 @@
+import asyncio
+import threading
+
+
+def serve_in_thread(*servers):
+    """
+    Run stand-in servers on their own event loop in a daemon thread.
+
+    Keeps their work off the client's loop, so blocking client calls can be answered
+    and the client's own CPU time and loop stalls can be measured separately.
+
+    Returns:
+        asyncio.AbstractEventLoop: The servers' loop.
+    """
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    async def start():
+        for server in servers:
+            await server.start()
+
+    def target():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(start())
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=target, daemon=True).start()
+    started.wait()
+    return loop
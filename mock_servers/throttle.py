@@ -0,0 +1,117 @@
+import asyncio
+import socket
+import time
+
+
+class ThrottledProxy:
+    """
+    TCP proxy in front of a stand-in server that emulates a slow uplink.
+
+    Client-to-server bytes are forwarded at most at `bandwidth` bytes per second, after
+    `delay` seconds, and the proxy reads no more than its small receive buffer ahead, so
+    the congestion backs up into the client's socket as it would on a real slow link.
+    Server-to-client bytes are forwarded as they come. `stall` holds the uplink back for a
+    while, like a radio link fading out.
+    """
+
+    def __init__(self,
+                 target_host,
+                 target_port,
+                 bandwidth=24000,
+                 delay=0.0,
+                 host='127.0.0.1',
+                 port=0,
+                 receive_buffer=4096) -> None:
+        """
+        Initializes the proxy.
+
+        Args:
+            target_host (str): Host of the proxied server.
+            target_port (int): Port of the proxied server.
+            bandwidth (float): Uplink bytes per second, None for unlimited.
+            delay (float): Seconds added to the uplink, like a long path.
+            host (str): Interface to bind.
+            port (int): Port to bind, 0 for an ephemeral port.
+            receive_buffer (int): Kernel receive buffer of the accepted sockets, in bytes.
+        """
+        self.target_host = target_host
+        self.target_port = target_port
+        self.bandwidth = bandwidth
+        self.delay = delay
+        self.host = host
+        self.port = port
+        self.receive_buffer = receive_buffer
+        self.bytes_forwarded = 0
+        self.stalled_until = 0.0
+        self.server = None
+
+    def uri(self, scheme):
+        return f"{scheme}://{self.host}:{self.port}"
+
+    def stall(self, seconds):
+        """Forward nothing upstream for the next `seconds` (may be called from another thread)."""
+        self.stalled_until = time.monotonic() + seconds
+
+    async def _uplink(self, reader, writer):
+        due = time.monotonic()
+        try:
+            while data := await reader.read(1024):
+                while (stalled := self.stalled_until - time.monotonic()) > 0:
+                    await asyncio.sleep(stalled)
+                if self.bandwidth:
+                    due = max(due, time.monotonic()) + len(data) / self.bandwidth
+                    await asyncio.sleep(due - time.monotonic() + self.delay)
+                elif self.delay:
+                    await asyncio.sleep(self.delay)
+                writer.write(data)
+                self.bytes_forwarded += len(data)
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+
+    async def _downlink(self, reader, writer):
+        try:
+            while data := await reader.read(65536):
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+
+    async def handler(self, client_reader, client_writer):
+        try:
+            server_reader, server_writer = await asyncio.open_connection(self.target_host, self.target_port)
+        except OSError:
+            client_writer.close()
+            return
+        tasks = [asyncio.create_task(self._uplink(client_reader, server_writer)),
+                 asyncio.create_task(self._downlink(server_reader, client_writer))]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            client_writer.close()
+            server_writer.close()
+
+    async def start(self):
+        """Start listening; resolves the actual port when 0 was requested."""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.receive_buffer)  # inherited when accepted
+        # An Ethernet-sized MSS: against loopback's 64 kB one, a receive window this small
+        # is never worth a window update and the client falls back to zero-window probing
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_MAXSEG, 1400)
+        sock.bind((self.host, self.port))
+        self.server = await asyncio.start_server(self.handler, sock=sock, limit=self.receive_buffer)
+        self.port = sock.getsockname()[1]
+        return self
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
@@ -0,0 +1,25 @@
+import os
+import ssl
+import subprocess
+import tempfile
+
+_context = None
+
+
+def self_signed_context():
+    """
+    Server SSL context with a throwaway self-signed certificate, for `wss://` stand-ins.
+
+    The certificate is generated once per process with the `openssl` command line tool.
+    """
+    global _context
+    if _context is None:
+        directory = tempfile.mkdtemp(prefix='mock_servers_tls_')
+        cert = os.path.join(directory, 'cert.pem')
+        key = os.path.join(directory, 'key.pem')
+        subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                        '-subj', '/CN=localhost', '-keyout', key, '-out', cert],
+                       check=True, capture_output=True)
+        _context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        _context.load_cert_chain(cert, key)
+    return _context
@@ -0,0 +1,195 @@
+import asyncio
+import collections
+import time
+from nlu_matcher import normalize
+
+aiohttp = None  # the heaviest import of the client, deferred to the first request (or `NluClient.preload`)
+
+
+def _import_aiohttp():
+    global aiohttp
+    if aiohttp is None:
+        import aiohttp as module
+        aiohttp = module
+    return aiohttp
+
+
+def request_errors():
+    """Exceptions a failed NLU request raises, for `except request_errors():`."""
+    return (_import_aiohttp().ClientError, asyncio.TimeoutError)
+
+
+class MatchCache:
+    """
+    Bounded LRU cache of `/match_sentence` results with a time-to-live.
+
+    Keys are normalized sentences, so repeated commands that differ only in spacing or
+    punctuation share an entry.
+    """
+
+    def __init__(self, max_size=256, ttl=3600.0) -> None:
+        """
+        Initializes the cache.
+
+        Args:
+            max_size (int): Maximum number of cached sentences.
+            ttl (float): Seconds an entry stays valid, None for no expiry.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, sentence):
+        """Return the cached result for `sentence`, or None."""
+        key = normalize(sentence)
+        entry = self.entries.get(key)
+        if entry is None or (self.ttl is not None and time.monotonic() - entry[0] > self.ttl):
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def peek(self, sentence):
+        """Return the cached result for `sentence`, or None, without counting or refreshing it."""
+        entry = self.entries.get(normalize(sentence))
+        if entry is None or (self.ttl is not None and time.monotonic() - entry[0] > self.ttl):
+            return None
+        return entry[1]
+
+    def put(self, sentence, result):
+        """Store the result for `sentence`, evicting the least recently used entry if full."""
+        key = normalize(sentence)
+        self.entries[key] = (time.monotonic(), result)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Drop every entry, e.g. after the command list changed."""
+        self.entries.clear()
+
+    def stats(self):
+        """Return the cache counters."""
+        return {
+            'size': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+class NluClient:
+    """
+    Asyncio client for the NLU HTTP service.
+
+    One `aiohttp.ClientSession` is kept for the lifetime of the client so requests reuse
+    keep-alive connections from a bounded pool, and a semaphore caps how many requests
+    are in flight at once. Successful matches are answered from a `MatchCache`, which
+    is cleared whenever a new word list is uploaded.
+    """
+
+    def __init__(self,
+                 uri_nlu="http://0.0.0.0:10096",
+                 timeout=5.0,
+                 max_connections=4,
+                 max_concurrency=4,
+                 cache_size=256,
+                 cache_ttl=3600.0) -> None:
+        """
+        Initializes the NLU client.
+
+        Args:
+            uri_nlu (str): Base URL of the NLU HTTP server.
+            timeout (float): Total timeout in seconds for one request.
+            max_connections (int): Size of the keep-alive connection pool.
+            max_concurrency (int): Maximum number of concurrent requests.
+            cache_size (int): Maximum number of cached match results, 0 to disable caching.
+            cache_ttl (float): Seconds a cached match result stays valid.
+        """
+        self.uri_nlu = uri_nlu
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.cache = MatchCache(cache_size, cache_ttl) if cache_size else None
+        self._generation = 0  # bumped before and after every upload so in-flight matches are not cached
+        self._session = None
+        self._semaphore = None
+
+    async def preload(self):
+        """Import aiohttp on a worker thread ahead of the first request, overlapping other startup work."""
+        if aiohttp is None:
+            await asyncio.to_thread(_import_aiohttp)
+
+    def _ensure_session(self):
+        """Create the HTTP session lazily, inside the running event loop."""
+        if self._session is None or self._session.closed:
+            _import_aiohttp()
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def _post(self, path, payload):
+        """POST a JSON payload and return the decoded JSON response."""
+        session = self._ensure_session()
+        async with self._semaphore:
+            async with session.post(f'{self.uri_nlu}{path}', json=payload) as response:
+                return await response.json(content_type=None)
+
+    async def upload_words(self, sentences):
+        """
+        Upload the list of sentences to compare against.
+
+        Returns:
+            dict: Server response, `code` is 0 on success.
+        """
+        self._invalidate()
+        try:
+            return await self._post('/upload_words', {'sentences_to_compare': sentences})
+        finally:
+            # Matches answered while the upload was in flight may come from the old list
+            self._invalidate()
+
+    def _invalidate(self):
+        """Forget cached matches and keep those in flight out of the cache."""
+        self._generation += 1
+        if self.cache is not None:
+            self.cache.clear()
+
+    async def match_sentence(self, sentence):
+        """
+        Match a sentence against the uploaded list.
+
+        Returns:
+            dict: Server response with `best_match` and `score` when `code` is 0.
+        """
+        if self.cache is not None:
+            result = self.cache.get(sentence)
+            if result is not None:
+                return result
+        generation = self._generation
+        result = await self._post('/match_sentence', {'source_sentence': sentence})
+        if self.cache is not None and result.get('code') == 0 and generation == self._generation:
+            self.cache.put(sentence, result)
+        return result
+
+    async def close(self):
+        """Close the session and its pooled connections."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        self._ensure_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
@@ -0,0 +1,109 @@
+import re
+import numpy as np
+
+_PUNCTUATION = re.compile(r"[\s，。？！、,.?!;；:：\"'“”‘’]+")
+
+
+def normalize(text):
+    """Normalize a sentence for matching: drop whitespace/punctuation and lowercase."""
+    return _PUNCTUATION.sub("", text).lower()
+
+
+def ngrams(text, sizes=(1, 2)):
+    """Character n-grams of `text` for each size in `sizes`."""
+    return [text[i:i + n] for n in sizes for i in range(len(text) - n + 1)]
+
+
+class LocalMatcher:
+    """
+    In-process NLU sentence matcher over a small, fixed command list.
+
+    The index is built once from the command list: an L2-normalized character n-gram
+    matrix (for cosine similarity) and a padded code-point matrix (for a Levenshtein
+    distance computed against every command at once). `match` returns the same
+    `code`/`best_match`/`score` shape as the NLU server's `/match_sentence`.
+    """
+
+    def __init__(self, sentences, ngram_sizes=(1, 2), edit_weight=0.5) -> None:
+        """
+        Builds the matcher index.
+
+        Args:
+            sentences (list): Command sentences to match against.
+            ngram_sizes (tuple): Character n-gram sizes used for the cosine feature.
+            edit_weight (float): Weight of the edit-distance similarity in the score (0..1).
+        """
+        self.sentences = list(sentences)
+        self.ngram_sizes = ngram_sizes
+        self.edit_weight = edit_weight
+        normalized = [normalize(s) for s in self.sentences]
+
+        vocab = {}
+        for text in normalized:
+            for gram in ngrams(text, ngram_sizes):
+                vocab.setdefault(gram, len(vocab))
+        self.vocab = vocab
+        self.vectors = np.zeros((len(normalized), len(vocab)), dtype=np.float32)
+        for row, text in enumerate(normalized):
+            for gram in ngrams(text, ngram_sizes):
+                self.vectors[row, vocab[gram]] += 1
+        norms = np.linalg.norm(self.vectors, axis=1, keepdims=True)
+        self.vectors /= np.where(norms > 0, norms, 1)
+
+        self.lengths = np.array([len(text) for text in normalized], dtype=np.int32)
+        width = int(self.lengths.max()) if len(normalized) else 0
+        self.codes = np.full((len(normalized), width), -1, dtype=np.int32)
+        for row, text in enumerate(normalized):
+            self.codes[row, :len(text)] = [ord(c) for c in text]
+        self._columns = np.arange(width + 1, dtype=np.int32)
+
+    def cosine(self, text):
+        """Cosine similarity of `text` to every command, from character n-gram counts."""
+        query = np.zeros(len(self.vocab), dtype=np.float32)
+        for gram in ngrams(text, self.ngram_sizes):
+            index = self.vocab.get(gram)
+            if index is not None:
+                query[index] += 1
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return np.zeros(len(self.sentences), dtype=np.float32)
+        return self.vectors @ (query / norm)
+
+    def edit_distance(self, text):
+        """
+        Levenshtein distance from `text` to every command.
+
+        Rows of the dynamic program are computed for all commands at once; the
+        insertion recurrence along a row is resolved with a running minimum.
+        """
+        columns = self._columns
+        previous = np.broadcast_to(columns, (len(self.sentences), len(columns))).copy()
+        for i, char in enumerate(text, start=1):
+            cost = (self.codes != ord(char)).astype(np.int32)
+            current = np.empty_like(previous)
+            current[:, 0] = i
+            np.minimum(previous[:, 1:] + 1, previous[:, :-1] + cost, out=current[:, 1:])
+            previous = np.minimum.accumulate(current - columns, axis=1) + columns
+        return previous[np.arange(len(self.sentences)), self.lengths]
+
+    def scores(self, text):
+        """Combined similarity of `text` to every command, in [0, 1]."""
+        text = normalize(text)
+        cosine = self.cosine(text)
+        longest = np.maximum(self.lengths, len(text))
+        edit = 1 - self.edit_distance(text) / np.where(longest > 0, longest, 1)
+        return (1 - self.edit_weight) * cosine + self.edit_weight * edit
+
+    def match(self, text):
+        """
+        Match a sentence against the command list.
+
+        Returns:
+            dict: `{'code': 0, 'best_match': str, 'score': float}`, or `code` 1 with a
+            `message` when the command list is empty.
+        """
+        if not self.sentences:
+            return {'code': 1, 'message': 'Word list is empty. Please upload words first.'}
+        scores = self.scores(text)
+        best = int(np.argmax(scores))
+        return {'code': 0, 'best_match': self.sentences[best], 'score': round(float(scores[best]), 4)}
@@ -0,0 +1,133 @@
+import numpy as np
+
+
+class PcmRingBuffer:
+    """
+    Preallocated int16 ring buffer for captured PCM.
+
+    Every sample is stored twice (at `i` and `i + capacity`), so any window of up to
+    `capacity` samples is a contiguous slice of the storage and can be handed out as a
+    NumPy view without copying, whatever its position in the ring.
+    """
+
+    def __init__(self, capacity=16000) -> None:
+        """
+        Initializes the ring buffer.
+
+        Args:
+            capacity (int): Number of most recent samples kept in the ring.
+        """
+        self.capacity = capacity
+        self.written = 0  # total samples written since creation
+        self._data = np.zeros(2 * capacity, dtype=np.int16)
+
+    def write(self, samples):
+        """Append a frame of int16 samples (at most `capacity` samples)."""
+        n = len(samples)
+        if n > self.capacity:
+            raise ValueError(f"frame of {n} samples exceeds ring capacity {self.capacity}")
+        cap = self.capacity
+        start = self.written % cap
+        first = min(n, cap - start)
+        self._data[start:start + first] = samples[:first]
+        self._data[start + cap:start + cap + first] = samples[:first]
+        if first < n:
+            rest = n - first
+            self._data[:rest] = samples[first:]
+            self._data[cap:cap + rest] = samples[first:]
+        self.written += n
+
+    def oldest(self):
+        """Absolute position of the oldest sample still held by the ring."""
+        return max(0, self.written - self.capacity)
+
+    def view(self, position, size):
+        """
+        Return a read-only view of `size` samples starting at absolute `position`.
+
+        The view stays valid until `capacity - size` further samples are written.
+        """
+        if position < self.oldest() or position + size > self.written:
+            raise IndexError(f"samples [{position}, {position + size}) are not in the ring")
+        start = position % self.capacity
+        window = self._data[start:start + size]
+        window.flags.writeable = False
+        return window
+
+    def reader(self, window):
+        """Create a cursor that hands out windows of `window` samples, starting at the live edge."""
+        return PcmReader(self, window)
+
+
+class PcmReader:
+    """
+    Independent read cursor over a `PcmRingBuffer` producing fixed-size windows.
+    """
+
+    def __init__(self, buffer, window) -> None:
+        """
+        Initializes the reader at the buffer's current write position.
+
+        Args:
+            buffer (PcmRingBuffer): Ring buffer to read from.
+            window (int): Number of samples per window.
+        """
+        if window > buffer.capacity:
+            raise ValueError(f"window of {window} samples exceeds ring capacity {buffer.capacity}")
+        self.buffer = buffer
+        self.window = window
+        self.position = buffer.written
+        self.lost = 0  # samples overwritten before this reader consumed them
+
+    def available(self):
+        """Number of unread samples."""
+        return self.buffer.written - self.position
+
+    def skip(self):
+        """Discard everything unread and move to the live edge."""
+        self.position = self.buffer.written
+
+    def rewind(self, samples):
+        """Move the cursor back by up to `samples`, limited to what the ring still holds."""
+        self.position = max(self.buffer.oldest(), self.position - samples)
+
+    def seek(self, position):
+        """Move the cursor to absolute sample `position`, limited to what the ring holds."""
+        self.position = min(self.buffer.written, max(self.buffer.oldest(), position))
+
+    def read(self):
+        """Return the next window as a view, or None if a full window is not buffered yet."""
+        return self.read_many(1)
+
+    def read_many(self, count):
+        """
+        Return up to `count` consecutive windows as one view (e.g. to coalesce a backlog
+        into a single message), or None if not even one full window is buffered.
+        """
+        self._catch_up()
+        count = min(count, self.available() // self.window, self.buffer.capacity // self.window)
+        if count < 1:
+            return None
+        window = self.buffer.view(self.position, count * self.window)
+        self.position += count * self.window
+        return window
+
+    def read_samples(self, size):
+        """
+        Return the next `size` samples as one view, fewer if fewer are buffered (e.g. the
+        tail of a stream that ends inside a window), or None if none are.
+        """
+        self._catch_up()
+        size = min(size, self.available())
+        if size < 1:
+            return None
+        samples = self.buffer.view(self.position, size)
+        self.position += size
+        return samples
+
+    def _catch_up(self):
+        """Skip what the ring overwrote before it was read."""
+        oldest = self.buffer.oldest()
+        if self.position < oldest:
+            self.lost += oldest - self.position
+            self.position = oldest
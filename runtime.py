@@ -0,0 +1,151 @@
+import asyncio
+import concurrent.futures
+import sys
+import threading
+import time
+import traceback
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+LOOPS = ('auto', 'asyncio', 'uvloop')
+
+
+def loop_factory(loop='auto'):
+    """
+    Event loop factory for `loop`: 'uvloop', 'asyncio', or 'auto' for uvloop when installed.
+
+    Returns:
+        callable: Creates a new event loop, or None for asyncio's default.
+    """
+    if loop not in LOOPS:
+        raise ValueError(f"unknown event loop: {loop}")
+    if loop == 'uvloop' and uvloop is None:
+        raise ValueError("the uvloop event loop needs the uvloop package")
+    if loop != 'asyncio' and uvloop is not None:
+        return uvloop.new_event_loop
+    return None
+
+
+def run(main, loop='auto'):
+    """Run the coroutine `main` to completion on a new event loop of the given kind (see `loop_factory`)."""
+    factory = loop_factory(loop)
+    if hasattr(asyncio, 'Runner'):
+        with asyncio.Runner(loop_factory=factory) as runner:
+            return runner.run(main)
+    # Python < 3.11 has no Runner: pick the loop through the policy instead
+    if factory is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return asyncio.run(main)
+
+
+class AudioThread:
+    """
+    Dedicated thread for the CPU-bound per-message audio work: encoding KWS windows
+    for the JSON transports and ASR audio for a codec.
+
+    Done on the event loop, that work delays every receiver and sender behind it; here
+    the loop only waits for the result. There is a single worker, so calls run in
+    order and a stateful encoder is never used by two threads at once. Pure-Python work
+    still holds the GIL, so for it the thread makes no measurable difference (see
+    `benchmarks/bench_runtime.py`); it pays off for encoders that release the GIL,
+    like opuslib through ctypes.
+    """
+
+    def __init__(self, name='audio') -> None:
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self.calls = 0
+
+    async def call(self, function, *args):
+        """Run `function(*args)` on the audio thread and return its result."""
+        self.calls += 1
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class LoopWatchdog:
+    """
+    Loop-lag monitor with a watchdog thread that names the code stalling the loop.
+
+    A heartbeat task observes how late a sleep of `interval` wakes up into
+    `loop_lag_seconds`; a lagging loop delays audio sending and receiving. A thread
+    checks the heartbeat and, when the loop has not come back for `threshold` seconds,
+    samples the loop thread's stack: the frame running at that moment is what starves
+    the receivers.
+    Once the loop is back, the stall is counted in `loop_stalls_total`, logged as a
+    `loop_stall` event with its duration and stack, and passed to `log`.
+    """
+
+    def __init__(self, metrics, interval=0.05, threshold=0.1, log=None, frames=4) -> None:
+        """
+        Initializes the watchdog; `start` it from the loop to watch.
+
+        Args:
+            metrics (Metrics): Metrics view for the lag histogram, stall counter and events.
+            interval (float): Seconds between heartbeats.
+            threshold (float): Seconds without a heartbeat that make a stall.
+            log (callable): Called with a one-line description of each stall, None to only record it.
+            frames (int): Innermost stack frames kept per stall.
+        """
+        self.metrics = metrics
+        self.interval = interval
+        self.threshold = threshold
+        self.log = log
+        self.frames = frames
+        self.stalls = 0
+        self.worst = 0.0
+        self._beat = None
+        self._loop_thread = None
+        self._stall = None  # (time the stall was seen, stack) while the loop is stalled
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self._beat = time.monotonic()
+        self._loop_thread = threading.get_ident()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+
+    async def _heartbeat(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self._beat = now = time.monotonic()
+            self.metrics.observe('loop_lag_seconds', max(0.0, now - start - self.interval))
+            if self._stall is not None:
+                self._report(now)
+
+    def _watch(self):
+        while not self._stop.wait(self.interval / 2):
+            if self._stall is None and time.monotonic() - self._beat > self.interval + self.threshold:
+                frame = sys._current_frames().get(self._loop_thread)
+                stack = traceback.extract_stack(frame)[-self.frames:] if frame is not None else []
+                self._stall = (self._beat, stack)
+
+    def _report(self, now):
+        since, stack = self._stall
+        self._stall = None
+        seconds = now - since - self.interval
+        self.stalls += 1
+        self.worst = max(self.worst, seconds)
+        where = " <- ".join(f"{frame.name} ({frame.filename.rsplit('/', 1)[-1]}:{frame.lineno})"
+                            for frame in reversed(stack))
+        self.metrics.inc('loop_stalls_total')
+        self.metrics.event('loop_stall', seconds=round(seconds, 4), where=where)
+        if self.log:
+            self.log(f"Event loop stalled {1000 * seconds:.0f} ms in {where or 'unknown code'}")
+
+    def stats(self):
+        return {'stalls': self.stalls, 'worst_ms': round(1000 * self.worst, 1)}
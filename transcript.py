@@ -0,0 +1,104 @@
+import collections
+
+
+class Segment:
+    """
+    One final sentence of a transcript, with its span in milliseconds of audio and its
+    speaker (None if unknown).
+    """
+
+    def __init__(self, text, start=None, end=None, speaker=None) -> None:
+        self.text = text
+        self.start = start
+        self.end = end
+        self.speaker = speaker
+
+    def __repr__(self):
+        speaker = f", speaker={self.speaker}" if self.speaker is not None else ""
+        return f"Segment({self.text!r}, {self.start}, {self.end}{speaker})"
+
+
+class Transcript:
+    """
+    Transcript of a 2pass ASR stream, assembled incrementally.
+
+    `2pass-online` results append partial text to the open utterance; its `2pass-offline`
+    result replaces that partial in place with final segments, one per `stamp_sents`
+    sentence with its timestamps. Every update returns only what changed, as a
+    `(retract, text)` delta: drop the last `retract` characters, then append `text`, so
+    showing the transcript costs the size of the update instead of the whole text.
+
+    Only the last `max_segments` final segments are kept; older ones are rotated out
+    (passed to `on_rotate`, e.g. to write them to a file), so memory stays bounded
+    however long the stream runs.
+    """
+
+    def __init__(self, max_segments=200, on_rotate=None) -> None:
+        """
+        Initializes an empty transcript.
+
+        Args:
+            max_segments (int): Final segments kept in memory, None for all.
+            on_rotate (callable): Called with each `Segment` rotated out.
+        """
+        self.max_segments = max_segments
+        self.on_rotate = on_rotate
+        self.segments = collections.deque()
+        self.partial = ""       # online text of the open utterance
+        self.rotated = 0        # segments rotated out
+        self.rotated_chars = 0  # characters rotated out, the offset of `text()` in the whole transcript
+
+    def add_partial(self, text):
+        """Append a `2pass-online` result to the open utterance."""
+        self.partial += text
+        return 0, text
+
+    def add_final(self, text, stamp_sents=None):
+        """
+        Replace the open utterance's partial text with its `2pass-offline` result.
+
+        Args:
+            text (str): Final text of the utterance, used when there are no `stamp_sents`.
+            stamp_sents (list): Sentences of the result (`text_seg`, `punc`, `start`, `end`,
+                and `speaker` where the service tells speakers apart).
+
+        Returns:
+            tuple: The `(retract, text)` delta; the text is the utterance's final text.
+        """
+        if stamp_sents:
+            segments = [Segment(sentence['text_seg'].replace(" ", "") + sentence.get('punc', ""),
+                                sentence.get('start'), sentence.get('end'), sentence.get('speaker'))
+                        for sentence in stamp_sents]
+        else:
+            segments = [Segment(text)] if text else []
+        self.segments.extend(segments)
+        self._rotate()
+        return self.discard()[0], "".join(segment.text for segment in segments)
+
+    def discard(self):
+        """Drop the open utterance's partial text (e.g. it was cancelled or the connection lost)."""
+        retract = len(self.partial)
+        self.partial = ""
+        return retract, ""
+
+    def _rotate(self):
+        if self.max_segments is None:
+            return
+        while len(self.segments) > self.max_segments:
+            segment = self.segments.popleft()
+            self.rotated += 1
+            self.rotated_chars += len(segment.text)
+            if self.on_rotate:
+                self.on_rotate(segment)
+
+    def text(self):
+        """Text of the segments still held, followed by the open partial."""
+        return "".join(segment.text for segment in self.segments) + self.partial
+
+    def stats(self):
+        return {
+            'segments': len(self.segments),
+            'rotated': self.rotated,
+            'rotated_chars': self.rotated_chars,
+            'partial_chars': len(self.partial),
+        }
@@ -0,0 +1,228 @@
+import asyncio
+import socket
+from metrics import write_buffer_size
+
+
+class UplinkSender:
+    """
+    Sender stage between the PCM ring and one server connection.
+
+    The ring reader is the outbound queue: capture only writes the ring and `notify`s,
+    and this task sends what the reader has buffered, so a slow link never stalls capture.
+    While the socket's write buffer is above `high_water` the link is congested: nothing
+    is sent (backpressure) and the backlog builds up in the ring. When it can send again,
+    up to `max_coalesce` buffered windows go out as one message, and a backlog older than
+    `max_lag` seconds on a congested link is dropped, oldest first, so the latency of the
+    audio stays bounded instead of growing with the congestion.
+
+    For the write buffer to show the congestion at all, the kernel must not queue much
+    unsent data itself (by default it takes megabytes), so `TCP_NOTSENT_LOWAT` is set to
+    `unsent_limit` on each new connection where the platform supports it.
+    """
+
+    def __init__(self,
+                 name,
+                 reader,
+                 send,
+                 link,
+                 connection,
+                 on_failure=None,
+                 max_coalesce=1,
+                 high_water=4096,
+                 unsent_limit=4096,
+                 max_lag=2.0,
+                 sample_rate=16000,
+                 metrics=None,
+                 poll_interval=0.01) -> None:
+        """
+        Initializes the sender; it sends only while `enabled` and `start` was called.
+
+        Args:
+            name (str): Link name used in log messages.
+            reader (PcmReader): Ring reader whose windows are sent.
+            send (callable): Coroutine function sending one window view, returning False if the connection was lost.
+            link (ConnectionSupervisor): Supervisor of the connection, waited on while it is down.
+            connection (callable): Returns the current WebSocket, to measure its write buffer.
+            on_failure (callable): Called with the size of a window whose send failed (e.g. to rewind the reader).
+            max_coalesce (int): Most windows sent as one message when a backlog built up.
+            high_water (int): Write buffer size in bytes above which the link counts as congested.
+            unsent_limit (int): Unsent bytes the kernel may queue per connection, None to leave it.
+            max_lag (float): Seconds of backlog kept on a congested link, None to never drop audio.
+            sample_rate (int): Sampling rate of the audio.
+            metrics (Metrics): Metrics view for the uplink series.
+            poll_interval (float): Seconds between write buffer checks while congested.
+        """
+        self.name = name
+        self.reader = reader
+        self.send = send
+        self.link = link
+        self.connection = connection
+        self.on_failure = on_failure
+        self.max_coalesce = max_coalesce
+        self.high_water = high_water
+        self.unsent_limit = unsent_limit
+        self._tuned = None  # connection `unsent_limit` was applied to
+        self.max_lag_samples = int(max_lag * sample_rate) if max_lag is not None else None
+        self.sample_rate = sample_rate
+        self.metrics = metrics
+        self.poll_interval = poll_interval
+        self.enabled = False
+        self.messages = 0
+        self.coalesced = 0      # windows sent inside another window's message
+        self.backpressure = 0   # times sending was held back by a congested socket
+        self.dropped = 0        # samples dropped to bound the lag
+        self._limit = None      # absolute sample position not to send past, see `stop_at`
+        self._then = None
+        self._resume = None     # position to go on from after `_then`, see `start_at`
+        self._ready = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    def notify(self):
+        """Wake the sender up after new audio was written to the ring, once a window is buffered."""
+        if self.reader.available() >= self.reader.window:
+            self._ready.set()
+
+    def enable(self, enabled=True):
+        """Start or stop sending (cancels a pending `stop_at`)."""
+        self.enabled = enabled
+        self._limit = self._then = self._resume = None
+        if enabled:
+            self._ready.set()
+
+    def start_at(self, position):
+        """
+        Send from absolute sample `position` on. A pending `stop_at` is completed first, so
+        e.g. a new utterance starts on the server only after the previous one was ended.
+        """
+        if self._then is not None:
+            self._resume = position
+        else:
+            self.reader.seek(position)
+        self.enabled = True
+        self._ready.set()
+
+    def stop_at(self, position, then):
+        """
+        Send the audio up to absolute sample `position` (the last window cut short there),
+        then await `then()` and disable.
+
+        `then` is a coroutine function returning False if the connection was lost, in
+        which case `on_failure` is called and the sender retries after the reconnect
+        (unless `start_at` moved on: a new connection has no use for the old stream).
+        """
+        self._limit = position
+        self._then = then
+        self._ready.set()
+
+    def backlog(self):
+        """Samples buffered but not sent yet."""
+        available = self.reader.available()
+        if self._limit is not None:
+            available = min(available, self._limit - self.reader.position)
+        return max(0, available)
+
+    def congested(self):
+        ws = self.connection()
+        if ws is not self._tuned:
+            self._tuned = ws
+            self._limit_unsent(ws)
+        return write_buffer_size(ws) > self.high_water
+
+    def _limit_unsent(self, ws):
+        option = getattr(socket, 'TCP_NOTSENT_LOWAT', None)
+        sock = getattr(ws, 'transport', None) and ws.transport.get_extra_info('socket')
+        if self.unsent_limit is None or option is None or sock is None:
+            return
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, option, self.unsent_limit)
+        except OSError:
+            pass
+
+    def _trim(self):
+        """Drop the oldest backlog beyond `max_lag`, in whole windows."""
+        if self.max_lag_samples is None:
+            return
+        excess = self.backlog() - self.max_lag_samples
+        if excess > 0:
+            window = self.reader.window
+            excess = -(-excess // window) * window
+            self.reader.position += excess
+            self.dropped += excess
+            if self.metrics:
+                self.metrics.inc('uplink_dropped_seconds_total', excess / self.sample_rate)
+
+    async def _run(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            while self.enabled:
+                if not self.link.is_connected:
+                    await self.link.wait()
+                    continue
+                if self.congested():
+                    self.backpressure += 1
+                    if self.metrics:
+                        self.metrics.inc('uplink_backpressure_total')
+                    self._trim()
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+                count = min(self.max_coalesce, self.backlog() // self.reader.window)
+                if count < 1:
+                    if self._then is not None:
+                        # The stream ends inside a window: send what there is of it first
+                        tail = self.reader.read_samples(self.backlog())
+                        if tail is not None:
+                            if not await self.send(tail):
+                                self._failed(len(tail))
+                                continue
+                            self.messages += 1
+                        if await self._then():
+                            self._done()
+                        else:
+                            self._failed(0)
+                        continue
+                    break
+                window = self.reader.read_many(count)
+                if not await self.send(window):
+                    self._failed(len(window))
+                    continue
+                self.messages += 1
+                self.coalesced += count - 1
+                if self.metrics:
+                    self.metrics.observe('uplink_lag_seconds', self.backlog() / self.sample_rate)
+                    if count > 1:
+                        self.metrics.inc('uplink_coalesced_total', count - 1)
+
+    def _done(self):
+        """The `stop_at` action succeeded: go on at the `start_at` position, or stop."""
+        resume = self._resume
+        self._limit = self._then = self._resume = None
+        if resume is None:
+            self.enabled = False
+        else:
+            self.reader.seek(resume)
+
+    def _failed(self, sent):
+        if self._resume is not None:
+            # The stream a pending `stop_at` was to end is gone with the connection
+            self._limit = self._then = None
+            self.reader.seek(self._resume)
+            self._resume = None
+        if self.on_failure:
+            self.on_failure(sent)
+
+    def stats(self):
+        return {
+            'messages': self.messages,
+            'coalesced': self.coalesced,
+            'backpressure': self.backpressure,
+            'dropped_seconds': round(self.dropped / self.sample_rate, 3),
+            'backlog_seconds': round(self.backlog() / self.sample_rate, 3),
+        }
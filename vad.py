@@ -0,0 +1,137 @@
+import numpy as np
+
+
+def frame_features(samples, frame_size=320):
+    """
+    Per-frame energy and zero-crossing rate of int16 samples.
+
+    Returns:
+        tuple: (energy in dBFS, zero-crossing rate in [0, 1]), one value per full frame.
+    """
+    count = len(samples) // frame_size
+    frames = np.asarray(samples[:count * frame_size], dtype=np.float32).reshape(count, frame_size)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    energy = 20 * np.log10(np.maximum(rms, 1.0) / 32768.0)
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frame_size - 1)
+    return energy, zcr
+
+
+class EnergyVad:
+    """
+    Streaming energy / zero-crossing voice activity detector.
+
+    A frame is speech when its energy is above both an absolute threshold and an
+    adaptive noise floor, or slightly below that with a high zero-crossing rate
+    (unvoiced consonants). Speech starts after `min_speech` consecutive speech frames
+    and ends after `hangover` seconds of non-speech.
+    """
+
+    def __init__(self,
+                 sample_rate=16000,
+                 frame_size=320,
+                 threshold_db=-45.0,
+                 margin_db=12.0,
+                 zcr_threshold=0.35,
+                 min_speech=0.06,
+                 hangover=0.5,
+                 preroll=0.3,
+                 timeout=5.0) -> None:
+        """
+        Initializes the detector.
+
+        Args:
+            sample_rate (int): Sampling rate of the audio.
+            frame_size (int): Samples per analysed frame.
+            threshold_db (float): Absolute energy threshold in dBFS.
+            margin_db (float): Required energy above the tracked noise floor, in dB.
+            zcr_threshold (float): Zero-crossing rate above which quieter frames count as speech.
+            min_speech (float): Seconds of consecutive speech needed to start a segment.
+            hangover (float): Seconds of non-speech needed to end a segment.
+            preroll (float): Seconds of audio before the detected start to keep.
+            timeout (float): Seconds without any speech after `reset` before giving up.
+        """
+        self.sample_rate = sample_rate
+        self.frame_size = frame_size
+        self.threshold_db = threshold_db
+        self.margin_db = margin_db
+        self.zcr_threshold = zcr_threshold
+        frame_seconds = frame_size / sample_rate
+        self.min_speech_frames = max(1, int(round(min_speech / frame_seconds)))
+        self.hangover_frames = max(1, int(round(hangover / frame_seconds)))
+        self.preroll_samples = int(preroll * sample_rate)
+        self.timeout_frames = int(round(timeout / frame_seconds)) if timeout else None
+        self.noise_floor = -60.0
+        self.reset()
+
+    def reset(self):
+        """Start a new utterance (keeps the noise floor estimate)."""
+        self.speaking = False
+        self.triggered = False  # speech has started at least once since reset
+        self._run = 0           # consecutive speech (or silence, while speaking) frames
+        self._frames = 0
+
+    def classify(self, energy, zcr):
+        """Vectorized per-frame speech decision for arrays of features."""
+        threshold = np.maximum(self.threshold_db, self.noise_floor + self.margin_db)
+        return (energy > threshold) | ((energy > threshold - 6.0) & (zcr > self.zcr_threshold))
+
+    def update(self, frame):
+        """
+        Feed one frame and return the resulting event.
+
+        Returns:
+            str or None: 'start' when speech begins, 'end' when it ends, 'timeout' when no
+            speech began within `timeout`, otherwise None.
+        """
+        energy, zcr = frame_features(frame, len(frame))
+        return self._step(float(energy[0]), float(zcr[0]))
+
+    def _step(self, energy, zcr):
+        """Advance the state machine by one frame of features."""
+        speech = bool(self.classify(energy, zcr))
+        if not speech:
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * energy
+        self._frames += 1
+
+        if not self.speaking:
+            self._run = self._run + 1 if speech else 0
+            if self._run >= self.min_speech_frames:
+                self.speaking = True
+                self.triggered = True
+                self._run = 0
+                return 'start'
+            if not self.triggered and self.timeout_frames and self._frames >= self.timeout_frames:
+                self._frames = 0
+                return 'timeout'
+            return None
+
+        self._run = 0 if speech else self._run + 1
+        if self._run >= self.hangover_frames:
+            self.speaking = False
+            self._run = 0
+            return 'end'
+        return None
+
+    def segments(self, samples):
+        """
+        Offline segmentation of a whole signal with the same rules as `update`.
+
+        Returns:
+            list: (start, end) sample offsets of speech, including pre-roll and hangover.
+        """
+        energy, zcr = frame_features(samples, self.frame_size)
+        self.reset()
+        segments = []
+        start = None
+        for index in range(len(energy)):
+            event = self._step(float(energy[index]), float(zcr[index]))
+            position = (index + 1) * self.frame_size
+            if event == 'start':
+                start = max(0, position - self.min_speech_frames * self.frame_size - self.preroll_samples)
+            elif event == 'end':
+                segments.append((start, position))
+                start = None
+        if start is not None:
+            segments.append((start, len(energy) * self.frame_size))
+        return segments